@@ -3,241 +3,88 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import math
 import os
-from statistics import mean
-from scipy.stats import norm, poisson
+from statapp.history import METRICS
+from statapp.datamodel import get_model, reloading, append_rows
+from statapp.ingest import read_rows
+from statapp.sources import find_excels
+from statapp.state import backtest_features, backtest_from_features, extend_features, match_arrays
+from statapp.backtest import backtest_arrays, extend_arrays
+from statapp.results import get_results, source_key
+from statapp.sweep import CUTOFFS, DEFAULT_ODDS, sweep
+from statapp.calibrate import DEFAULT_GRID, RESULT_COLUMNS, calibrate, best_settings
+from statapp.pricing import p_over_batch, lines_table
+from statapp.distribution import lines_table_exact, scale_sides
+from statapp import model
+from statapp.slate import all_fixtures, parse_fixtures, price_slate, safe_slate
+from statapp.simulate import DEFAULT_CORR, N_SIMS, simulate_slate
+from statapp.profiling import StageTimer, start_profile, hot_functions
 
 st.set_page_config(page_title="STAT APP — Pronostici Tiri & Falli", layout="wide")
 st.markdown("<h1 style='color:#0b57a4;'>⚽ STAT APP — Pronostici Tiri & Falli</h1>", unsafe_allow_html=True)
 st.write("Engine: EWMA + shrinkage + Poisson/Normal mixture · selezione arbitro per falli · backtest integrato")
 
+# tempi per stadio di questo rerun (pannello in sidebar); ?profile=1 nell'URL attiva anche cProfile
+PROFILE = st.query_params.get("profile", "") in ("1", "true", "yes")
+cprof = start_profile() if PROFILE else None
+timer = StageTimer()
+
 # -----------------------------
-# Cerca automaticamente un file Excel nella root del repo
-# Se preferisci un nome fisso, metti qui 'data_all.xlsx' o il nome che vuoi
-POSSIBLE_FILES = ["dati tiri e falli serie a e liga.xlsx", "data_all.xlsx", "mega_file.xlsx",
-                  "tiri_serie_a.xlsx","falli_serie_a.xlsx","falli_liga.xlsx"]
-
-def find_excel():
-    # cerca file nell'area di lavoro /app o /workspace oppure /mnt/data
-    search_paths = [".", "/workspace", "/app", "/mnt/data"]
-    for p in search_paths:
-        try:
-            for fname in os.listdir(p):
-                lower = fname.lower()
-                if lower.endswith(".xlsx") or lower.endswith(".xls"):
-                    # preferisci nomi in POSSIBLE_FILES
-                    if fname in POSSIBLE_FILES:
-                        return os.path.join(p, fname)
-            # se non trovi preferisci, prendi il primo excel trovato
-            for fname in os.listdir(p):
-                lower = fname.lower()
-                if lower.endswith(".xlsx") or lower.endswith(".xls"):
-                    return os.path.join(p, fname)
-        except Exception:
-            continue
-    return None
-
-EXCEL_PATH = find_excel()
-if EXCEL_PATH is None:
+# Cerca automaticamente i file Excel (statapp/sources.py): il file unico o i tre file separati,
+# che vengono uniti in un solo modello
+EXCEL_PATHS = find_excels()
+if not EXCEL_PATHS:
     st.error("Nessun file Excel trovato nella root. Carica qui il file unico con tutti i dati o i tre file separati.")
     st.stop()
+EXCEL_NAMES = ", ".join(os.path.basename(p) for p in EXCEL_PATHS)
+DATA_SOURCE = EXCEL_PATHS[0] if len(EXCEL_PATHS) == 1 else EXCEL_PATHS
 
-st.info(f"Uso file: {os.path.basename(EXCEL_PATH)}")
+st.info(f"Uso file: {EXCEL_NAMES}")
 
 # -----------------------------
-# Carica tutte le sheet e cerca i fogli utili
+# Modello dati condiviso fra sessioni (statapp/datamodel.py): fogli, colonne e storie
+# vengono ricostruiti solo quando cambia il contenuto del file; la ricostruzione avviene
+# in background e fino allo swap si continua a usare il modello precedente
 # -----------------------------
-@st.cache_data(ttl=600)
-def load_all_sheets(path):
-    try:
-x = pd.read_excel(path, sheet_name=None)
-        return x
-    except Exception as e:
-        return None
-
-sheets = load_all_sheets(EXCEL_PATH)
-if sheets is None:
+try:
+    with timer.stage("get_model"):
+        data = get_model(DATA_SOURCE)
+except Exception as e:
     st.error("Errore leggendo il file Excel. Controlla che non sia protetto e che sia .xlsx.")
     st.stop()
 
-# funzione helper per trovare foglio con parola chiave
-def sheet_by_keyword(keywords):
-    for name, df in sheets.items():
-        lname = name.lower()
-        for kw in keywords:
-            if kw in lname:
-                return name, df
-    # fallback: try to find by column names
-    for name, df in sheets.items():
-        cols = " ".join([c.lower() for c in df.columns])
-        for kw in keywords:
-            if kw in cols:
-                return name, df
-    return None, None
-
-# identifica fogli
-tiri_sheet_name, df_tiri = sheet_by_keyword(["tiri", "shots", "shots_on", "shoot"])
-falli_ita_sheet_name, df_falli_ita = sheet_by_keyword(["falli", "fouls", "arbitro", "referee", "serie a", "serie_a"])
-falli_liga_sheet_name, df_falli_liga = sheet_by_keyword(["liga", "spagna", "spain", "laliga", "la liga", "falli_liga"])
-
-# se non trovati, prova a prendere altri fogli in ordine
-if df_tiri is None:
-    # try first sheet that contains numeric columns
-    for name, df in sheets.items():
-        if df.shape[1] >= 3:
-            df_tiri = df; tiri_sheet_name = name; break
-if df_falli_ita is None:
-    for name, df in sheets.items():
-        if "arbitro" in " ".join([c.lower() for c in df.columns]) or "referee" in " ".join([c.lower() for c in df.columns]):
-            df_falli_ita = df; falli_ita_sheet_name = name; break
-if df_falli_liga is None:
-    # try any sheet with 'liga' or 'spain' in name
-    for name, df in sheets.items():
-        if 'liga' in name.lower() or 'spain' in name.lower() or 'la liga' in name.lower():
-            df_falli_liga = df; falli_liga_sheet_name = name; break
+tiri_sheet_name = data.sheet_names["tiri"]; df_tiri = data.frames["tiri"]
+falli_ita_sheet_name = data.sheet_names["falli_ita"]; df_falli_ita = data.frames["falli_ita"]
+falli_liga_sheet_name = data.sheet_names["falli_liga"]; df_falli_liga = data.frames["falli_liga"]
 
 # show mapping summary
 st.sidebar.header("File & sheet trovati")
-st.sidebar.write("Excel:", os.path.basename(EXCEL_PATH))
+st.sidebar.write("Excel:", EXCEL_NAMES)
 st.sidebar.write("Tiri sheet:", tiri_sheet_name)
 st.sidebar.write("Falli SA sheet:", falli_ita_sheet_name)
 st.sidebar.write("Falli Liga sheet:", falli_liga_sheet_name)
+if reloading(DATA_SOURCE):
+    st.sidebar.caption("File aggiornato: nuovo modello in costruzione, per ora uso i dati precedenti.")
+
+# giornata nuova da CSV/XLSX (stesse colonne del foglio): aggiorna storie e feature senza
+# ricaricare il workbook; le righe valgono finché il file Excel non cambia
+with st.sidebar.expander("Aggiungi giornata"):
+    roles = {"Tiri": "tiri", "Falli Serie A": "falli_ita", "Falli Liga": "falli_liga"}
+    role_label = st.selectbox("Foglio", list(roles))
+    up = st.file_uploader("Righe nuove (CSV/XLSX)", type=["csv", "xlsx"])
+    if data.appended:
+        st.caption(f"Righe aggiunte dopo il caricamento del file: {data.appended}")
+    if up is not None and st.button("Aggiungi righe"):
+        try:
+            data = append_rows(DATA_SOURCE, roles[role_label], read_rows(up))
+            st.rerun()
+        except ValueError as e:
+            st.error(str(e))
 
-# -----------------------------
-# mapping colonne tollerante
-# -----------------------------
-def find_col(df, candidates):
-    if df is None: return None
-    cols = list(df.columns)
-    low = {c.lower(): c for c in cols}
-    for cand in candidates:
-        if cand.lower() in low:
-            return low[cand.lower()]
-    for cand in candidates:
-        k = cand.lower()
-        for c in cols:
-            if k in c.lower():
-                return c
-    return None
-
-# TIRI
-tiri_team_col = find_col(df_tiri, ["squadra","team","team name"]) if df_tiri is not None else None
-tiri_home_col = find_col(df_tiri, ["home team","squadra_casa","home"]) if df_tiri is not None else None
-tiri_away_col = find_col(df_tiri, ["away team","squadra_ospite","away"]) if df_tiri is not None else None
-tiri_tot_col = find_col(df_tiri, ["tiri_tot","tiri totali","total shots","shots"]) if df_tiri is not None else None
-tiri_sot_col = find_col(df_tiri, ["tiri in porta","shots on target","sot","shots_on_target"]) if df_tiri is not None else None
-
-# FALLI ITA
-falli_ita_team_col = find_col(df_falli_ita, ["squadra","team"]) if df_falli_ita is not None else None
-falli_ita_falli_col = find_col(df_falli_ita, ["falli","fouls","falli_commessi"]) if df_falli_ita is not None else None
-falli_ita_arb_col = find_col(df_falli_ita, ["arbitro","referee","official"]) if df_falli_ita is not None else None
-falli_ita_arb_mean_col = find_col(df_falli_ita, ["media_arbitro","avg_ref","ref_avg"]) if df_falli_ita is not None else None
-
-# FALLI LIGA
-falli_liga_team_col = find_col(df_falli_liga, ["squadra","team"]) if df_falli_liga is not None else None
-falli_liga_falli_col = find_col(df_falli_liga, ["falli","fouls"]) if df_falli_liga is not None else None
-
-# -----------------------------
-# Build histories
-# -----------------------------
-team_stats = {}
-arbitri_stats = {}
-
-def add_team_val(team, key, val):
-    if team is None or pd.isna(team): return
-    t = str(team).strip()
-    if t == "": return
-    team_stats.setdefault(t, {}).setdefault(key, []).append(safe_float(val))
-
-# populate from tiri sheet (aggregated or match-level)
-if df_tiri is not None:
-    if tiri_team_col and tiri_team_col in df_tiri.columns and tiri_tot_col and tiri_tot_col in df_tiri.columns:
-        # aggregated per-team
-        for _, r in df_tiri.iterrows():
-            team = r.get(tiri_team_col)
-            if pd.isna(team): continue
-            add_team_val(team, 'tiri', r.get(tiri_tot_col))
-            if tiri_sot_col and tiri_sot_col in df_tiri.columns:
-                add_team_val(team, 'sot', r.get(tiri_sot_col))
-    else:
-        # try match-level: detect home/away shot columns
-        for _, r in df_tiri.iterrows():
-            home = r.get(tiri_home_col) if tiri_home_col in df_tiri.columns else None
-            away = r.get(tiri_away_col) if tiri_away_col in df_tiri.columns else None
-            home_sh = None; away_sh = None
-            for c in df_tiri.columns:
-                cl = c.lower()
-                if "home" in cl and ("shot" in cl or "tiri" in cl):
-                    home_sh = r.get(c)
-                if "away" in cl and ("shot" in cl or "tiri" in cl):
-                    away_sh = r.get(c)
-            if home and not pd.isna(home):
-                add_team_val(home, 'tiri', home_sh)
-            if away and not pd.isna(away):
-                add_team_val(away, 'tiri', away_sh)
-
-# falli serie a
-if df_falli_ita is not None:
-    for _, r in df_falli_ita.iterrows():
-        team = r.get(falli_ita_team_col) if falli_ita_team_col in df_falli_ita.columns else None
-        if team is not None and not pd.isna(team):
-            if falli_ita_falli_col and falli_ita_falli_col in df_falli_ita.columns:
-                add_team_val(team, 'falli', r.get(falli_ita_falli_col))
-        # arbitri stats
-        if falli_ita_arb_col and falli_ita_arb_col in df_falli_ita.columns:
-            arb = r.get(falli_ita_arb_col)
-            if pd.notna(arb):
-                name = str(arb).strip()
-                if falli_ita_arb_mean_col and (falli_ita_arb_mean_col in df_falli_ita.columns):
-                    val = safe_float(r.get(falli_ita_arb_mean_col))
-                elif falli_ita_falli_col and (falli_ita_falli_col in df_falli_ita.columns):
-                    val = safe_float(r.get(falli_ita_falli_col))
-                else:
-                    val = 0.0
-                arbitri_stats.setdefault(name, []).append(val)
-
-# falli liga
-if df_falli_liga is not None:
-    for _, r in df_falli_liga.iterrows():
-        team = r.get(falli_liga_team_col) if falli_liga_team_col and (falli_liga_team_col in df_falli_liga.columns) else None
-        if team is not None and not pd.isna(team):
-            if falli_liga_falli_col and (falli_liga_falli_col in df_falli_liga.columns):
-                add_team_val(team, 'falli_liga', r.get(falli_liga_falli_col))
-
-# -----------------------------
-# MODEL helpers
-# -----------------------------
-def ewma(vals, span=6):
-    arr = [safe_float(v) for v in vals if v is not None and not pd.isna(v)]
-    if len(arr)==0: return 0.0
-    s = pd.Series(arr)
-    return float(s.ewm(span=span, adjust=False).mean().iloc[-1])
-
-def shrink_est(est, prior, n, alpha=10.0):
-    if n<=0: return prior
-    w = n/(n+alpha)
-    return w*est + (1-w)*prior
-
-def pstdev(vals):
-    try:
-        arr = [safe_float(v) for v in vals if v is not None and not pd.isna(v)]
-        return float(pd.Series(arr).std(ddof=0)) if len(arr)>0 else 0.0
-    except:
-        return 0.0
-
-def p_over_mix(mu, sigma, thresh, w_pois=0.6):
-    k = math.floor(thresh)
-    mu_pos = max(mu, 0.0)
-    try:
-        p_p = 1.0 - poisson.cdf(k, mu_pos)
-    except:
-        p_p = 0.0
-    try:
-        p_n = 1.0 - norm.cdf(thresh + 0.5, loc=mu, scale=max(sigma,0.1))
-    except:
-        p_n = 0.0
-    return float(min(1.0, max(0.0, w_pois*p_p + (1-w_pois)*p_n)))
+cols = data.cols
+tiri_home_col = cols["tiri_home"]
+tiri_away_col = cols["tiri_away"]
+team_stats, arbitri_stats = data.team_stats, data.arbitri_stats
 
 # -----------------------------
 # Sidebar params
@@ -246,6 +93,9 @@ st.sidebar.header("Parametri modello")
 span = st.sidebar.slider("Span EWMA", 3, 12, value=6)
 alpha = st.sidebar.slider("Shrink α", 1.0, 30.0, value=10.0)
 w_p = st.sidebar.slider("Peso Poisson (mixture)", 0.0, 1.0, 0.6)
+dist_label = st.sidebar.radio("Distribuzione totale", ["Mixture Poisson/Normale", "Esatta (convoluzione, NB per lato)"])
+dist_mode = "exact" if dist_label.startswith("Esatta") else "mix"
+use_lookup = st.sidebar.checkbox("Cdf tabulate (più veloce, errore < 1e-7)", value=False)
 spreads = st.sidebar.multiselect("Linee (spread) da valutare", [8.5,9.5,10.5,11.5,12.5,13.5,14.5], default=[9.5,10.5,11.5,12.5])
 st.sidebar.write("Arbitri rilevati (Serie A):", sorted(list(arbitri_stats.keys()))[:30])
 
@@ -253,25 +103,23 @@ st.sidebar.write("Arbitri rilevati (Serie A):", sorted(list(arbitri_stats.keys()
 # Main UI: menu con tre sezioni
 # -----------------------------
 st.markdown("### Seleziona sezione")
-section = st.selectbox("Sezione", ["Tiri Serie A", "Falli Serie A", "Falli Liga", "Backtest"])
+section = st.selectbox("Sezione", ["Tiri Serie A", "Falli Serie A", "Falli Liga", "Slate giornata", "Backtest"])
 
 def compute_expect(home, away, key):
-    h_vals = team_stats.get(home, {}).get(key, [])
-    a_vals = team_stats.get(away, {}).get(key, [])
-    mu_h_recent = ewma(h_vals, span=span) if len(h_vals)>0 else 0.0
-    mu_a_recent = ewma(a_vals, span=span) if len(a_vals)>0 else 0.0
-    mu_h_overall = mean(h_vals) if len(h_vals)>0 else 0.0
-    mu_a_overall = mean(a_vals) if len(a_vals)>0 else 0.0
-    mu_h = shrink_est(0.7*mu_h_recent + 0.3*mu_h_overall, mu_h_overall, len(h_vals), alpha)
-    mu_a = shrink_est(0.7*mu_a_recent + 0.3*mu_a_overall, mu_a_overall, len(a_vals), alpha)
-    mu_tot = mu_h + mu_a
-    sigma_h = max(0.6, pstdev(h_vals) if len(h_vals)>1 else max(0.6, mu_h*0.25))
-    sigma_a = max(0.6, pstdev(a_vals) if len(a_vals)>1 else max(0.6, mu_a*0.25))
-    sigma_tot = math.sqrt(sigma_h**2 + sigma_a**2)
-    return mu_h, mu_a, mu_tot, sigma_tot
+    # stimatori in statapp/model.py, parametri dalla sidebar
+    return model.compute_expect(team_stats, home, away, key, span=span, alpha=alpha, version=data.version,
+                                features=data.features)
+
+def lines_for(home, away, key, mu, sigma):
+    # tabella linee con la distribuzione scelta in sidebar (mu già corretto per l'arbitro)
+    if dist_mode == "exact":
+        (mu_h, s_h), (mu_a, s_a) = [model.cached_team_estimate(team_stats, t, key, span, alpha, data.version,
+                                                               data.features) for t in (home, away)]
+        return lines_table_exact(*scale_sides(mu_h, s_h, mu_a, s_a, mu), spreads)
+    return lines_table(mu, sigma, spreads, w_p, use_lookup)
 
 # teams list build
-teams = sorted(list(team_stats.keys()))
+teams = list(data.teams)
 if len(teams)==0:
     st.error("Nessuna squadra trovata nei dati. Controlla il file Excel e le intestazioni.")
     st.stop()
@@ -282,13 +130,11 @@ if section == "Tiri Serie A":
     home = st.selectbox("Casa", teams)
     away = st.selectbox("Ospite", [t for t in teams if t!=home] or teams)
     if home and away:
-        mu_h, mu_a, mu, sigma = compute_expect(home, away, 'tiri')
+        with timer.stage("compute_expect+pricing", len(spreads)):
+            mu_h, mu_a, mu, sigma = compute_expect(home, away, 'tiri')
+            table = lines_for(home, away, 'tiri', mu, sigma)
         st.write(f"Atteso tiri totali: {mu:.2f} (home {mu_h:.2f} | away {mu_a:.2f}) — sigma {sigma:.2f}")
-        rows = []
-        for L in sorted(spreads):
-            p = p_over_mix(mu, sigma, L, w_p)
-            rows.append({"line": L, "p_over": round(p,3), "p_under": round(1-p,3)})
-        st.table(pd.DataFrame(rows))
+        st.table(pd.DataFrame(table))
 elif section == "Falli Serie A":
     st.header("Falli — Serie A")
     home = st.selectbox("Casa", teams, key="home_fa")
@@ -296,34 +142,145 @@ elif section == "Falli Serie A":
     arb_list = ["(nessuno)"] + sorted(list(arbitri_stats.keys()))
     arb = st.selectbox("Arbitro (opzionale)", arb_list)
     if home and away:
-        mu_h, mu_a, mu, sigma = compute_expect(home, away, 'falli')
-        arb_note = ""
-        if arb and arb != "(nessuno)" and arb in arbitri_stats:
-            arb_mean = mean(arbitri_stats[arb])
-            adj = (arb_mean - (mu/2.0)) * 0.5
-            mu = mu + adj
-            arb_note = f"(arb adj {adj:.2f}, arb_mean {arb_mean:.2f})"
+        with timer.stage("compute_expect+pricing", len(spreads)):
+            mu_h, mu_a, mu, sigma = compute_expect(home, away, 'falli')
+            arb_note = ""
+            if arb and arb != "(nessuno)" and arb in arbitri_stats:
+                mu, adj, arb_mean = model.referee_adjust(mu, arbitri_stats[arb])
+                arb_note = f"(arb adj {adj:.2f}, arb_mean {arb_mean:.2f})"
+            table = lines_for(home, away, 'falli', mu, sigma)
         st.write(f"Atteso falli totali: {mu:.2f} {arb_note} — sigma {sigma:.2f}")
-        rows = []
-        for L in sorted(spreads):
-            p = p_over_mix(mu, sigma, L, w_p)
-            rows.append({"line": L, "p_over": round(p,3), "p_under": round(1-p,3)})
-        st.table(pd.DataFrame(rows))
+        st.table(pd.DataFrame(table))
 elif section == "Falli Liga":
     st.header("Falli — Liga (Spagna)")
     # use same team list but may be empty for liga-specific teams
     home = st.selectbox("Casa (Liga)", teams, key="home_l")
     away = st.selectbox("Ospite (Liga)", [t for t in teams if t!=home] or teams, key="away_l")
     if home and away:
-        mu_h, mu_a, mu, sigma = compute_expect(home, away, 'falli_liga')
+        with timer.stage("compute_expect+pricing", len(spreads)):
+            mu_h, mu_a, mu, sigma = compute_expect(home, away, 'falli_liga')
+            table = lines_for(home, away, 'falli_liga', mu, sigma)
         st.write(f"Atteso falli totali (Liga): {mu:.2f} — sigma {sigma:.2f}")
-        rows = []
-        for L in sorted(spreads):
-            p = p_over_mix(mu, sigma, L, w_p)
-            rows.append({"line": L, "p_over": round(p,3), "p_under": round(1-p,3)})
-        st.table(pd.DataFrame(rows))
+        st.table(pd.DataFrame(table))
+elif section == "Slate giornata":
+    st.header("Slate — tutte le partite della giornata")
+    mode = st.radio("Partite", ["Lista partite", "Tutte le combinazioni"], horizontal=True)
+    if mode == "Lista partite":
+        txt = st.text_area("Una partita per riga: Casa - Ospite (opzionale: Casa; Ospite; Arbitro)", height=200)
+        fixtures = parse_fixtures(txt)
+    else:
+        fixtures = all_fixtures(teams)
+    metrics = st.multiselect("Metriche", list(METRICS), default=list(METRICS))
+    if fixtures and spreads:
+        with timer.stage("price_slate") as s:
+            df_slate = price_slate(team_stats, fixtures, spreads, metrics, span=span, alpha=alpha, w_pois=w_p,
+                                   arbitri_stats=arbitri_stats, version=data.version, features=data.features,
+                                   dist=dist_mode, lookup=use_lookup)
+            s["rows"] = len(df_slate)
+        unknown = sorted({t for f in fixtures for t in f[:2] if t not in team_stats})
+        if unknown:
+            st.warning(f"Squadre senza dati: {', '.join(unknown)}")
+        st.write(f"{len(fixtures)} partite · {len(df_slate)} righe")
+        st.dataframe(df_slate.round(3))
+        st.download_button("Scarica CSV", df_slate.to_csv(index=False).encode("utf-8"),
+                           file_name="slate.csv", mime="text/csv")
+        st.subheader("Linee sicure")
+        conf = st.slider("Probabilità minima", 0.55, 0.95, 0.70, step=0.01)
+        with timer.stage("safe_slate") as s:
+            df_safe = safe_slate(team_stats, fixtures, metrics, conf=conf, span=span, alpha=alpha, w_pois=w_p,
+                                 arbitri_stats=arbitri_stats, version=data.version, features=data.features,
+                                 dist=dist_mode)
+            s["rows"] = len(df_safe)
+        st.dataframe(df_safe.round(3))
+        st.subheader("Monte Carlo — combo e linee squadra")
+        # tiri, sot e falli simulati insieme per casa e ospite: combo sulla stessa partita
+        if st.checkbox("Simula (metriche congiunte per casa e ospite)"):
+            c1, c2, c3 = st.columns(3)
+            n_sims = c1.select_slider("Simulazioni per partita", [10_000, 50_000, 100_000, 200_000, 500_000], value=N_SIMS)
+            rho = c2.slider("Correlazione tiri / sot", 0.0, 0.95, DEFAULT_CORR[("tiri", "sot")], step=0.05)
+            seed = c3.number_input("Seed", 0, 10**9, 0, step=1)
+            combo_txt = st.text_area("Combo, una per riga (es. tiri>22.5 & falli>24.5 · sot.casa>4.5 & sot.ospite>3.5)",
+                                     "tiri>22.5 & falli>24.5")
+            combos = [c.strip() for c in combo_txt.splitlines() if c.strip()]
+            try:
+                with timer.stage("simulate_slate") as s:
+                    df_mc, df_combo = simulate_slate(team_stats, fixtures, spreads, metrics, combos=combos, n_sims=n_sims,
+                                                     corr={("tiri", "sot"): rho}, seed=int(seed), span=span, alpha=alpha,
+                                                     arbitri_stats=arbitri_stats, version=data.version,
+                                                     features=data.features)
+                    s["rows"] = len(fixtures) * n_sims
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                if not df_combo.empty:
+                    st.dataframe(df_combo.round(3))
+                scope = st.radio("Linee simulate", ["Totale", "Casa", "Ospite"], horizontal=True)
+                st.dataframe(df_mc[df_mc["scope"] == {"Totale": "total", "Casa": "home", "Ospite": "away"}[scope]].round(3))
+    else:
+        st.info("Inserisci almeno una partita e una linea.")
 else:
     st.header("Backtest & Accuracy")
+    st.subheader("Walk-forward — tutte le metriche e linee")
+    # statistiche pre-match una volta per versione dei dati; span/α/linee si applicano dopo
+    with timer.stage("backtest_arrays"):
+        bt_arrays = data.derived("backtest_all", lambda: backtest_arrays(data.frames, cols),
+                                 extend=lambda a, rows, offsets: extend_arrays(a, rows, cols, offsets))
+    if not bt_arrays:
+        st.info("Nessuna metrica con storie match-by-match per il walk-forward.")
+    else:
+        bt_metrics = st.multiselect("Metriche backtest", list(bt_arrays), default=list(bt_arrays))
+        min_hist = st.slider("Partite minime di storia per squadra", 1, 10, 3)
+        # risultati in archivio per sorgente + parametri: si valutano solo le partite nuove
+        bt_store = get_results()
+        with timer.stage("backtest_lines") as s:
+            run_id, run_info = bt_store.run(source_key(data.path), data.version, bt_arrays, spreads, span=span,
+                                            alpha=alpha, w_pois=w_p, min_history=min_hist, metrics=bt_metrics)
+            n_wf = bt_store.count(run_id)
+            s["rows"] = run_info["evaluated"]
+        st.caption(f"Backtest: {run_info['evaluated']} previsioni calcolate, {run_info['reused']} dall'archivio")
+        if n_wf == 0:
+            st.info("Nessuna previsione con la storia minima richiesta.")
+        else:
+            st.write(f"{n_wf} previsioni (partita × linea)")
+            # metriche per tutti i cutoff in un passaggio: il cutoff scelto è solo una riga della tabella
+            c1, c2 = st.columns(2)
+            bet_side = c1.radio("Lato", ["Over", "Under", "Entrambi"], horizontal=True)
+            odds = c2.number_input("Quota decimale (stake fisso 1)", 1.01, 10.0, DEFAULT_ODDS, step=0.05)
+            # sweep e punteggi da aggregati dell'archivio (istogramma di p), non dalle righe
+            with timer.stage("sweep", n_wf):
+                ev = bt_store.evaluation(run_id, {"Over": "over", "Under": "under", "Entrambi": "both"}[bet_side],
+                                         odds=odds)
+            sc = ev["scores"]; sw = ev["sweep"]
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("Brier", f"{sc['brier']:.4f}"); m2.metric("Log-loss", f"{sc['log_loss']:.4f}")
+            m3.metric("AUC", f"{sc['auc']:.3f}"); m4.metric("Frequenza esito", f"{sc['base_rate']*100:.1f}%")
+            wf_cutoff = st.select_slider("Soglia probabilità segnale", options=list(CUTOFFS), value=0.58)
+            row = sw[sw["cutoff"] == wf_cutoff].iloc[0]
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("Segnali", int(row["volume"])); m2.metric("Hit rate", f"{row['hit_rate']*100:.1f}%")
+            m3.metric("Accuracy", f"{row['accuracy']*100:.1f}%"); m4.metric("ROI", f"{row['roi']*100:.1f}%")
+            st.line_chart(sw.set_index("cutoff")[["hit_rate", "accuracy", "roi"]])
+            with st.expander("Tabella per cutoff e affidabilità"):
+                st.dataframe(sw.round(4))
+                st.dataframe(ev["reliability"].round(3))
+            safe_conf = st.slider("Regola linea sicura: probabilità minima", 0.55, 0.95, 0.70, step=0.01)
+            bets = bt_store.safe_bets(run_id, safe_conf)
+            if bets.empty:
+                st.info("Nessuna linea sicura alla soglia scelta.")
+            else:
+                won = bets["won"].to_numpy()
+                st.write(f"Linea sicura {safe_conf:.0%}: {len(bets)} scommesse · hit rate {won.mean()*100:.1f}% · "
+                         f"ROI {(won*odds - 1).mean()*100:.1f}% a quota {odds:.2f}")
+            st.dataframe(bt_store.summary(run_id, wf_cutoff).round(3))
+            # dettaglio a pagine, letto dall'archivio su disco
+            c1, c2, c3 = st.columns(3)
+            pg_metric = c1.selectbox("Metrica (dettaglio)", ["(tutte)"] + bt_metrics)
+            pg_metric = None if pg_metric == "(tutte)" else pg_metric
+            pg_size = c2.selectbox("Righe per pagina", [50, 100, 250, 500], index=1)
+            n_pages = max(1, -(-bt_store.count(run_id, pg_metric) // pg_size))
+            pg = c3.number_input(f"Pagina (di {n_pages})", 1, n_pages, 1)
+            st.dataframe(bt_store.page(run_id, (pg - 1) * pg_size, pg_size, pg_metric).round(3))
+    st.subheader("Backtest tiri (match-level)")
     st.write("Esegui backtest solo se i fogli contengono righe match-by-match (colonne Home/Away + valori).")
     can_backtest = False
     # try detect match-level tiri
@@ -333,44 +290,72 @@ else:
         st.info("Non trovo colonne Home/Away chiare in foglio tiri — backtest non possibile con i dati attuali.")
     else:
         st.write("Eseguo backtest tiri usando colonne Home/Away e valori match-level.")
-        # detect home/away shot columns
-        home_sh_col = None; away_sh_col = None
-        for c in df_tiri.columns:
-            cl = c.lower()
-            if "home" in cl and ("shot" in cl or "tiri" in cl): home_sh_col = c
-            if "away" in cl and ("shot" in cl or "tiri" in cl): away_sh_col = c
+        # colonne home/away shots già risolte in resolve_columns
+        home_sh_col = cols["tiri_home_sh"]; away_sh_col = cols["tiri_away_sh"]
         if home_sh_col is None or away_sh_col is None:
             st.info("Non trovo chiaramente le colonne home/away shots per backtest.")
         else:
             st.write(f"Uso colonne: {home_sh_col} | {away_sh_col}")
             thr = st.number_input("Soglia backtest (es. 22.5)", value=22.5, step=0.5)
             window = st.slider("Span EWMA backtest", 3, 12, 6)
-            df_hist = df_tiri.copy().reset_index(drop=True)
-            preds=[]; actuals=[]
-            hist = {}
-            for idx, r in df_hist.iterrows():
-                ht = r.get(tiri_home_col); at = r.get(tiri_away_col)
-                if pd.isna(ht) or pd.isna(at):
-                    preds.append(None); actuals.append(None); continue
-                ht = str(ht).strip(); at = str(at).strip()
-                hvals = hist.get(ht, []); avals = hist.get(at, [])
-                mu_h = ewma(hvals, span=window) if len(hvals)>0 else (mean(hvals) if len(hvals)>0 else 0.0)
-                mu_a = ewma(avals, span=window) if len(avals)>0 else (mean(avals) if len(avals)>0 else 0.0)
-                mu_pred = mu_h + mu_a
-                p = p_over_mix(mu_pred, max(0.8, math.sqrt((np.std(hvals) if len(hvals)>1 else mu_h*0.25)**2 + (np.std(avals) if len(avals)>1 else mu_a*0.25)**2)), thr, w_p)
-                preds.append(p)
-                real_h = safe_float(r.get(home_sh_col)); real_a = safe_float(r.get(away_sh_col))
-                actuals.append(1 if (real_h + real_a) > thr else 0)
-                hist.setdefault(ht, []).append(real_h); hist.setdefault(at, []).append(real_a)
+            # feature pre-match per tutti gli span, calcolate una volta per versione dei dati
+            with timer.stage("backtest_features", len(df_tiri)):
+                bt_feats = data.derived("backtest_tiri", lambda: backtest_features(
+                    df_tiri.reset_index(drop=True), tiri_home_col, tiri_away_col, home_sh_col, away_sh_col),
+                    extend=lambda f, rows, _offsets: extend_features(
+                        f, rows.get("tiri"), tiri_home_col, tiri_away_col, home_sh_col, away_sh_col))
+            with timer.stage("backtest_eval", len(df_tiri)):
+                mu_bt, sigma_bt, actuals = backtest_from_features(bt_feats, thr, span=window)
+                preds = np.where(np.isnan(mu_bt), np.nan, p_over_batch(mu_bt, sigma_bt, [thr], w_p, use_lookup)[0][:, 0])
             df_bt = pd.DataFrame({"pred":preds,"actual":actuals}).dropna()
             if df_bt.empty:
                 st.info("Backtest non ha righe utili.")
             else:
-                cutoff = st.slider("Soglia probabilità per segnale OVER", 0.5, 0.9, 0.58)
+                sw_t = sweep(df_bt['pred'], df_bt['actual'])
+                cutoff = st.select_slider("Soglia probabilità per segnale OVER", options=list(CUTOFFS), value=0.58)
                 df_bt['pred_over'] = df_bt['pred'] >= cutoff
-                acc = (df_bt['pred_over'] == df_bt['actual']).mean()
+                acc = sw_t.loc[sw_t["cutoff"] == cutoff, "accuracy"].iloc[0]
                 st.metric("Accuracy backtest", f"{acc*100:.2f}%")
-                st.dataframe(df_bt.head(300))
+                bt_pages = max(1, -(-len(df_bt) // 300))
+                bt_pg = st.number_input(f"Pagina backtest tiri (di {bt_pages})", 1, bt_pages, 1)
+                st.dataframe(df_bt.iloc[(bt_pg - 1) * 300:bt_pg * 300])
+
+            with st.expander("Calibrazione parametri (span, α, peso Poisson, cutoff)"):
+                c1, c2, c3 = st.columns(3)
+                g_span = c1.multiselect("Span", DEFAULT_GRID["span"], default=DEFAULT_GRID["span"])
+                g_alpha = c2.multiselect("Shrink α", DEFAULT_GRID["alpha"], default=DEFAULT_GRID["alpha"])
+                g_wp = c3.multiselect("Peso Poisson", DEFAULT_GRID["w_pois"], default=DEFAULT_GRID["w_pois"])
+                n_random = st.number_input("Combinazioni casuali (0 = griglia completa)", 0, 10000, 0, step=10)
+                if st.button("Avvia calibrazione") and g_span and g_alpha and g_wp:
+                    with timer.stage("calibrate") as s:
+                        arrays = match_arrays(df_tiri.reset_index(drop=True), tiri_home_col, tiri_away_col,
+                                              home_sh_col, away_sh_col)
+                        res = calibrate(arrays, thr, grid={"span": g_span, "alpha": g_alpha, "w_pois": g_wp},
+                                        n_random=int(n_random) or None, lookup=use_lookup)
+                        s["rows"] = len(res)
+                    best = best_settings(res)
+                    st.table(pd.DataFrame(best).T[RESULT_COLUMNS])
+                    st.dataframe(res.sort_values("brier").head(200))
+
+# contatori memo stime (hit/miss) per il tuning della cache
+with st.sidebar.expander("Cache stime squadra"):
+    st.json(model.ESTIMATES.stats())
+
+# pannello profiling: ingest (una volta per versione dei dati) + stadi di questo rerun
+with st.sidebar.expander("Profiling (tempi per stadio)", expanded=PROFILE):
+    report = StageTimer()
+    report.extend(data.timings, "ingest/")
+    report.extend(timer.stages)
+    st.dataframe(pd.DataFrame(report.stages).round(4))
+    hot = hot_functions(cprof) if PROFILE else None
+    if hot:
+        st.write("Funzioni più costose (cProfile, tempo cumulativo):")
+        st.dataframe(pd.DataFrame(hot).round(4))
+    else:
+        st.caption("Aggiungi ?profile=1 all'URL per profilare il rerun con cProfile.")
+    st.download_button("Scarica JSON", report.to_json(file=EXCEL_NAMES, version=data.version,
+                                                      section=section, hot_functions=hot).encode("utf-8"),
+                       file_name="profiling.json", mime="application/json")
 
 st.markdown("<small>Nota: il raggiungimento del 75% dipende dai dati. Questo motore fornisce gli strumenti per testare, calibrare e migliorare il modello tramite backtest e ottimizzazione.</small>", unsafe_allow_html=True)    <!-- Navbar -->
     <nav class="bg-slate-900/95 backdrop-blur border-b border-slate-800 p-4 sticky top-0 z-50 flex justify-between items-center pt-safe-top shadow-2xl">
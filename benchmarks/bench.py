@@ -0,0 +1,181 @@
+# bench.py — benchmark per stadio della pipeline, senza UI
+#   python -m benchmarks.bench --scale 10 100 --out bench_results.json
+# Per ogni scala genera un workbook sintetico (benchmarks/synth.py) e misura separatamente:
+# lettura XLSX / snapshot, rilevamento fogli e colonne, storie, feature store,
+# compute_expect, p_over_mix (scalare e batch, esatto e tabulato), backtest (tiri e
+# walk-forward su tutte le metriche), slate e Monte Carlo (una partita e 10 partite).
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import scipy
+
+from benchmarks.synth import SAMPLE_ROWS, matches_for_scale, seasons_for_scale, workbook
+from statapp import model
+from statapp.backtest import backtest_arrays, backtest_lines
+from statapp.datamodel import select_sheets
+from statapp.features import FeatureStore
+from statapp.history import resolve_columns, build_histories
+from statapp.pricing import p_over_mix, p_over_batch
+from statapp.simulate import N_SIMS, simulate, simulate_slate
+from statapp.slate import all_fixtures, price_slate
+from statapp.snapshot import load_sheets
+from statapp.state import backtest_features, backtest_from_features
+from statapp.workbook import LazyWorkbook
+
+LINES = [8.5, 9.5, 10.5, 11.5, 12.5, 13.5, 14.5, 20.5, 22.5, 24.5]
+
+
+def timed(fn, repeat=3):
+    times = []
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return {"best_s": min(times), "mean_s": sum(times) / len(times), "repeat": repeat}, out
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_workbook(path, repeat=3, max_pairs=400):
+    stages = {}
+    st, sheets = timed(lambda: pd.read_excel(path, sheet_name=None), 1)
+    stages["load_xlsx"] = st
+    cache = tempfile.mkdtemp(prefix="statapp_bench_")
+    try:
+        stages["load_snapshot_cold"], _ = timed(lambda: load_sheets(path, cache_dir=cache), 1)
+        stages["load_snapshot_warm"], _ = timed(lambda: load_sheets(path, cache_dir=cache), repeat)
+    finally:
+        shutil.rmtree(cache, ignore_errors=True)
+
+    def lazy(cache_dir):
+        # solo intestazioni + i tre fogli selezionati
+        book = LazyWorkbook(path, cache_dir)
+        return book.load([n for n, _ in select_sheets(book.stubs()).values() if n is not None])
+    cache = tempfile.mkdtemp(prefix="statapp_bench_")
+    try:
+        stages["load_lazy_cold"], _ = timed(lambda: lazy(cache), 1)
+        stages["load_lazy_warm"], _ = timed(lambda: lazy(cache), repeat)
+    finally:
+        shutil.rmtree(cache, ignore_errors=True)
+
+    def detect():
+        sel = select_sheets(sheets)
+        f = {k: df for k, (_, df) in sel.items()}
+        return f, resolve_columns(f["tiri"], f["falli_ita"], f["falli_liga"])
+    stages["detect"], (frames, cols) = timed(detect, repeat)
+    rows = sum(len(df) for df in frames.values() if df is not None)
+
+    stages["build_histories"], (team_stats, arbitri_stats) = timed(
+        lambda: build_histories(frames["tiri"], frames["falli_ita"], frames["falli_liga"], cols), repeat)
+    stages["build_histories"]["items"] = rows
+    stages["feature_store"], features = timed(lambda: FeatureStore(team_stats), repeat)
+
+    teams = sorted(team_stats)
+    pairs = all_fixtures(teams)[:max_pairs]
+    key = "tiri"
+    stages["compute_expect_raw"], _ = timed(
+        lambda: [model.compute_expect(team_stats, h, a, key) for h, a in pairs], repeat)
+    stages["compute_expect_features"], _ = timed(
+        lambda: [model.compute_expect(team_stats, h, a, key, features=features) for h, a in pairs], repeat)
+    for s in ("compute_expect_raw", "compute_expect_features"):
+        stages[s]["items"] = len(pairs)
+
+    rng = np.random.default_rng(0)
+    mu = rng.uniform(5, 30, len(pairs)); sigma = rng.uniform(1, 6, len(pairs))
+    stages["p_over_mix_scalar"], _ = timed(
+        lambda: [p_over_mix(m, s, L) for m, s in zip(mu, sigma) for L in LINES], 1)
+    stages["p_over_mix_lookup"], _ = timed(
+        lambda: [p_over_mix(m, s, L, lookup=True) for m, s in zip(mu, sigma) for L in LINES], 1)
+    stages["p_over_batch"], _ = timed(lambda: p_over_batch(mu, sigma, LINES), repeat)
+    stages["p_over_batch_lookup"], _ = timed(lambda: p_over_batch(mu, sigma, LINES, lookup=True), repeat)
+    for s in ("p_over_mix_scalar", "p_over_mix_lookup", "p_over_batch", "p_over_batch_lookup"):
+        stages[s]["items"] = len(pairs) * len(LINES)
+
+    hc, ac, hs, as_ = cols["tiri_home"], cols["tiri_away"], cols["tiri_home_sh"], cols["tiri_away_sh"]
+    df_tiri = frames["tiri"]
+    if df_tiri is not None and None not in (hc, ac, hs, as_):
+        df_bt = df_tiri.reset_index(drop=True)
+        stages["backtest_features"], feats = timed(lambda: backtest_features(df_bt, hc, ac, hs, as_), repeat)
+        stages["backtest_eval"], _ = timed(lambda: backtest_from_features(feats, 22.5, 6), repeat)
+        stages["backtest_features"]["items"] = len(df_bt)
+    stages["backtest_all_arrays"], bt_arrays = timed(lambda: backtest_arrays(frames, cols), repeat)
+    stages["backtest_all_lines"], bt = timed(lambda: backtest_lines(bt_arrays, LINES), repeat)
+    stages["backtest_all_lines"]["items"] = len(bt)
+
+    stages["slate_all_pairs"], out = timed(
+        lambda: price_slate(team_stats, all_fixtures(teams), LINES, features=features), repeat)
+    stages["slate_all_pairs"]["items"] = len(out)
+
+    sides = np.array([[[12.0, 4.0, 10.0, 3.5], [4.5, 2.3, 3.8, 2.0], [12.0, 4.5, 13.0, 5.0]]])
+    stages["simulate_fixture"], _ = timed(lambda: simulate(sides, ["tiri", "sot", "falli"], N_SIMS, seed=0), repeat)
+    stages["simulate_fixture"]["items"] = N_SIMS
+    fx = [(h, a, None) for h, a in pairs[:10]]
+    stages["simulate_slate"], (sim, _) = timed(
+        lambda: simulate_slate(team_stats, fx, LINES, combos=["tiri>20.5 & falli>22.5"], features=features), repeat)
+    stages["simulate_slate"]["items"] = len(fx) * N_SIMS
+    return {"rows": rows, "teams": len(teams), "referees": len(arbitri_stats), "stages": stages}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="benchmarks.bench", description="Benchmark STAT APP per stadio")
+    ap.add_argument("--scale", type=float, nargs="+", default=[10, 100],
+                    help="multipli delle righe dei file di esempio (es. 10 100 1000)")
+    ap.add_argument("--teams", type=int, default=20)
+    ap.add_argument("--leagues", type=int, default=2)
+    ap.add_argument("--seasons", type=int, help="forza il numero di stagioni (ignora --scale)")
+    ap.add_argument("--kind", choices=["match", "aggregated"], nargs="+", default=["match", "aggregated"])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "statapp_bench_data"))
+    ap.add_argument("--out", default="bench_results.json")
+    args = ap.parse_args(argv)
+    warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
+
+    runs = []
+    for scale in args.scale:
+        # con --seasons stagioni complete, altrimenti partite per lega tagliate sulla scala
+        matches = None if args.seasons else matches_for_scale(scale, args.leagues)
+        seasons = args.seasons or seasons_for_scale(scale, args.teams, args.leagues)
+        for kind in args.kind:
+            t0 = time.perf_counter()
+            path = workbook(args.workdir, args.teams, seasons, args.leagues, kind=kind, matches=matches)
+            gen = time.perf_counter() - t0
+            res = bench_workbook(path, args.repeat)
+            res.update({"scale": scale, "kind": kind, "seasons": seasons, "matches_per_league": matches,
+                        "target_rows": None if args.seasons else int(round(scale * SAMPLE_ROWS)),
+                        "leagues": args.leagues, "teams_per_league": args.teams,
+                        "file_bytes": os.path.getsize(path), "generate_s": gen})
+            runs.append(res)
+            summary = ", ".join(f"{k} {v['best_s']*1e3:.1f}ms" for k, v in res["stages"].items())
+            print(f"[scale {scale:g} {kind}] {res['rows']} righe · {summary}", file=sys.stderr)
+
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_rev": _git_rev(),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "numpy": np.__version__, "pandas": pd.__version__, "scipy": scipy.__version__},
+        "runs": runs,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"risultati in {args.out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# synth.py — workbook sintetici multi-stagione/multi-lega per i benchmark
+# I nomi colonna sono quelli che find_col/resolve_columns si aspettano:
+#   tiri (match-level): Stagione, Lega, Giornata, Home, Away, Home Shots, Away Shots, Home SOT, Away SOT
+#   falli serie a / falli liga (una riga per squadra e match): Stagione, Squadra, Tipo, Falli, Arbitro
+# "Home"/"Away" senza la parola "team" tengono il foglio tiri in modalità match-level.
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+SAMPLE_ROWS = 184   # righe dei tre file di esempio (20 + 82 + 82)
+
+
+def matches_for_scale(scale, leagues=2):
+    # partite per lega perché il workbook abbia ~scale volte le righe dei file di esempio
+    # (ogni partita = 1 riga tiri + 2 righe falli): ogni scala ha la sua dimensione
+    return max(1, int(math.ceil(scale * SAMPLE_ROWS / (3 * leagues))))
+
+
+def seasons_for_scale(scale, teams=20, leagues=2):
+    # stagioni (l'ultima anche parziale) che contengono matches_for_scale partite per lega
+    return max(1, int(math.ceil(matches_for_scale(scale, leagues) / (teams * (teams - 1)))))
+
+
+def _fixtures(teams):
+    # doppio girone all'italiana
+    return [(h, a) for h in range(teams) for a in range(teams) if h != a]
+
+
+def generate(teams=20, seasons=1, leagues=2, seed=0, kind="match", matches=None):
+    # kind="match": foglio tiri match-level · kind="aggregated": una riga per squadra (Squadra, Tiri totali, Tiri in porta)
+    # matches: partite per lega (le stagioni si fermano lì); None = tutte le stagioni complete
+    rng = np.random.default_rng(seed)
+    fx = np.array(_fixtures(teams))
+    tiri, falli_ita, falli_liga = [], [], []
+    for lg in range(leagues):
+        names = np.array([f"L{lg}_Team{t:02d}" for t in range(teams)], dtype=object)
+        att = rng.gamma(20.0, 0.6, teams); fo = rng.gamma(30.0, 0.42, teams)
+        refs = np.array([f"Arbitro L{lg} {r:02d}" for r in range(max(4, teams // 2))], dtype=object)
+        left = matches if matches is not None else seasons * len(fx)
+        for s in range(seasons):
+            if left <= 0: break
+            season = f"{2000 + s}/{(s + 1) % 100:02d}"
+            order = rng.permutation(len(fx))[:left]
+            left -= len(order)
+            h, a = fx[order, 0], fx[order, 1]
+            m = len(h)
+            hs = rng.poisson(att[h] * 1.1); as_ = rng.poisson(att[a])
+            hsot = rng.binomial(hs, 0.34); asot = rng.binomial(as_, 0.32)
+            hf = rng.negative_binomial(12, 12 / (12 + fo[h])); af = rng.negative_binomial(12, 12 / (12 + fo[a]))
+            ref = refs[rng.integers(0, len(refs), m)]
+            giornata = np.arange(m) // max(1, teams // 2) + 1
+            tiri.append(pd.DataFrame({"Stagione": season, "Lega": f"L{lg}", "Giornata": giornata,
+                                      "Home": names[h], "Away": names[a], "Home Shots": hs, "Away Shots": as_,
+                                      "Home SOT": hsot, "Away SOT": asot}))
+            rows = pd.DataFrame({"Stagione": season, "Squadra": np.concatenate([names[h], names[a]]),
+                                 "Tipo": ["Casa"] * m + ["Fuori"] * m, "Falli": np.concatenate([hf, af]),
+                                 "Arbitro": np.concatenate([ref, ref])})
+            (falli_ita if lg % 2 == 0 else falli_liga).append(rows)
+    df_tiri = pd.concat(tiri, ignore_index=True)
+    if kind == "aggregated":
+        df_tiri = pd.DataFrame({
+            "Squadra": np.concatenate([df_tiri["Home"], df_tiri["Away"]]),
+            "Tiri totali": np.concatenate([df_tiri["Home Shots"], df_tiri["Away Shots"]]),
+            "Tiri in porta": np.concatenate([df_tiri["Home SOT"], df_tiri["Away SOT"]]),
+        })
+    sheets = {"tiri": df_tiri}
+    if falli_ita: sheets["falli_serie_a"] = pd.concat(falli_ita, ignore_index=True)
+    if falli_liga: sheets["falli_liga"] = pd.concat(falli_liga, ignore_index=True)
+    return sheets
+
+
+def write_workbook(path, sheets):
+    tmp = path + ".tmp.xlsx"
+    with pd.ExcelWriter(tmp, engine="openpyxl") as w:
+        for name, df in sheets.items():
+            df.to_excel(w, sheet_name=name, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def workbook(workdir, teams=20, seasons=1, leagues=2, seed=0, kind="match", matches=None):
+    # genera (o riusa) il workbook per questi parametri
+    os.makedirs(workdir, exist_ok=True)
+    m = f"_m{matches}" if matches is not None else ""
+    path = os.path.join(workdir, f"synth_{kind}_t{teams}_s{seasons}_l{leagues}{m}_r{seed}.xlsx")
+    if not os.path.exists(path):
+        write_workbook(path, generate(teams, seasons, leagues, seed, kind, matches))
+    return path
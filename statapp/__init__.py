@@ -0,0 +1,9 @@
+# statapp — motore STAT APP importabile senza Streamlit
+# (app.py è solo la UI; per i job batch: python -m statapp predict ...)
+from statapp.history import METRICS, safe_float, find_col, resolve_columns, build_histories
+from statapp.model import ewma, shrink_est, pstdev, team_estimate, compute_expect
+from statapp.pricing import p_over_mix, p_over_batch, safe_lines
+from statapp.datamodel import build_model, get_model
+from statapp.slate import price_slate, safe_slate
+from statapp.simulate import simulate, simulate_slate
+from statapp.store import Store
@@ -0,0 +1,6 @@
+import sys
+
+from statapp.cli import main
+
+if __name__ == "__main__":   # i worker forkserver/spawn reimportano il main
+    sys.exit(main())
@@ -0,0 +1,137 @@
+# backtest.py — walk-forward su tutte le metriche (tiri, sot, falli, falli_liga) e tutte le linee
+# Le statistiche pre-match (EWMA di ogni span, media, std, conteggio) arrivano in blocco da
+# features.walk_forward_sides: filtri ricorsivi sulle storie di ogni squadra letti al passo
+# precedente, quindi nessun match vede sé stesso o il futuro. Si calcolano una volta per
+# versione dei dati (backtest_arrays); span, alpha, peso Poisson e linee si applicano dopo
+# (backtest_lines) con una sola chiamata a p_over_batch per metrica.
+# Righe accodate (DataModel.with_rows): extend_arrays fa passare per il walk-forward solo le
+# righe nuove, ripartendo dallo stato finale di ogni squadra salvato negli array.
+# Fogli match-level (casa/ospite) -> previsione del totale; fogli con una riga per squadra e
+# partita (falli serie a / liga) non hanno l'avversaria, quindi si prevede il valore della squadra.
+import numpy as np
+import pandas as pd
+
+from statapp.features import SPANS, side_sequences, walk_forward_extend, walk_forward_sides, walk_forward_state
+from statapp.history import METRICS, history_parts, numeric_col, team_keys
+from statapp.pricing import p_over_batch
+from statapp.state import expect_from_stats
+
+BACKTEST_COLUMNS = ["metric", "row", "home", "away", "mu", "sigma", "total", "line", "p_over", "outcome"]
+
+
+def find_side_sot_col(df, side):
+    # tiri in porta casa/ospite nei fogli match-level (es. "Home SOT", "Away Shots on Target")
+    found = None
+    if df is None: return None
+    for c in df.columns:
+        cl = str(c).lower()
+        if side in cl and ("sot" in cl or "on target" in cl or "in porta" in cl):
+            found = c
+    return found
+
+
+def _sides(keys, vals, rows):
+    # (righe del foglio, chiavi (n, k), valori (n, k)): k=2 se casa/ospite intercalati
+    if len(rows) > 1 and len(rows) % 2 == 0 and np.array_equal(rows[0::2], rows[1::2]):
+        return rows[0::2], keys.reshape(-1, 2), vals.reshape(-1, 2)
+    return rows, keys.reshape(-1, 1), vals.reshape(-1, 1)
+
+
+def metric_sides(frames, cols):
+    # metrica -> (ruolo, righe, chiavi squadra (n, k), valori (n, k)) nell'ordine del foglio
+    f = frames
+    out = {}
+    for role, metric, keys, vals, rows in history_parts(f.get("tiri"), f.get("falli_ita"), f.get("falli_liga"), cols):
+        out[metric] = (role,) + _sides(keys, vals, rows)
+    df = f.get("tiri")
+    if "sot" not in out and df is not None and cols.get("tiri_home") in df.columns and cols.get("tiri_away") in df.columns:
+        hc, ac = find_side_sot_col(df, "home"), find_side_sot_col(df, "away")
+        if hc is not None and ac is not None:
+            keys = np.column_stack([team_keys(df[cols["tiri_home"]]), team_keys(df[cols["tiri_away"]])])
+            out["sot"] = ("tiri", np.arange(len(df)), keys, np.column_stack([numeric_col(df[hc]), numeric_col(df[ac])]))
+    return {m: out[m] for m in METRICS if m in out}
+
+
+def _row_hash(keys, vals):
+    # impronta per riga (squadre + valori): results.py la usa per riconoscere un prefisso già valutato
+    sig = pd.DataFrame({**{f"k{j}": keys[:, j] for j in range(keys.shape[1])},
+                        **{f"v{j}": vals[:, j] for j in range(vals.shape[1])}})
+    return pd.util.hash_pandas_object(sig, index=False).to_numpy()
+
+
+def backtest_arrays(frames, cols, spans=SPANS):
+    # statistiche pre-match di tutte le metriche, una volta per versione dei dati
+    out = {}
+    for metric, (_role, rows, keys, vals) in metric_sides(frames, cols).items():
+        flat = keys.ravel()
+        codes, names = pd.factorize(flat, use_na_sentinel=True)
+        codes = codes.astype(np.int64).reshape(keys.shape)
+        ew, mn, sd, cnt = walk_forward_sides(codes, vals, spans)
+        out[metric] = {"spans": tuple(spans), "rows": rows, "codes": codes, "names": np.asarray(names, dtype=object),
+                       "totals": vals.sum(axis=1), "valid": (codes >= 0).all(axis=1),
+                       "ew": ew, "mn": mn, "sd": sd, "cnt": cnt, "row_hash": _row_hash(keys, vals),
+                       "state": walk_forward_state(codes, vals, spans)}
+    return out
+
+
+def extend_arrays(arrays, frames, cols, offsets):
+    # backtest_arrays dopo righe accodate: frames {ruolo: righe nuove}, offsets {ruolo: righe
+    # già nel foglio}. Solo le righe nuove passano per il walk-forward; None se la forma
+    # cambia (metrica nuova, lati diversi) e serve una ricostruzione completa
+    out = dict(arrays)
+    for metric, (role, rows, keys, vals) in metric_sides(frames, cols).items():
+        a = arrays.get(metric)
+        if a is None or keys.shape[1] != a["codes"].shape[1]:
+            return None
+        lookup = {name: i for i, name in enumerate(a["names"])}
+        codes = np.array([-1 if pd.isna(k) else lookup.setdefault(k, len(lookup)) for k in keys.ravel()],
+                         dtype=np.int64).reshape(keys.shape)
+        ew, mn, sd, cnt = walk_forward_extend(a["state"], codes, vals, a["spans"])
+        cat = lambda key, new: np.concatenate([a[key], new])
+        out[metric] = {"spans": a["spans"], "rows": cat("rows", rows + offsets[role]), "codes": cat("codes", codes),
+                       "names": np.array(list(lookup), dtype=object), "totals": cat("totals", vals.sum(axis=1)),
+                       "valid": cat("valid", (codes >= 0).all(axis=1)),
+                       "ew": cat("ew", ew), "mn": cat("mn", mn), "sd": cat("sd", sd), "cnt": cat("cnt", cnt),
+                       "row_hash": cat("row_hash", _row_hash(keys, vals)),
+                       "state": a["state"].updated(side_sequences(codes, vals))}
+    return out
+
+
+def backtest_lines(arrays, lines, span=6, alpha=10.0, w_pois=0.6, min_history=1, metrics=None, start=None):
+    # DataFrame lungo: una riga per partita × linea con p_over e esito (1 = over), per metrica
+    # start {metrica: i}: solo le partite dalla i-esima in poi (le precedenti sono già valutate)
+    lines = np.asarray(sorted(lines), dtype=float)
+    parts = []
+    for metric, a in arrays.items():
+        if metrics is not None and metric not in metrics: continue
+        ok = a["valid"] & (a["cnt"].min(axis=1) >= min_history)
+        if start and start.get(metric):
+            ok[:start[metric]] = False
+        if not ok.any() or len(lines) == 0: continue
+        j = a["spans"].index(span)
+        mu, sigma = expect_from_stats(a["ew"][ok, :, j], a["mn"][ok], a["sd"][ok], a["cnt"][ok], alpha)
+        p_over, _ = p_over_batch(mu, sigma, lines, w_pois)
+        total = a["totals"][ok]
+        names = a["names"]; codes = a["codes"][ok]
+        L = len(lines); n = int(ok.sum())
+        rep = lambda v: np.repeat(v, L)
+        parts.append(pd.DataFrame({
+            "metric": metric, "row": rep(a["rows"][ok]), "home": rep(names[codes[:, 0]]),
+            "away": rep(names[codes[:, 1]]) if codes.shape[1] > 1 else None,
+            "mu": rep(mu), "sigma": rep(sigma), "total": rep(total), "line": np.tile(lines, n),
+            "p_over": p_over.ravel(), "outcome": (total[:, None] > lines[None, :]).ravel().astype(np.int8)}))
+    if not parts:
+        return pd.DataFrame(columns=BACKTEST_COLUMNS)
+    return pd.concat(parts, ignore_index=True)
+
+
+def line_summary(df, cutoff=0.5):
+    # per metrica × linea: partite, frequenza over, p media, brier e accuracy al cutoff
+    if df.empty:
+        return pd.DataFrame(columns=["metric", "line", "n", "over_rate", "p_mean", "brier", "accuracy"])
+    d = df.assign(sq=(df["p_over"] - df["outcome"]) ** 2,
+                  hit=((df["p_over"] >= cutoff) == (df["outcome"] > 0)).astype(float))
+    g = d.groupby(["metric", "line"], sort=False)
+    return pd.DataFrame({"n": g.size(), "over_rate": g["outcome"].mean(), "p_mean": g["p_over"].mean(),
+                         "brier": g["sq"].mean(), "accuracy": g["hit"].mean()}).reset_index()
+
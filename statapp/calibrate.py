@@ -0,0 +1,129 @@
+# calibrate.py — ricerca parametri (span, alpha, w_pois, cutoff) sul backtest match-level
+# Un task per span: il walk-forward si fa una volta sola, poi alpha × w_pois × cutoff
+# sono valutati in blocco. Gli array dei match stanno in shared memory: i worker li
+# leggono senza che vengano serializzati per ogni task. I worker partono con forkserver/spawn
+# (workbook._mp_context), mai con fork dal thread Streamlit.
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from statapp.pricing import p_over_batch
+from statapp.state import walk_forward_stats, expect_from_stats
+from statapp.workbook import _mp_context
+
+DEFAULT_GRID = {
+    "span": list(range(3, 13)),
+    "alpha": [1.0, 3.0, 5.0, 10.0, 15.0, 20.0, 30.0],
+    "w_pois": [0.0, 0.2, 0.4, 0.5, 0.6, 0.7, 0.8, 1.0],
+    "cutoff": [round(c, 2) for c in np.arange(0.5, 0.91, 0.02)],
+}
+RESULT_COLUMNS = ["span", "alpha", "w_pois", "cutoff", "brier", "log_loss", "accuracy", "n"]
+EPS = 1e-15
+
+_ARRAYS = None   # nei worker: (home_idx, away_idx, home_vals, away_vals)
+_SHM = None
+
+
+def _pack(arrays):
+    # un unico blocco shared memory con i quattro array float64 consecutivi
+    n = len(arrays[0])
+    shm = shared_memory.SharedMemory(create=True, size=max(1, 4 * n * 8))
+    buf = np.ndarray((4, n), dtype=np.float64, buffer=shm.buf)
+    for i, a in enumerate(arrays):
+        buf[i] = a
+    return shm, (shm.name, n)
+
+
+def _attach(spec):
+    global _ARRAYS, _SHM
+    name, n = spec
+    _SHM = shared_memory.SharedMemory(name=name)
+    buf = np.ndarray((4, n), dtype=np.float64, buffer=_SHM.buf)
+    _ARRAYS = (buf[0].astype(np.int64), buf[1].astype(np.int64), buf[2], buf[3])
+
+
+def score(p, y, cutoffs):
+    # brier, log-loss e accuracy per ogni cutoff; p: (n, k) · y: (n,)
+    y = y[:, None]
+    brier = ((p - y) ** 2).mean(axis=0)
+    pc = np.clip(p, EPS, 1 - EPS)
+    log_loss = -(y * np.log(pc) + (1 - y) * np.log(1 - pc)).mean(axis=0)
+    acc = ((p[:, :, None] >= np.asarray(cutoffs)[None, None, :]) == (y[:, :, None] > 0.5)).mean(axis=0)
+    return brier, log_loss, acc
+
+
+def _evaluate_span(span, combos, thr, cutoffs, min_history, lookup=False, arrays=None):
+    home_idx, away_idx, home_vals, away_vals = arrays if arrays is not None else _ARRAYS
+    ew, mn, sd, cnt = walk_forward_stats(home_idx, away_idx, home_vals, away_vals, span)
+    ok = (home_idx >= 0) & (away_idx >= 0) & (cnt.min(axis=1) >= min_history)
+    y = ((home_vals + away_vals) > thr)[ok].astype(float)
+    rows = []
+    if not ok.any(): return rows
+    alphas = sorted({a for a, _ in combos})
+    for alpha in alphas:
+        mu, sigma = expect_from_stats(ew[ok], mn[ok], sd[ok], cnt[ok], alpha)
+        wps = [w for a, w in combos if a == alpha]
+        # p è lineare in w_pois: le due componenti si calcolano una volta sola
+        p_pois = p_over_batch(mu, sigma, [thr], 1.0, lookup)[0]
+        p_norm = p_over_batch(mu, sigma, [thr], 0.0, lookup)[0]
+        w = np.asarray(wps, dtype=float)[None, :]
+        p = np.clip(w*p_pois + (1-w)*p_norm, 0.0, 1.0)
+        brier, log_loss, acc = score(p, y, cutoffs)
+        for j, w in enumerate(wps):
+            for c, a in zip(cutoffs, acc[j]):
+                rows.append((span, alpha, w, c, brier[j], log_loss[j], a, int(ok.sum())))
+    return rows
+
+
+def _evaluate_task(args):
+    return _evaluate_span(*args)
+
+
+def make_grid(grid=None, n_random=None, seed=0):
+    # griglia completa, oppure n_random combinazioni campionate dalla griglia
+    g = dict(DEFAULT_GRID, **(grid or {}))
+    combos = list(itertools.product(g["span"], g["alpha"], g["w_pois"]))
+    if n_random and n_random < len(combos):
+        rng = np.random.default_rng(seed)
+        combos = [combos[i] for i in sorted(rng.choice(len(combos), n_random, replace=False))]
+    return combos, list(g["cutoff"])
+
+
+def calibrate(arrays, thr, grid=None, n_random=None, seed=0, n_jobs=None, min_history=0, lookup=False):
+    # arrays: (home_idx, away_idx, home_vals, away_vals) come da state.match_arrays
+    combos, cutoffs = make_grid(grid, n_random, seed)
+    by_span = {}
+    for s, a, w in combos:
+        by_span.setdefault(s, []).append((a, w))
+    tasks = [(s, c, thr, cutoffs, min_history, lookup) for s, c in sorted(by_span.items())]
+    n_jobs = n_jobs or min(len(tasks), os.cpu_count() or 1)
+    arrays = tuple(np.asarray(a, dtype=float) for a in arrays[:4])
+    rows = []
+    if n_jobs <= 1 or len(tasks) <= 1:
+        arrays = (arrays[0].astype(np.int64), arrays[1].astype(np.int64), arrays[2], arrays[3])
+        for t in tasks:
+            rows.extend(_evaluate_span(*t, arrays=arrays))
+    else:
+        shm, spec = _pack(arrays)
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=_mp_context((__name__,)),
+                                     initializer=_attach, initargs=(spec,)) as ex:
+                for r in ex.map(_evaluate_task, tasks):
+                    rows.extend(r)
+        finally:
+            shm.close(); shm.unlink()
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def best_settings(results):
+    # migliore combinazione per ciascuna metrica (brier/log-loss minimi, accuracy massima)
+    if results.empty: return {}
+    return {
+        "brier": results.loc[results["brier"].idxmin()].to_dict(),
+        "log_loss": results.loc[results["log_loss"].idxmin()].to_dict(),
+        "accuracy": results.loc[results["accuracy"].idxmax()].to_dict(),
+    }
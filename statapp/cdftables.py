@@ -0,0 +1,106 @@
+# cdftables.py — cdf Poisson / Normale tabulate per il percorso caldo del pricing
+# Le tabelle si costruiscono una volta per processo (get_tables) e poi ogni cella è una
+# lookup + interpolazione cubica di Hermite con le derivate esatte:
+#   Normale:  Φ(z) su z ∈ [-Z_MAX, Z_MAX] passo Z_STEP, derivata φ(z).
+#             Errore <= max|Φ''''| · h⁴ / 384 = 0.5545 · h⁴ / 384 ≈ 8.6e-11 (h = 1/64);
+#             fuori intervallo 0/1 (errore < Φ(-8.5) ≈ 1e-17).
+#   Poisson:  F(k; μ) per k = 0..K_MAX, μ ∈ [0, MU_MAX] passo MU_STEP, derivata ∂F/∂μ = -pmf(k; μ).
+#             ∂⁴F/∂μ⁴ è una differenza terza della pmf, quindi |∂⁴F/∂μ⁴| <= 8 e
+#             l'errore è <= 8 · h⁴ / 384 = h⁴ / 48 ≈ 2.0e-8 (h = 1/32).
+#             Fuori tabella (μ > MU_MAX o k > K_MAX) si usa pdtr esatto.
+# Gli errori misurati (max_error) sono molto sotto questi limiti.
+import math
+import threading
+
+import numpy as np
+from scipy.special import ndtr, pdtr
+
+Z_MAX, Z_STEP = 8.5, 1.0 / 64
+MU_MAX, MU_STEP, K_MAX = 64.0, 1.0 / 32, 160
+
+NORM_BOUND = 0.5545 * Z_STEP ** 4 / 384
+POIS_BOUND = MU_STEP ** 4 / 48
+
+
+def _hermite(t, f0, d0, f1, d1, h):
+    t2 = t * t; t3 = t2 * t
+    return ((2 * t3 - 3 * t2 + 1) * f0 + (t3 - 2 * t2 + t) * h * d0
+            + (-2 * t3 + 3 * t2) * f1 + (t3 - t2) * h * d1)
+
+
+class CdfTables:
+    __slots__ = ("z_f", "z_d", "mu_f", "mu_d")
+
+    def __init__(self):
+        z = np.arange(-Z_MAX, Z_MAX + Z_STEP / 2, Z_STEP)
+        self.z_f = ndtr(z)
+        self.z_d = np.exp(-0.5 * z * z) / np.sqrt(2 * np.pi)
+        mu = np.arange(0.0, MU_MAX + MU_STEP / 2, MU_STEP)[:, None]
+        k = np.arange(K_MAX + 1)[None, :]
+        self.mu_f = pdtr(k, mu)                         # (M, K+1)
+        pmf = np.diff(self.mu_f, axis=1, prepend=0.0)   # pmf(k; μ) = F(k) - F(k-1)
+        self.mu_d = -pmf
+        for a in (self.z_f, self.z_d, self.mu_f, self.mu_d):
+            a.flags.writeable = False
+
+    def norm_cdf(self, z):
+        z = np.asarray(z, dtype=float)
+        u = (np.clip(np.nan_to_num(z), -Z_MAX, Z_MAX) + Z_MAX) / Z_STEP   # NaN -> indice valido, poi NaN
+        i = np.minimum(u.astype(np.int64), len(self.z_f) - 2)
+        t = u - i
+        out = _hermite(t, self.z_f[i], self.z_d[i], self.z_f[i + 1], self.z_d[i + 1], Z_STEP)
+        out = np.where(z <= -Z_MAX, 0.0, np.where(z >= Z_MAX, 1.0, out))
+        return np.where(np.isnan(z), np.nan, out)
+
+    def pois_cdf(self, k, mu):
+        # k intero (broadcast con mu); k < 0 -> 0, come pdtr
+        k, mu = np.broadcast_arrays(np.asarray(k, dtype=float), np.asarray(mu, dtype=float))
+        inside = (mu >= 0) & (mu < MU_MAX) & (k >= 0) & (k <= K_MAX)
+        u = np.where(inside, mu, 0.0) / MU_STEP
+        i = u.astype(np.int64); t = u - i
+        kk = np.where(inside, k, 0).astype(np.int64)
+        out = _hermite(t, self.mu_f[i, kk], self.mu_d[i, kk], self.mu_f[i + 1, kk], self.mu_d[i + 1, kk], MU_STEP)
+        out = np.asarray(np.clip(out, 0.0, 1.0))   # anche per input scalari (array 0-d)
+        if not inside.all():
+            rest = ~inside
+            out[rest] = np.where(k[rest] < 0, 0.0, pdtr(np.maximum(k[rest], 0.0), np.maximum(mu[rest], 0.0)))
+        return out
+
+    # versioni scalari (float Python) per p_over_mix: evitano l'overhead numpy su un solo valore
+    def norm_cdf1(self, z):
+        if z != z: return math.nan
+        if z <= -Z_MAX: return 0.0
+        if z >= Z_MAX: return 1.0
+        u = (z + Z_MAX) / Z_STEP; i = min(int(u), len(self.z_f) - 2)
+        return float(_hermite(u - i, self.z_f[i], self.z_d[i], self.z_f[i + 1], self.z_d[i + 1], Z_STEP))
+
+    def pois_cdf1(self, k, mu):
+        if k < 0: return 0.0
+        if not (0.0 <= mu < MU_MAX) or k > K_MAX:
+            return float(pdtr(k, max(mu, 0.0))) if mu == mu else math.nan
+        u = mu / MU_STEP; i = int(u); k = int(k)
+        f = _hermite(u - i, self.mu_f[i, k], self.mu_d[i, k], self.mu_f[i + 1, k], self.mu_d[i + 1, k], MU_STEP)
+        return min(1.0, max(0.0, float(f)))
+
+    def max_error(self, n=200_000, seed=0):
+        # errore massimo misurato contro scipy su punti casuali dentro le tabelle
+        rng = np.random.default_rng(seed)
+        z = rng.uniform(-Z_MAX, Z_MAX, n)
+        mu = rng.uniform(0, MU_MAX, n); k = rng.integers(0, K_MAX + 1, n)
+        return {"norm": float(np.abs(self.norm_cdf(z) - ndtr(z)).max()),
+                "poisson": float(np.abs(self.pois_cdf(k, mu) - pdtr(k, mu)).max()),
+                "norm_bound": NORM_BOUND, "poisson_bound": POIS_BOUND}
+
+
+_TABLES = None
+_LOCK = threading.Lock()
+
+
+def get_tables():
+    # tabelle condivise dal processo (≈ 5 MB), costruite alla prima richiesta
+    global _TABLES
+    if _TABLES is None:
+        with _LOCK:
+            if _TABLES is None:
+                _TABLES = CdfTables()
+    return _TABLES
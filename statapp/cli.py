@@ -0,0 +1,186 @@
+# cli.py — entry point batch senza Streamlit
+#   python -m statapp predict --fixtures giornata.csv --out pronostici.csv [--workbook dati.xlsx]
+#   python -m statapp backtest --lines 9.5 10.5 11.5 [--results backtest.sqlite]
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from statapp.backtest import backtest_arrays
+from statapp.datamodel import build_model
+from statapp.history import METRICS
+from statapp.ingest import ROLES, read_rows
+from statapp.results import ResultStore, source_key
+from statapp.slate import _normalize, all_fixtures, parse_fixtures, price_slate
+from statapp.sources import find_excels
+from statapp.store import Store
+
+DEFAULT_LINES = [9.5, 10.5, 11.5, 12.5]
+
+
+def read_fixtures(path):
+    # CSV/XLSX con colonne home, away[, referee] (o le prime due colonne); altrimenti testo "Casa - Ospite"
+    lower = path.lower()
+    if lower.endswith((".xlsx", ".xls")):
+        df = pd.read_excel(path)
+    elif lower.endswith(".csv"):
+        df = pd.read_csv(path)
+    else:
+        with open(path, encoding="utf-8") as f:
+            return parse_fixtures(f.read())
+    low = {str(c).lower(): c for c in df.columns}
+    home = low.get("home", df.columns[0]); away = low.get("away", df.columns[1])
+    ref = low.get("referee") or low.get("arbitro")
+    refs = df[ref] if ref is not None else [None] * len(df)
+    return [(h, a, r) for h, a, r in zip(df[home], df[away], refs) if pd.notna(h) and pd.notna(a)]
+
+
+def write_table(df, path):
+    if path in (None, "-"):
+        df.to_csv(sys.stdout, index=False)
+    elif path.lower().endswith(".json"):
+        df.to_json(path, orient="records", indent=1)
+    elif path.lower().endswith(".xlsx"):
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def _load_model(args):
+    paths = args.workbook or find_excels()
+    if not paths or not all(os.path.exists(p) for p in paths):
+        print("Nessun file Excel trovato: usa --workbook.", file=sys.stderr)
+        return None
+    return build_model(paths[0] if len(paths) == 1 else paths)
+
+
+def _predict_store(args):
+    # stime interrogando l'archivio SQLite: solo le squadre della lista e la finestra EWMA necessaria
+    store = Store(args.db)
+    try:
+        fixtures = all_fixtures(store.teams(args.league)) if args.all_pairs else read_fixtures(args.fixtures)
+        teams = {str(t).strip() for f in fixtures for t in f[:2]}
+        refs = {f[2] for f in _normalize(fixtures) if f[2] is not None}
+        # squadre con dati: EXISTS per (squadra, metrica); valori arbitro solo per gli arbitri in lista
+        team_stats = store.presence(teams, args.metrics, league=args.league)
+        arbitri_stats = store.referee_stats(refs, league=args.league)
+        out = price_slate(team_stats, fixtures, args.lines, args.metrics, span=args.span, alpha=args.alpha,
+                          w_pois=args.w_pois, arbitri_stats=arbitri_stats, features=store.view(args.league),
+                          version=f"{store.version}:{args.league}")
+    finally:
+        store.close()
+    return out, fixtures, team_stats
+
+
+def cmd_predict(args):
+    if args.db:
+        out, fixtures, team_stats = _predict_store(args)
+        write_table(out, args.out)
+        unknown = sorted({t for f in fixtures for t in f[:2] if t not in team_stats})
+        if unknown:
+            print(f"Squadre senza dati: {', '.join(unknown)}", file=sys.stderr)
+        return 0
+    data = _load_model(args)
+    if data is None:
+        return 2
+    for role, src in args.append or []:
+        data = data.with_rows(role, read_rows(src))
+    fixtures = all_fixtures(data.teams) if args.all_pairs else read_fixtures(args.fixtures)
+    out = price_slate(data.team_stats, fixtures, args.lines, args.metrics, span=args.span, alpha=args.alpha,
+                      w_pois=args.w_pois, arbitri_stats=data.arbitri_stats, features=data.features)
+    write_table(out, args.out)
+    unknown = sorted({t for f in fixtures for t in f[:2] if t not in data.team_stats})
+    if unknown:
+        print(f"Squadre senza dati: {', '.join(unknown)}", file=sys.stderr)
+    return 0
+
+
+def cmd_store(args):
+    # importa il workbook nell'archivio SQLite (sostituendo il contenuto) e/o accoda righe nuove
+    store = Store(args.db)
+    try:
+        if not args.append or args.workbook:
+            data = _load_model(args)
+            if data is None:
+                return 2
+            n = store.import_model(data)
+            print(f"{args.db}: {n} osservazioni importate", file=sys.stderr)
+        for role, src in args.append or []:
+            n = store.append(role, read_rows(src))
+            print(f"{args.db}: {n} osservazioni aggiunte ({role})", file=sys.stderr)
+        print(f"leghe: {', '.join(map(str, store.leagues()))} · squadre: {len(store.teams())}", file=sys.stderr)
+    finally:
+        store.close()
+    return 0
+
+
+def cmd_backtest(args):
+    # walk-forward su tutte le metriche; con l'archivio risultati si valutano solo le partite nuove
+    data = _load_model(args)
+    if data is None:
+        return 2
+    for role, src in args.append or []:
+        data = data.with_rows(role, read_rows(src))
+    results = ResultStore(args.results)
+    try:
+        run_id, info = results.run(source_key(data.path), data.version, backtest_arrays(data.frames, data.cols),
+                                   args.lines, span=args.span, alpha=args.alpha, w_pois=args.w_pois,
+                                   min_history=args.min_history, metrics=args.metrics)
+        print(f"run {run_id}: {info['evaluated']} previsioni calcolate, {info['reused']} dall'archivio",
+              file=sys.stderr)
+        write_table(results.summary(run_id, args.cutoff), args.out)
+    finally:
+        results.close()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="statapp", description="STAT APP — motore batch")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("predict", help="pronostici over/under per una lista di partite")
+    p.add_argument("--workbook", nargs="+",
+                   help="uno o più file Excel dati, uniti in un modello (default: ricerca automatica come l'app)")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--fixtures", help="CSV/XLSX (home, away[, referee]) o testo 'Casa - Ospite' per riga")
+    src.add_argument("--all-pairs", action="store_true", help="tutte le combinazioni squadre × squadre")
+    p.add_argument("--append", nargs=2, action="append", metavar=("RUOLO", "FILE"),
+                   help=f"righe nuove da accodare al foglio ({', '.join(ROLES)}), ripetibile")
+    p.add_argument("--out", default="-", help="output .csv/.json/.xlsx (default: stdout)")
+    p.add_argument("--lines", type=float, nargs="+", default=DEFAULT_LINES)
+    p.add_argument("--metrics", nargs="+", choices=METRICS, default=list(METRICS))
+    p.add_argument("--span", type=int, default=6)
+    p.add_argument("--alpha", type=float, default=10.0)
+    p.add_argument("--w-pois", type=float, default=0.6)
+    p.add_argument("--db", help="archivio SQLite (statapp store) al posto del workbook")
+    p.add_argument("--league", help="con --db: solo le storie di questa lega")
+    p.set_defaults(func=cmd_predict)
+
+    s = sub.add_parser("store", help="importa i dati in un archivio SQLite indicizzato")
+    s.add_argument("--db", default="statapp.sqlite")
+    s.add_argument("--workbook", nargs="+", help="file Excel da importare (default: ricerca automatica)")
+    s.add_argument("--append", nargs=2, action="append", metavar=("RUOLO", "FILE"),
+                   help=f"righe nuove da accodare ({', '.join(ROLES)}), ripetibile")
+    s.set_defaults(func=cmd_store)
+
+    b = sub.add_parser("backtest", help="walk-forward su tutte le metriche e linee (risultati in archivio)")
+    b.add_argument("--workbook", nargs="+", help="file Excel dati (default: ricerca automatica)")
+    b.add_argument("--append", nargs=2, action="append", metavar=("RUOLO", "FILE"),
+                   help=f"righe nuove da accodare al foglio ({', '.join(ROLES)}), ripetibile")
+    b.add_argument("--results", help="archivio SQLite dei risultati (default: cache dell'app)")
+    b.add_argument("--out", default="-", help="riepilogo per metrica × linea .csv/.json/.xlsx (default: stdout)")
+    b.add_argument("--lines", type=float, nargs="+", default=DEFAULT_LINES)
+    b.add_argument("--metrics", nargs="+", choices=METRICS, default=None)
+    b.add_argument("--span", type=int, default=6)
+    b.add_argument("--alpha", type=float, default=10.0)
+    b.add_argument("--w-pois", type=float, default=0.6)
+    b.add_argument("--min-history", type=int, default=3)
+    b.add_argument("--cutoff", type=float, default=0.58)
+    b.set_defaults(func=cmd_backtest)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,438 @@
+# datamodel.py — modello dati condiviso da tutte le sessioni del processo
+# Fogli selezionati, mapping colonne, storie squadra e tabelle arbitri vengono costruiti
+# una sola volta per impronta del file e restituiti in sola lettura: un cambio di widget
+# ricalcola solo la previsione, non l'ingest. Un cambio dei file viene ricostruito in
+# background mentre le sessioni continuano a usare il modello precedente.
+# Le righe accodate (with_rows) restano blocchi separati del foglio, concatenati solo alla
+# prima lettura, e gli artefatti derivati con una funzione di estensione passano alla
+# versione nuova aggiornati sulle sole righe nuove.
+import hashlib
+import os
+import threading
+from collections.abc import Mapping
+from concurrent.futures import Future
+from types import MappingProxyType
+
+import pandas as pd
+
+from statapp.features import FeatureStore
+from statapp.history import resolve_columns, build_histories
+from statapp.ingest import ROLES, align_rows, delta_histories, merge_stats, tail_rows, log_key
+from statapp.model import ESTIMATES
+from statapp.profiling import StageTimer
+from statapp.ring import TeamHistories
+from statapp.snapshot import file_fingerprint, sources_fingerprint
+from statapp.workbook import LazyWorkbook, MultiWorkbook, open_sources
+
+TIRI_KEYWORDS = ["tiri", "shots", "shots_on", "shoot"]
+FALLI_ITA_KEYWORDS = ["falli", "fouls", "arbitro", "referee", "serie a", "serie_a"]
+FALLI_LIGA_KEYWORDS = ["liga", "spagna", "spain", "laliga", "la liga", "falli_liga"]
+
+
+# funzione helper per trovare foglio con parola chiave
+def sheet_by_keyword(sheets, keywords):
+    for name, df in sheets.items():
+        lname = name.lower()
+        for kw in keywords:
+            if kw in lname:
+                return name, df
+    # fallback: try to find by column names
+    for name, df in sheets.items():
+        cols = " ".join([c.lower() for c in df.columns])
+        for kw in keywords:
+            if kw in cols:
+                return name, df
+    return None, None
+
+
+def select_sheets(sheets, exclusive=False):
+    # identifica fogli tiri / falli serie a / falli liga -> {ruolo: (nome, df)}
+    if exclusive:
+        return _select_exclusive(sheets)
+    tiri = sheet_by_keyword(sheets, TIRI_KEYWORDS)
+    falli_ita = sheet_by_keyword(sheets, FALLI_ITA_KEYWORDS)
+    falli_liga = sheet_by_keyword(sheets, FALLI_LIGA_KEYWORDS)
+
+    # se non trovati, prova a prendere altri fogli in ordine
+    if tiri[1] is None:
+        # try first sheet that contains numeric columns
+        for name, df in sheets.items():
+            if df.shape[1] >= 3:
+                tiri = (name, df); break
+    if falli_ita[1] is None:
+        for name, df in sheets.items():
+            if "arbitro" in " ".join([c.lower() for c in df.columns]) or "referee" in " ".join([c.lower() for c in df.columns]):
+                falli_ita = (name, df); break
+    if falli_liga[1] is None:
+        # try any sheet with 'liga' or 'spain' in name
+        for name, df in sheets.items():
+            if 'liga' in name.lower() or 'spain' in name.lower() or 'la liga' in name.lower():
+                falli_liga = (name, df); break
+    return {"tiri": tiri, "falli_ita": falli_ita, "falli_liga": falli_liga}
+
+
+def _select_exclusive(sheets):
+    # più file uniti: un foglio per ruolo, preferendo fogli non già assegnati
+    # (es. "tiri_serie_a/Foglio1" contiene "serie_a" ma appartiene ai tiri).
+    # Prima le parole chiave più specifiche (liga), poi tiri, infine falli serie a.
+    base = select_sheets(sheets)
+    picked, claimed = {}, set()
+    for role, keywords in (("falli_liga", FALLI_LIGA_KEYWORDS), ("tiri", TIRI_KEYWORDS),
+                           ("falli_ita", FALLI_ITA_KEYWORDS)):
+        hit = sheet_by_keyword({n: df for n, df in sheets.items() if n not in claimed}, keywords)
+        picked[role] = hit if hit[0] is not None else base[role]
+        if picked[role][0] is not None:
+            claimed.add(picked[role][0])
+    return {role: picked[role] for role in ("tiri", "falli_ita", "falli_liga")}
+
+
+def _freeze(stats):
+    # array in sola lettura + mapping immutabili
+    out = {}
+    for name, v in stats.items():
+        if isinstance(v, MappingProxyType):
+            out[name] = v  # già congelato (squadra non toccata da un append)
+        elif isinstance(v, dict):
+            out[name] = _freeze(v)
+        else:
+            v.flags.writeable = False
+            out[name] = v
+    return MappingProxyType(out)
+
+
+class SheetFrames(Mapping):
+    # ruolo -> DataFrame del foglio. Ogni ruolo ha una tupla di blocchi (stessa tupla per i
+    # ruoli sullo stesso foglio): la concatenazione avviene alla prima lettura, una volta per
+    # versione, invece che a ogni append
+    __slots__ = ("parts", "_full", "_lock")
+
+    def __init__(self, parts, full=None):
+        self.parts = parts
+        self._full = full or {}    # id(tupla di blocchi) -> frame concatenato
+        self._lock = threading.Lock()
+
+    @classmethod
+    def of(cls, frames):
+        return cls({role: None if df is None else (df,) for role, df in frames.items()})
+
+    def __getitem__(self, role):
+        parts = self.parts[role]
+        if parts is None or len(parts) == 1:
+            return None if parts is None else parts[0]
+        with self._lock:
+            full = self._full.get(id(parts))
+            if full is None:
+                full = self._full[id(parts)] = pd.concat(parts, ignore_index=True)
+            return full
+
+    def __iter__(self):
+        return iter(self.parts)
+
+    def __len__(self):
+        return len(self.parts)
+
+    def length(self, role):
+        return sum(len(df) for df in self.parts[role])
+
+    def appended(self, roles, rows):
+        # nuova mappa con `rows` in coda al foglio dei ruoli `roles`; gli altri fogli (e le
+        # loro concatenazioni già fatte) sono condivisi
+        with self._lock:
+            old = self.parts[roles[0]]
+            full = self._full.get(id(old))
+            keep = {k: v for k, v in self._full.items() if k != id(old)}
+        tail = ((full,) if full is not None else old) + (rows,)
+        return SheetFrames({r: tail if r in roles else p for r, p in self.parts.items()}, keep)
+
+
+class DataModel:
+    __slots__ = ("path", "fingerprint", "book", "sheet_names", "frames", "cols",
+                 "team_stats", "arbitri_stats", "teams", "features", "timings", "appended", "logs",
+                 "_version", "_derived", "_extend", "_lock")
+
+    def __init__(self, path, fingerprint, selected, timer=None, book=None, windows=None):
+        # windows: finestra massima per metrica delle storie (default ring.WINDOWS)
+        timer = timer if timer is not None else StageTimer()
+        self.path = path
+        self.fingerprint = fingerprint
+        self.book = book
+        self.sheet_names = {k: name for k, (name, _) in selected.items()}
+        self.frames = SheetFrames.of({k: df for k, (_, df) in selected.items()})
+        f = self.frames
+        rows = sum(len(df) for df in f.values() if df is not None)
+        with timer.stage("resolve_columns", rows):
+            self.cols = resolve_columns(f["tiri"], f["falli_ita"], f["falli_liga"])
+        with timer.stage("build_histories", rows):
+            team_stats, arbitri_stats = build_histories(f["tiri"], f["falli_ita"], f["falli_liga"], self.cols)
+            self.team_stats = TeamHistories.from_stats(team_stats, windows)
+        self.arbitri_stats = _freeze(arbitri_stats)
+        self.teams = tuple(sorted(team_stats))
+        with timer.stage("feature_store", len(self.teams)):
+            self.features = FeatureStore(self.team_stats)
+        # tempi dell'ingest (una volta per versione dei dati), mostrati nel pannello profiling
+        self.timings = tuple(timer.stages)
+        self.appended = 0      # righe aggiunte dopo l'ingest del file (with_rows)
+        self.logs = {}         # log CSV già letti -> offset
+        self._version = None
+        if self.team_stats.bounded:
+            # stesse righe ma finestre diverse -> stime diverse: la finestra entra nella versione
+            w = repr(sorted(self.team_stats.windows.items())).encode("utf-8")
+            self._version = f"{fingerprint['hash']}:{hashlib.blake2b(w, digest_size=8).hexdigest()}"
+        self._derived = {}
+        self._extend = {}
+        self._lock = threading.Lock()
+
+    def derived(self, key, build, extend=None):
+        # artefatti calcolati una volta per versione dei dati (es. feature del backtest).
+        # extend(valore, {ruolo: righe nuove}, {ruolo: righe già nel foglio}) -> valore per la
+        # versione con le righe accodate (None = da ricostruire)
+        with self._lock:
+            if extend is not None:
+                self._extend[key] = extend
+            if key not in self._derived:
+                self._derived[key] = build()
+            return self._derived[key]
+
+    def with_fingerprint(self, fingerprint):
+        # stesso modello (stessi dati, stessi derivati) con l'impronta dei file aggiornata
+        new = DataModel.__new__(DataModel)
+        for name in DataModel.__slots__:
+            setattr(new, name, getattr(self, name))
+        new.fingerprint = fingerprint
+        return new
+
+    def sheet(self, name):
+        # fogli non usati dal motore: parsati solo su richiesta
+        if self.book is None:
+            raise KeyError(name)
+        return self.book[name]
+
+    def with_rows(self, role, rows, log=None, offset=None):
+        # nuova versione del modello con le righe di una giornata accodate al foglio di `role`
+        # (e ai ruoli che usano lo stesso foglio). Storie e feature vengono aggiornate solo per
+        # le squadre toccate; il modello corrente resta valido per chi lo sta usando.
+        if role not in ROLES:
+            raise ValueError(f"Ruolo sconosciuto: {role}")
+        parts = self.frames.parts[role]   # colonne dal primo blocco: nessuna concatenazione
+        rows = align_rows(rows, None if parts is None else parts[0], self.cols, role)
+        sheet = self.sheet_names[role]
+        roles = [r for r in ROLES if r == role or (sheet is not None and self.sheet_names[r] == sheet)]
+        team_delta, arb_delta = delta_histories({r: rows for r in roles}, self.cols)
+        new = DataModel.__new__(DataModel)
+        new.path = self.path; new.fingerprint = self.fingerprint; new.book = self.book
+        new.sheet_names = self.sheet_names; new.cols = self.cols; new.timings = self.timings
+        new.frames = self.frames.appended(roles, rows)
+        new.team_stats = self.team_stats.appended(team_delta)
+        new.arbitri_stats = _freeze(merge_stats(self.arbitri_stats, arb_delta))
+        new.teams = tuple(sorted(new.team_stats))
+        # con finestre i valori usciti dalla coda cambiano media/EWMA: store ricalcolato (O(finestra))
+        new.features = FeatureStore(new.team_stats) if new.team_stats.bounded else self.features.updated(team_delta)
+        new.appended = self.appended + len(rows)
+        new.logs = dict(self.logs)
+        if log is not None:
+            new.logs[(role, log_key(log))] = offset
+        h = hashlib.blake2b(self.version.encode("utf-8"), digest_size=16)
+        h.update(pd.util.hash_pandas_object(rows, index=False).to_numpy().tobytes())
+        new._version = h.hexdigest()
+        # artefatti derivati estesi sulle righe nuove (gli altri si ricostruiscono alla richiesta)
+        with self._lock:
+            derived = dict(self._derived); new._extend = dict(self._extend)
+        added = {r: rows for r in roles}; offsets = {r: self.frames.length(r) for r in roles}
+        new._derived = {}
+        for key, val in derived.items():
+            ext = new._extend.get(key)
+            val = ext(val, added, offsets) if ext is not None else None
+            if val is not None:
+                new._derived[key] = val
+        new._lock = threading.Lock()
+        return new
+
+    @property
+    def version(self):
+        # identifica i dati: cambia se cambia il contenuto del file o se si accodano righe
+        return self._version or self.fingerprint["hash"]
+
+
+_MODELS = {}
+_PENDING = {}   # chiave -> thread di ricostruzione in corso
+_BUILDING = {}  # chiave -> Future del primo build (le altre sessioni sulla stessa chiave lo attendono)
+_FAILED = {}    # chiave -> stat dei file al tentativo fallito (niente retry finché non cambiano)
+_LOCK = threading.Lock()   # solo per leggere/scrivere i dizionari: mai tenuto durante un build
+
+
+def _multi(path):
+    return isinstance(path, (list, tuple)) and len(path) > 1
+
+
+def fingerprint_of(path, known=None):
+    # path: un file o una lista di file (impronta combinata)
+    if isinstance(path, (list, tuple)):
+        return sources_fingerprint(path, known) if _multi(path) else file_fingerprint(path[0], known)
+    return file_fingerprint(path, known)
+
+
+def build_model(path, fingerprint=None, loader=open_sources, windows=None):
+    # path: un workbook o una lista di workbook da unire (fogli "file/foglio")
+    # loader(path) -> LazyWorkbook/MultiWorkbook (selezione sulle intestazioni) o dict di DataFrame
+    timer = StageTimer()
+    with timer.stage("fingerprint"):
+        fingerprint = fingerprint or fingerprint_of(path)
+    with timer.stage("open_workbook") as s:
+        book = loader(path)
+        s["rows"] = len(book)
+    if isinstance(book, (LazyWorkbook, MultiWorkbook)):
+        with timer.stage("select_sheets", len(book)):
+            picked = select_sheets(book.stubs(), exclusive=isinstance(book, MultiWorkbook))
+        with timer.stage("load_sheets") as s:
+            frames = book.load([name for name, _ in picked.values() if name is not None])
+            s["rows"] = sum(len(df) for df in frames.values())
+        selected = {role: (name, frames[name] if name is not None else None) for role, (name, _) in picked.items()}
+    else:
+        with timer.stage("select_sheets", len(book)):
+            selected = select_sheets(book)
+    return DataModel(path, fingerprint, selected, timer, book, windows)
+
+
+def _swap(key, model):
+    # nuovo modello condiviso (chiamare sotto _LOCK): le stime memo della versione
+    # sostituita escono subito dalla LRU invece di restarci fino all'evizione
+    old = _MODELS.get(key)
+    _MODELS[key] = model
+    if old is not None and old.version != model.version:
+        ESTIMATES.invalidate(old.version)
+
+
+def _files(fp):
+    return fp.get("files", [fp])
+
+
+def _stat_sig(fp):
+    return tuple((f["path"], f["size"], f["mtime_ns"]) for f in _files(fp))
+
+
+def _disk_sig(fp):
+    # solo os.stat: nessuna lettura del file sul thread della richiesta
+    out = []
+    for f in _files(fp):
+        try:
+            st = os.stat(f["path"])
+            out.append((f["path"], st.st_size, st.st_mtime_ns))
+        except OSError:
+            out.append((f["path"], None, None))
+    return tuple(out)
+
+
+def _refresh(key, path, loader, cur, sig):
+    # in background: hash dei file e, se il contenuto è cambiato, nuovo modello + swap atomico
+    try:
+        fp = fingerprint_of(key, cur.fingerprint)
+        if fp["hash"] == cur.fingerprint["hash"]:
+            # file solo "toccato": stesso contenuto, nessun re-parse; copia con l'impronta nuova
+            # (chi ha già il modello continua a vedere quella vecchia, niente modifiche in place)
+            with _LOCK:
+                live = _MODELS.get(key)
+                if live is not None and live.fingerprint["hash"] == fp["hash"]:
+                    _MODELS[key] = live.with_fingerprint(fp)
+                _FAILED.pop(key, None)
+        else:
+            model = build_model(path, fp, loader)
+            with _LOCK:
+                _swap(key, model)
+                _FAILED.pop(key, None)
+    except Exception:
+        with _LOCK:
+            _FAILED[key] = sig  # file a metà scrittura o rimosso: si continua a servire il modello attuale
+    finally:
+        with _LOCK:
+            if _PENDING.get(key) is threading.current_thread():
+                _PENDING.pop(key, None)
+
+
+def _key(path):
+    return tuple(os.path.abspath(p) for p in path) if isinstance(path, (list, tuple)) else os.path.abspath(path)
+
+
+def reloading(path):
+    # True se è in corso la ricostruzione in background per questo file
+    return _key(path) in _PENDING
+
+
+def _first_build(key, path, loader):
+    # primo build di una chiave fuori da _LOCK: le altre chiavi (e i modelli già in memoria)
+    # restano servibili; chi chiede la stessa chiave nel frattempo attende lo stesso Future
+    with _LOCK:
+        cur = _MODELS.get(key)
+        if cur is not None:
+            return cur
+        fut = _BUILDING.get(key)
+        owner = fut is None
+        if owner:
+            fut = _BUILDING[key] = Future()
+    if not owner:
+        return fut.result()
+    try:
+        model = build_model(path, fingerprint_of(key), loader)
+    except BaseException as e:
+        with _LOCK:
+            _BUILDING.pop(key, None)
+        fut.set_exception(e)
+        raise
+    with _LOCK:
+        _MODELS[key] = model
+        _BUILDING.pop(key, None)
+    fut.set_result(model)
+    return model
+
+
+def get_model(path, loader=open_sources, wait=False):
+    # un solo modello per file (o insieme di file) nel processo.
+    # Stale-while-revalidate: se i file cambiano (mtime/size) si restituisce subito il modello
+    # attuale e un thread ricalcola hash e modello; lo swap avviene solo a costruzione finita.
+    # wait=True ricostruisce in modo sincrono (job batch).
+    key = _key(path)
+    cur = _MODELS.get(key)
+    if cur is None:
+        return _first_build(key, path, loader)
+    sig = _disk_sig(cur.fingerprint)
+    with _LOCK:
+        failed = _FAILED.get(key) == sig
+    if sig == _stat_sig(cur.fingerprint) or failed:
+        return cur
+    if wait:
+        _refresh(key, path, loader, cur, sig)
+        return _MODELS[key]
+    with _LOCK:
+        if key not in _PENDING:
+            t = threading.Thread(target=_refresh, args=(key, path, loader, cur, sig),
+                                 name="statapp-reload", daemon=True)
+            _PENDING[key] = t
+            t.start()
+    return cur
+
+
+# -----------------------------
+# Aggiunta incrementale (giornata nuova) sul modello condiviso
+# Le righe restano nel modello finché il workbook non cambia: la ricostruzione dal file
+# riparte dal solo contenuto del file.
+# -----------------------------
+def append_rows(path, role, rows, loader=open_sources):
+    key = _key(path)
+    get_model(path, loader)
+    with _LOCK:
+        new = _MODELS[key].with_rows(role, rows)
+        _swap(key, new)
+        return new
+
+
+def ingest_log(path, role, log, loader=open_sources):
+    # righe nuove di un log CSV append-only (dall'ultimo offset letto per questo modello)
+    key = _key(path)
+    get_model(path, loader)
+    with _LOCK:
+        cur = _MODELS[key]
+        rows, offset = tail_rows(log, cur.logs.get((role, log_key(log)), 0))
+        if rows.empty:
+            return cur
+        new = cur.with_rows(role, rows, log=log, offset=offset)
+        _swap(key, new)
+        return new
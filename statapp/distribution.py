@@ -0,0 +1,119 @@
+# distribution.py — distribuzione esatta del totale casa + ospite per convoluzione
+# Ogni lato è Poisson (varianza <= media) o binomiale negativa (sovra-dispersione,
+# tipica dei falli) con stessa media e varianza della stima squadra; la pmf del totale è
+# la convoluzione delle due (FFT per supporti lunghi). Le tabelle cdf sono in cache per
+# parametri: tutte le linee di una partita si leggono dallo stesso array cumulativo.
+import math
+
+import numpy as np
+from scipy.signal import fftconvolve
+from scipy.special import gammaln
+
+from statapp.model import EstimateCache
+
+TAIL = 1e-12      # massa di coda trascurata per lato
+FFT_MIN = 256     # sotto questa lunghezza np.convolve è più veloce della FFT
+DECIMALS = 6      # arrotondamento dei parametri nella chiave di cache
+
+TABLES = EstimateCache(maxsize=4096)
+
+
+def side_params(mu, sigma):
+    # (mu, sigma) per lato -> ("poisson", mu) o ("nbinom", r, p) con stessa media e varianza
+    mu = max(float(mu), 0.0); var = float(sigma) ** 2
+    if mu == 0.0 or var <= mu * (1.0 + 1e-9):
+        return ("poisson", mu)
+    r = mu * mu / (var - mu)
+    return ("nbinom", r, r / (r + mu))
+
+
+def _log_pmf(params, k):
+    # log-pmf con gammaln (senza l'overhead delle distribuzioni scipy.stats)
+    if params[0] == "poisson":
+        mu = params[1]
+        return k * math.log(mu) - mu - gammaln(k + 1.0)
+    r, p = params[1], params[2]
+    return gammaln(k + r) - gammaln(r) - gammaln(k + 1.0) + r * math.log(p) + k * math.log1p(-p)
+
+
+def side_pmf(mu, sigma):
+    # pmf su 0..K con K tale che la coda oltre K sia < TAIL
+    params = side_params(mu, sigma)
+    if params[0] == "poisson" and params[1] == 0.0:
+        return np.ones(1)
+    mean = max(float(mu), 0.0); sd = max(float(sigma), math.sqrt(mean))
+    kmax = int(mean + 15.0 * sd + 20.0)
+    while True:
+        pmf = np.exp(_log_pmf(params, np.arange(kmax + 1, dtype=float)))
+        cdf = np.cumsum(pmf)
+        if cdf[-1] >= 1.0 - TAIL or kmax > 1_000_000:
+            break
+        kmax *= 2   # code molto pesanti (dispersione estrema)
+    return pmf[:int(np.searchsorted(cdf, 1.0 - TAIL)) + 1]
+
+
+def convolve(a, b):
+    if min(len(a), len(b)) >= FFT_MIN:
+        return np.clip(fftconvolve(a, b), 0.0, None)
+    return np.convolve(a, b)
+
+
+def _cdf_table(mu_h, sigma_h, mu_a, sigma_a):
+    pmf = convolve(side_pmf(mu_h, sigma_h), side_pmf(mu_a, sigma_a))
+    cdf = np.minimum(np.cumsum(pmf), 1.0)
+    cdf.flags.writeable = False
+    return cdf
+
+
+def total_cdf(mu_h, sigma_h, mu_a, sigma_a):
+    # cdf del totale su 0..K (in cache per parametri arrotondati)
+    key = tuple(round(float(v), DECIMALS) for v in (mu_h, sigma_h, mu_a, sigma_a))
+    return TABLES.get(key, lambda: _cdf_table(*key))
+
+
+def p_over_cdf(cdf, lines):
+    # P(totale > linea) = 1 - F(floor(linea)) per tutte le linee da un solo array
+    k = np.floor(np.asarray(lines, dtype=float)).astype(np.int64)
+    F = np.where(k < 0, 0.0, cdf[np.clip(k, 0, len(cdf) - 1)])
+    return np.clip(1.0 - F, 0.0, 1.0)
+
+
+def p_over_exact(mu_h, sigma_h, mu_a, sigma_a, lines):
+    # array (n,) per lato · lines (L,) -> (p_over, p_under) di forma (n, L); NaN -> p_over 0.0
+    cols = [np.asarray(v, dtype=float).ravel() for v in (mu_h, sigma_h, mu_a, sigma_a)]
+    p = np.zeros((len(cols[0]), len(lines)))
+    for i, params in enumerate(zip(*cols)):
+        if any(math.isnan(v) for v in params): continue
+        p[i] = p_over_cdf(total_cdf(*params), lines)
+    return p, 1.0 - p
+
+
+def scale_sides(mu_h, sigma_h, mu_a, sigma_a, mu_tot):
+    # porta la somma delle medie a mu_tot (es. correzione arbitro) mantenendo l'indice di dispersione
+    base = mu_h + mu_a
+    f = mu_tot / base if base > 0 else 1.0
+    f = max(f, 0.0)
+    return mu_h * f, sigma_h * math.sqrt(f), mu_a * f, sigma_a * math.sqrt(f)
+
+
+def lines_table_exact(mu_h, sigma_h, mu_a, sigma_a, lines):
+    # come pricing.lines_table ma dalla distribuzione esatta
+    lines = sorted(lines)
+    p = p_over_cdf(total_cdf(mu_h, sigma_h, mu_a, sigma_a), lines)
+    return [{"line": L, "p_over": round(float(po), 3), "p_under": round(float(1 - po), 3)}
+            for L, po in zip(lines, p)]
+
+
+def safe_lines_exact(mu_h, sigma_h, mu_a, sigma_a, conf=0.7):
+    # come pricing.safe_lines ma dalla cdf esatta: due searchsorted per partita
+    cols = [np.asarray(v, dtype=float).ravel() for v in (mu_h, sigma_h, mu_a, sigma_a)]
+    out = np.full((4, len(cols[0])), np.nan)
+    for i, params in enumerate(zip(*cols)):
+        if any(math.isnan(v) for v in params): continue
+        cdf = total_cdf(*params)
+        n_over = int(np.searchsorted(cdf, 1.0 - conf, side="right")) - 1   # max n con F(n) <= 1 - conf
+        n_under = min(int(np.searchsorted(cdf, conf, side="left")), len(cdf) - 1)
+        if n_over >= 0:
+            out[0, i] = n_over + 0.5; out[1, i] = 1.0 - cdf[n_over]
+        out[2, i] = n_under + 0.5; out[3, i] = cdf[n_under]
+    return tuple(out)
@@ -0,0 +1,214 @@
+# features.py — feature store EWMA multi-span calcolato una volta all'ingest
+# Per ogni metrica le storie delle squadre sono impilate in una matrice (squadre × partite)
+# e filtrate con lfilter lungo l'asse del tempo, uno span alla volta: tutte le squadre in
+# una chiamata. compute_expect e il backtest leggono i valori già pronti, quindi muovere
+# lo slider dello span non ritocca le storie grezze.
+import numpy as np
+from scipy.signal import lfilter
+
+SPANS = tuple(range(3, 13))   # range dello slider "Span EWMA"
+
+
+def ewma_paths(V, spans=SPANS):
+    # V: (G, L) storie allineate a sinistra (padding a destra ignorato).
+    # Ritorna (S, G, L): EWMA adjust=False di ogni prefisso, come pd.Series.ewm(span, adjust=False)
+    out = np.empty((len(spans),) + V.shape)
+    if V.size == 0: return out
+    for j, span in enumerate(spans):
+        a = 2.0 / (span + 1.0)
+        # zi scelto in modo che il primo valore filtrato sia x0
+        out[j], _ = lfilter([a], [1.0, a - 1.0], V, axis=1, zi=(1.0 - a) * V[:, :1])
+    return out
+
+
+def _pad(groups):
+    lens = np.array([len(g) for g in groups], dtype=np.int64)
+    V = np.zeros((len(groups), int(lens.max()) if len(groups) else 0))
+    for i, g in enumerate(groups):
+        V[i, :len(g)] = g
+    return V, lens
+
+
+# -----------------------------
+# Store per team_stats (compute_expect)
+# -----------------------------
+class FeatureStore:
+    __slots__ = ("spans", "index", "n", "mean", "std", "ewma")
+
+    def __init__(self, team_stats, spans=SPANS):
+        self.spans = tuple(spans)
+        self.index = {}; self.n = {}; self.mean = {}; self.std = {}; self.ewma = {}
+        by_key = {}
+        for team, metrics in team_stats.items():
+            for key, vals in metrics.items():
+                by_key.setdefault(key, []).append((team, np.asarray(vals, dtype=float)))
+        for key, items in by_key.items():
+            teams = [t for t, _ in items]; groups = [v for _, v in items]
+            V, lens = _pad(groups)
+            rows = np.arange(len(groups))
+            self.index[key] = {t: i for i, t in enumerate(teams)}
+            self.n[key] = lens
+            self.mean[key] = np.array([g.mean() if len(g) else 0.0 for g in groups])
+            self.std[key] = np.array([g.std() if len(g) else 0.0 for g in groups])
+            last = np.maximum(lens - 1, 0)
+            self.ewma[key] = ewma_paths(V, self.spans)[:, rows, last] if len(groups) else np.zeros((len(self.spans), 0))
+
+    def updated(self, delta):
+        # nuova versione dello store con i valori di delta accodati: per le squadre toccate
+        # EWMA (ripartendo dall'ultimo valore) e media/varianza (merge di Chan) costano
+        # O(valori nuovi); le altre squadre sono copiate così come sono
+        new = FeatureStore.__new__(FeatureStore)
+        new.spans = self.spans
+        new.index = {k: dict(v) for k, v in self.index.items()}
+        new.n = dict(self.n); new.mean = dict(self.mean); new.std = dict(self.std); new.ewma = dict(self.ewma)
+        touched = set()
+        for team, metrics in delta.items():
+            for key, vals in metrics.items():
+                vals = np.asarray(vals, dtype=float)
+                if len(vals) == 0: continue
+                if key not in touched:
+                    touched.add(key)
+                    new.index.setdefault(key, {})
+                    new.n[key] = new.n.get(key, np.zeros(0, dtype=np.int64)).copy()
+                    new.mean[key] = new.mean.get(key, np.zeros(0)).copy()
+                    new.std[key] = new.std.get(key, np.zeros(0)).copy()
+                    new.ewma[key] = new.ewma.get(key, np.zeros((len(self.spans), 0))).copy()
+                idx = new.index[key]
+                i = idx.get(team)
+                if i is None:
+                    i = idx[team] = len(idx)
+                    new.n[key] = np.append(new.n[key], 0); new.mean[key] = np.append(new.mean[key], 0.0)
+                    new.std[key] = np.append(new.std[key], 0.0)
+                    new.ewma[key] = np.concatenate([new.ewma[key], np.zeros((len(self.spans), 1))], axis=1)
+                n0 = int(new.n[key][i]); k = len(vals); n1 = n0 + k
+                m0 = new.mean[key][i]; mb = vals.mean()
+                d = mb - m0
+                m2 = new.std[key][i] ** 2 * n0 + ((vals - mb) ** 2).sum() + d * d * n0 * k / n1
+                new.n[key][i] = n1; new.mean[key][i] = m0 + d * k / n1; new.std[key][i] = np.sqrt(m2 / n1)
+                for j, span in enumerate(self.spans):
+                    a = 2.0 / (span + 1.0)
+                    prev = new.ewma[key][j, i] if n0 > 0 else vals[0]
+                    y, _ = lfilter([a], [1.0, a - 1.0], vals, zi=[(1.0 - a) * prev])
+                    new.ewma[key][j, i] = y[-1]
+        return new
+
+    def team_estimate(self, team, key, span=6, alpha=10.0):
+        # stesse formule di model.team_estimate; None se lo span non è nello store
+        if span not in self.spans: return None
+        i = self.index.get(key, {}).get(team)
+        if i is None or self.n[key][i] == 0:
+            return 0.0, 0.6
+        n = int(self.n[key][i])
+        mu_overall = float(self.mean[key][i])
+        mu_recent = float(self.ewma[key][self.spans.index(span), i])
+        w = n/(n+alpha)
+        mu = w*(0.7*mu_recent + 0.3*mu_overall) + (1-w)*mu_overall
+        sigma = max(0.6, float(self.std[key][i]) if n>1 else max(0.6, mu*0.25))
+        return mu, sigma
+
+
+# -----------------------------
+# Feature pre-match per il walk-forward (backtest / calibrazione)
+# -----------------------------
+def walk_forward_features(home_idx, away_idx, home_vals, away_vals, spans=SPANS):
+    # Per ogni match e lato (0 casa, 1 ospite) le statistiche della squadra calcolate solo
+    # sui match precedenti: ewma (n, 2, S), media, std di popolazione e conteggio (n, 2).
+    # Righe con squadra mancante (codice < 0) restano a zero.
+    return walk_forward_sides(np.column_stack([home_idx, away_idx]), np.column_stack([home_vals, away_vals]), spans)
+
+
+def walk_forward_sides(codes, vals, spans=SPANS):
+    # Come walk_forward_features con k lati per riga: codes/vals (n, k), k=2 per i fogli
+    # match-level (casa, ospite), k=1 per i fogli con una riga per squadra e partita.
+    # Ritorna ewma (n, k, S), media, std e conteggio (n, k) pre-match; righe con un codice < 0 a zero.
+    codes = np.asarray(codes, dtype=np.int64); codes = codes.reshape(len(codes), -1)
+    vals = np.asarray(vals, dtype=float).reshape(codes.shape)
+    n, k_sides = codes.shape; S = len(spans)
+    ew = np.zeros((n, k_sides, S)); mn = np.zeros((n, k_sides)); sd = np.zeros((n, k_sides)); cnt = np.zeros((n, k_sides))
+    ok = np.flatnonzero((codes >= 0).all(axis=1))
+    if len(ok) == 0:
+        return ew, mn, sd, cnt
+    # apparizioni in ordine cronologico: i lati di ogni riga in ordine (casa poi ospite)
+    codes_ok = codes[ok]
+    sc_all = codes_ok.ravel(); sv_all = vals[ok].ravel()
+    order = np.argsort(sc_all, kind="stable")
+    sc = sc_all[order]; sv = sv_all[order]
+    G = int(sc.max()) + 1
+    counts = np.bincount(sc, minlength=G)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    pos = np.arange(len(sc)) - starts[sc]           # partite precedenti della squadra
+    # media/varianza dei prefissi via somme cumulative centrate sulla media di squadra
+    gmean = np.bincount(sc, weights=sv, minlength=G) / np.maximum(counts, 1)
+    xc = sv - gmean[sc]
+    c1 = np.concatenate([[0.0], np.cumsum(xc)]); c2 = np.concatenate([[0.0], np.cumsum(xc * xc)])
+    k = pos.astype(float)
+    s1 = c1[starts[sc] + pos] - c1[starts[sc]]; s2 = c2[starts[sc] + pos] - c2[starts[sc]]
+    kk = np.maximum(k, 1.0)
+    pre_mean = np.where(k > 0, s1 / kk + gmean[sc], 0.0)
+    pre_var = np.where(k > 1, np.maximum(s2 / kk - (s1 / kk) ** 2, 0.0), 0.0)
+    # EWMA dei prefissi: valore al passo pos-1 del percorso della squadra
+    V = np.zeros((G, int(counts.max())))
+    V[sc, pos] = sv
+    E = ewma_paths(V, spans)
+    pre_ew = np.where(k[None, :] > 0, E[:, sc, np.maximum(pos - 1, 0)], 0.0).T   # (m, S)
+    # torna all'ordine delle apparizioni: idx[r, j] = apparizione del lato j della riga r
+    inv = np.empty_like(order); inv[order] = np.arange(len(order))
+    idx = inv.reshape(len(ok), k_sides)
+    # stessa squadra su più lati: i lati successivi vedono lo stato prima del match, come il loop
+    for j in range(1, k_sides):
+        for i in range(j):
+            idx[:, j] = np.where(codes_ok[:, j] == codes_ok[:, i], idx[:, i], idx[:, j])
+    ew[ok] = pre_ew[idx]; mn[ok] = pre_mean[idx]
+    sd[ok] = np.sqrt(pre_var[idx]); cnt[ok] = k[idx]
+    return ew, mn, sd, cnt
+
+
+def side_sequences(codes, vals):
+    # codice squadra -> {"v": valori nell'ordine del walk-forward} (righe complete, lati in ordine)
+    codes = np.asarray(codes, dtype=np.int64); codes = codes if codes.ndim == 2 else codes.reshape(-1, 1)
+    vals = np.asarray(vals, dtype=float).reshape(codes.shape)
+    ok = (codes >= 0).all(axis=1)
+    sc = codes[ok].ravel(); sv = vals[ok].ravel()
+    if len(sc) == 0: return {}
+    order = np.argsort(sc, kind="stable"); sc = sc[order]; sv = sv[order]
+    cuts = np.flatnonzero(np.diff(sc)) + 1
+    return {int(g[0]): {"v": v} for g, v in zip(np.split(sc, cuts), np.split(sv, cuts))}
+
+
+def walk_forward_state(codes, vals, spans=SPANS):
+    # stato finale di ogni squadra dopo tutte le righe: FeatureStore per codice (chiave "v")
+    return FeatureStore(side_sequences(codes, vals), spans)
+
+
+def walk_forward_extend(state, codes, vals, spans=SPANS):
+    # pre-match come walk_forward_sides per righe accodate dopo quelle riassunte in `state`:
+    # statistiche del solo blocco nuovo combinate con lo stato di ogni squadra (merge di Chan
+    # per media/varianza; EWMA del blocco, partita dal primo valore, corretta di
+    # (1-a)^k · (ewma precedente - primo valore)). Costo O(righe nuove).
+    codes = np.asarray(codes, dtype=np.int64); codes = codes if codes.ndim == 2 else codes.reshape(-1, 1)
+    vals = np.asarray(vals, dtype=float).reshape(codes.shape)
+    ew, mn, sd, cnt = walk_forward_sides(codes, vals, spans)
+    ok = (codes >= 0).all(axis=1)
+    if not ok.any() or "v" not in state.n:
+        return ew, mn, sd, cnt
+    c = codes[ok]; flat = c.ravel()
+    uniq, first = np.unique(flat, return_index=True)
+    at = np.searchsorted(uniq, c)
+    x0 = vals[ok].ravel()[first][at]                                   # primo valore del blocco
+    index = state.index["v"]
+    pos = np.array([index.get(int(t), -1) for t in uniq], dtype=np.int64)[at]
+    has = pos >= 0; p = np.where(has, pos, 0)
+    n0 = np.where(has, state.n["v"][p], 0).astype(float)
+    m0 = np.where(has, state.mean["v"][p], 0.0); s0 = np.where(has, state.std["v"][p], 0.0)
+    e0 = np.where(has[..., None], np.moveaxis(state.ewma["v"][:, p], 0, -1), 0.0)   # (m, k, S)
+    k = cnt[ok]; mk = mn[ok]; vk = sd[ok] ** 2
+    n1 = n0 + k; d = np.maximum(n1, 1.0)
+    mean = np.where(n1 > 0, (n0 * m0 + k * mk) / d, 0.0)
+    m2 = n0 * s0 ** 2 + k * vk + (mk - m0) ** 2 * n0 * k / d
+    var = np.where(n1 > 1, np.maximum(m2 / d, 0.0), 0.0)
+    a = 2.0 / (np.asarray(spans, dtype=float) + 1.0)
+    decay = (1.0 - a) ** k[..., None]
+    old = (n0 > 0)[..., None]
+    e = np.where(k[..., None] > 0, ew[ok] + np.where(old, decay * (e0 - x0[..., None]), 0.0), np.where(old, e0, 0.0))
+    ew[ok] = e; mn[ok] = mean; sd[ok] = np.sqrt(var); cnt[ok] = n1
+    return ew, mn, sd, cnt
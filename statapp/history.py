@@ -0,0 +1,169 @@
+# history.py — ingest colonnare delle storie squadra/arbitro
+# Le colonne vengono risolte una volta sola, convertite in blocco con pandas
+# e raggruppate per squadra in array NumPy contigui (niente iterrows).
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+METRICS = ("tiri", "sot", "falli", "falli_liga")
+
+
+def safe_float(v, default=0.0):
+    try:
+        if v is None or pd.isna(v):
+            return default
+        if isinstance(v, str):
+            v = v.strip().replace(",", ".")
+        return float(v)
+    except (TypeError, ValueError):
+        return default
+
+
+def numeric_col(s, default=0.0):
+    # equivalente vettoriale di safe_float su una colonna intera
+    if is_numeric_dtype(s):
+        out = pd.to_numeric(s, errors="coerce").astype(float)
+    else:
+        txt = s.astype(str).str.strip().str.replace(",", ".", regex=False)
+        out = pd.to_numeric(txt, errors="coerce").where(s.notna())
+    return out.fillna(default).to_numpy(dtype=float)
+
+
+def team_keys(s):
+    # nomi squadra normalizzati; None dove la riga va scartata
+    keys = s.astype(str).str.strip()
+    keys = keys.where(s.notna() & (keys != ""))
+    return keys.to_numpy(dtype=object)
+
+
+# -----------------------------
+# mapping colonne tollerante
+# -----------------------------
+def find_col(df, candidates):
+    if df is None: return None
+    cols = list(df.columns)
+    low = {c.lower(): c for c in cols}
+    for cand in candidates:
+        if cand.lower() in low:
+            return low[cand.lower()]
+    for cand in candidates:
+        k = cand.lower()
+        for c in cols:
+            if k in c.lower():
+                return c
+    return None
+
+
+def find_side_col(df, side):
+    # colonna tiri home/away per fogli match-level (vince l'ultima che combacia)
+    found = None
+    if df is None: return None
+    for c in df.columns:
+        cl = c.lower()
+        if side in cl and ("shot" in cl or "tiri" in cl):
+            found = c
+    return found
+
+
+def resolve_columns(df_tiri, df_falli_ita, df_falli_liga):
+    return {
+        "tiri_team": find_col(df_tiri, ["squadra","team","team name"]),
+        "tiri_home": find_col(df_tiri, ["home team","squadra_casa","home"]),
+        "tiri_away": find_col(df_tiri, ["away team","squadra_ospite","away"]),
+        "tiri_tot": find_col(df_tiri, ["tiri_tot","tiri totali","total shots","shots"]),
+        "tiri_sot": find_col(df_tiri, ["tiri in porta","shots on target","sot","shots_on_target"]),
+        "tiri_home_sh": find_side_col(df_tiri, "home"),
+        "tiri_away_sh": find_side_col(df_tiri, "away"),
+        "falli_ita_team": find_col(df_falli_ita, ["squadra","team"]),
+        "falli_ita_falli": find_col(df_falli_ita, ["falli","fouls","falli_commessi"]),
+        "falli_ita_arb": find_col(df_falli_ita, ["arbitro","referee","official"]),
+        "falli_ita_arb_mean": find_col(df_falli_ita, ["media_arbitro","avg_ref","ref_avg"]),
+        "falli_liga_team": find_col(df_falli_liga, ["squadra","team"]),
+        "falli_liga_falli": find_col(df_falli_liga, ["falli","fouls"]),
+    }
+
+
+# -----------------------------
+# Build histories
+# -----------------------------
+def _has(df, col):
+    return df is not None and col is not None and col in df.columns
+
+
+def _group_into(out, keys, values, key):
+    mask = pd.notna(keys)
+    if not mask.any(): return
+    keys = keys[mask]; values = values[mask]
+    for team, idx in pd.Series(values).groupby(keys, sort=False).indices.items():
+        out.setdefault(team, {})[key] = np.ascontiguousarray(values[idx])
+
+
+def _tiri_long(df, cols):
+    # match-level: home e away intercalati come nel loop originale (riga per riga, home prima)
+    n = len(df)
+    zeros = np.zeros(n)
+    home = team_keys(df[cols["tiri_home"]]) if _has(df, cols["tiri_home"]) else np.full(n, None, dtype=object)
+    away = team_keys(df[cols["tiri_away"]]) if _has(df, cols["tiri_away"]) else np.full(n, None, dtype=object)
+    home_sh = numeric_col(df[cols["tiri_home_sh"]]) if _has(df, cols["tiri_home_sh"]) else zeros
+    away_sh = numeric_col(df[cols["tiri_away_sh"]]) if _has(df, cols["tiri_away_sh"]) else zeros
+    keys = np.empty(2 * n, dtype=object); vals = np.empty(2 * n)
+    keys[0::2] = home; keys[1::2] = away
+    vals[0::2] = home_sh; vals[1::2] = away_sh
+    return keys, vals
+
+
+def history_parts(df_tiri, df_falli_ita, df_falli_liga, cols):
+    # (ruolo, metrica, chiavi squadra, valori, riga del foglio) nell'ordine delle storie;
+    # usato da build_histories e dallo store SQLite (che aggiunge lega/stagione/data dalla riga)
+    if df_tiri is not None:
+        if _has(df_tiri, cols["tiri_team"]) and _has(df_tiri, cols["tiri_tot"]):
+            keys = team_keys(df_tiri[cols["tiri_team"]]); rows = np.arange(len(df_tiri))
+            yield "tiri", "tiri", keys, numeric_col(df_tiri[cols["tiri_tot"]]), rows
+            if _has(df_tiri, cols["tiri_sot"]):
+                yield "tiri", "sot", keys, numeric_col(df_tiri[cols["tiri_sot"]]), rows
+        else:
+            keys, vals = _tiri_long(df_tiri, cols)
+            yield "tiri", "tiri", keys, vals, np.repeat(np.arange(len(df_tiri)), 2)
+    if _has(df_falli_ita, cols["falli_ita_team"]) and _has(df_falli_ita, cols["falli_ita_falli"]):
+        yield ("falli_ita", "falli", team_keys(df_falli_ita[cols["falli_ita_team"]]),
+               numeric_col(df_falli_ita[cols["falli_ita_falli"]]), np.arange(len(df_falli_ita)))
+    if _has(df_falli_liga, cols["falli_liga_team"]) and _has(df_falli_liga, cols["falli_liga_falli"]):
+        yield ("falli_liga", "falli_liga", team_keys(df_falli_liga[cols["falli_liga_team"]]),
+               numeric_col(df_falli_liga[cols["falli_liga_falli"]]), np.arange(len(df_falli_liga)))
+
+
+def referee_part(df_falli_ita, cols):
+    # (nomi arbitro, valori) per riga del foglio falli serie a, None se non c'è la colonna arbitro
+    if not _has(df_falli_ita, cols["falli_ita_arb"]):
+        return None
+    arb = df_falli_ita[cols["falli_ita_arb"]]
+    names = arb.astype(str).str.strip().where(arb.notna()).to_numpy(dtype=object)
+    if _has(df_falli_ita, cols["falli_ita_arb_mean"]):
+        vals = numeric_col(df_falli_ita[cols["falli_ita_arb_mean"]])
+    elif _has(df_falli_ita, cols["falli_ita_falli"]):
+        vals = numeric_col(df_falli_ita[cols["falli_ita_falli"]])
+    else:
+        vals = np.zeros(len(df_falli_ita))
+    return names, vals
+
+
+def build_histories(df_tiri, df_falli_ita, df_falli_liga, cols=None):
+    if cols is None:
+        cols = resolve_columns(df_tiri, df_falli_ita, df_falli_liga)
+    team_stats = {}
+    arbitri_stats = {}
+
+    # tiri (aggregato per squadra o match-level), falli serie a, falli liga
+    for _role, key, keys, vals, _rows in history_parts(df_tiri, df_falli_ita, df_falli_liga, cols):
+        _group_into(team_stats, keys, vals, key)
+
+    # arbitri (serie a)
+    ref = referee_part(df_falli_ita, cols)
+    if ref is not None:
+        names, vals = ref
+        mask = pd.notna(names)
+        if mask.any():
+            for name, idx in pd.Series(vals[mask]).groupby(names[mask], sort=False).indices.items():
+                arbitri_stats[name] = np.ascontiguousarray(vals[mask][idx])
+
+    return team_stats, arbitri_stats
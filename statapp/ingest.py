@@ -0,0 +1,81 @@
+# ingest.py — aggiunta incrementale di righe (giornata nuova) senza ricaricare il workbook
+# Le righe nuove passano dallo stesso build_histories usato all'ingest completo, con il
+# mapping colonne già risolto; le storie risultanti vengono accodate solo alle squadre
+# toccate. Un log CSV che cresce nel tempo si legge dall'ultimo offset (tail_rows).
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from statapp.history import build_histories
+
+ROLES = ("tiri", "falli_ita", "falli_liga")
+
+# colonne che le righe nuove devono avere, per ruolo (alternative: basta un gruppo completo)
+REQUIRED = {
+    "tiri": (("tiri_team", "tiri_tot"), ("tiri_home", "tiri_away", "tiri_home_sh", "tiri_away_sh")),
+    "falli_ita": (("falli_ita_team", "falli_ita_falli"), ("falli_ita_arb",)),
+    "falli_liga": (("falli_liga_team", "falli_liga_falli"),),
+}
+
+
+def read_rows(src):
+    # CSV / XLSX da path o file-like (upload Streamlit)
+    name = str(getattr(src, "name", src)).lower()
+    if name.endswith((".xlsx", ".xls")):
+        return pd.read_excel(src)
+    return pd.read_csv(src, sep=None, engine="python")
+
+
+def tail_rows(path, offset=0):
+    # righe complete aggiunte al log CSV dopo offset -> (DataFrame, nuovo offset)
+    with open(path, "rb") as f:
+        header = f.readline()
+        f.seek(max(offset, len(header)))
+        chunk = f.read()
+    end = chunk.rfind(b"\n") + 1   # un'ultima riga a metà scrittura resta per il prossimo giro
+    body = chunk[:end]
+    new_offset = max(offset, len(header)) + end
+    if not body.strip():
+        return pd.DataFrame(columns=pd.read_csv(io.BytesIO(header)).columns), new_offset
+    return pd.read_csv(io.BytesIO(header + body)), new_offset
+
+
+def align_rows(rows, frame, cols, role):
+    # stesse colonne (e ordine) del foglio del modello; errore se manca un gruppo di colonne utile
+    if frame is None:
+        raise ValueError(f"Il modello non ha un foglio per '{role}'.")
+    rows = rows.copy()
+    rows.columns = [str(c).strip() for c in rows.columns]
+    have = set(rows.columns)
+    groups = [[cols[k] for k in g] for g in REQUIRED[role] if all(cols.get(k) for k in g)]
+    if not any(all(c in have for c in g) for g in groups):
+        need = " oppure ".join(", ".join(g) for g in groups) or "?"
+        raise ValueError(f"Righe '{role}' senza le colonne del foglio: servono {need}.")
+    return rows.reindex(columns=frame.columns)
+
+
+def delta_histories(role_rows, cols):
+    # storie (squadre, arbitri) delle sole righe nuove: {ruolo: DataFrame}
+    return build_histories(role_rows.get("tiri"), role_rows.get("falli_ita"), role_rows.get("falli_liga"), cols)
+
+
+def merge_stats(base, delta):
+    # accoda delta a base; squadre non toccate restano gli stessi array (nessuna copia)
+    out = dict(base)
+    for name, v in delta.items():
+        if isinstance(v, dict):
+            inner = dict(base.get(name, {}))
+            for key, vals in v.items():
+                old = inner.get(key)
+                inner[key] = vals if old is None else np.concatenate([old, vals])
+            out[name] = inner
+        else:
+            old = base.get(name)
+            out[name] = v if old is None else np.concatenate([old, v])
+    return out
+
+
+def log_key(path):
+    return os.path.abspath(path)
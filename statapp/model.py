@@ -0,0 +1,121 @@
+# model.py — stimatori per squadra (EWMA + shrinkage) usati da compute_expect
+import math
+import threading
+from collections import OrderedDict
+from statistics import mean
+
+import numpy as np
+import pandas as pd
+
+from statapp.features import ewma_paths
+from statapp.history import safe_float
+
+
+# -----------------------------
+# MODEL helpers
+# -----------------------------
+def _values(vals):
+    # array float senza NaN: array float64 (viste dei ring buffer) passano senza copie
+    if isinstance(vals, np.ndarray) and vals.dtype == np.float64:
+        nan = np.isnan(vals)
+        return vals[~nan] if nan.any() else vals
+    return np.array([safe_float(v) for v in vals if v is not None and not pd.isna(v)], dtype=float)
+
+def ewma(vals, span=6):
+    arr = _values(vals)
+    if len(arr)==0: return 0.0
+    return float(ewma_paths(arr[None, :], (span,))[0, 0, -1])
+
+def shrink_est(est, prior, n, alpha=10.0):
+    if n<=0: return prior
+    w = n/(n+alpha)
+    return w*est + (1-w)*prior
+
+def pstdev(vals):
+    try:
+        arr = _values(vals)
+        return float(arr.std()) if len(arr)>0 else 0.0
+    except (ValueError, FloatingPointError):
+        return 0.0
+
+
+def team_estimate(vals, span=6, alpha=10.0):
+    # (mu, sigma) di una squadra su una metrica: metà di compute_expect
+    n = len(vals)
+    mu_recent = ewma(vals, span=span) if n>0 else 0.0
+    mu_overall = float(np.mean(vals)) if n>0 else 0.0
+    mu = shrink_est(0.7*mu_recent + 0.3*mu_overall, mu_overall, n, alpha)
+    sigma = max(0.6, pstdev(vals) if n>1 else max(0.6, mu*0.25))
+    return mu, sigma
+
+
+# -----------------------------
+# Memo delle stime per squadra: chiave (versione dati, squadra, metrica, span, alpha),
+# LRU limitata. La versione è l'impronta dei dati, quindi un file nuovo non può mai
+# colpire stime vecchie; allo swap del modello condiviso (datamodel._swap) quelle della
+# versione sostituita vengono rimosse.
+# -----------------------------
+class EstimateCache:
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+        val = compute()
+        with self._lock:
+            self.misses += 1
+            self._data[key] = val
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return val
+
+    def invalidate(self, version=None):
+        # version=None svuota tutto, altrimenti solo le stime di quella versione
+        with self._lock:
+            if version is None:
+                self._data.clear()
+            else:
+                for k in [k for k in self._data if k[0] == version]:
+                    del self._data[k]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data),
+                "maxsize": self.maxsize, "hit_rate": self.hits / total if total else 0.0}
+
+
+ESTIMATES = EstimateCache()
+
+
+def cached_team_estimate(team_stats, team, key, span=6, alpha=10.0, version=None, features=None):
+    # con un FeatureStore (statapp/features.py) l'EWMA è già pronto per ogni span
+    def compute():
+        est = features.team_estimate(team, key, span, alpha) if features is not None else None
+        return est if est is not None else team_estimate(team_stats.get(team, {}).get(key, []), span, alpha)
+    if version is None:
+        return compute()
+    return ESTIMATES.get((version, team, key, span, alpha), compute)
+
+
+def compute_expect(team_stats, home, away, key, span=6, alpha=10.0, version=None, features=None):
+    mu_h, sigma_h = cached_team_estimate(team_stats, home, key, span, alpha, version, features)
+    mu_a, sigma_a = cached_team_estimate(team_stats, away, key, span, alpha, version, features)
+    mu_tot = mu_h + mu_a
+    sigma_tot = math.sqrt(sigma_h**2 + sigma_a**2)
+    return mu_h, mu_a, mu_tot, sigma_tot
+
+
+def referee_adjust(mu, arb_vals):
+    # correzione falli per arbitro, come nella sezione Falli Serie A
+    arb_mean = mean(arb_vals)
+    adj = (arb_mean - (mu/2.0)) * 0.5
+    return mu + adj, adj, arb_mean
@@ -0,0 +1,124 @@
+# pricing.py — probabilità over/under con mixture Poisson/Normale
+# p_over_mix è la versione scalare storica; p_over_batch calcola l'intera griglia
+# match × linee in una chiamata vettoriale (ufunc scipy.special, niente overhead per chiamata).
+# lookup=True legge le cdf dalle tabelle interpolate di cdftables (errore documentato lì).
+# safe_lines trova le linee "sicure" (P >= soglia) dai quantili, senza scorrere le linee.
+import math
+
+import numpy as np
+from scipy.special import ndtr, ndtri, pdtr
+from scipy.stats import norm, poisson
+
+from statapp.cdftables import get_tables
+
+
+def p_over_mix(mu, sigma, thresh, w_pois=0.6, lookup=False):
+    k = math.floor(thresh)
+    mu_pos = max(mu, 0.0)
+    if lookup:
+        # niente overhead scipy.stats: due lookup scalari nelle tabelle
+        T = get_tables()
+        p_p = 1.0 - T.pois_cdf1(k, mu_pos)
+        p_n = 1.0 - T.norm_cdf1((thresh + 0.5 - mu) / max(sigma, 0.1))
+        return float(min(1.0, max(0.0, w_pois*p_p + (1-w_pois)*p_n)))
+    try:
+        p_p = 1.0 - poisson.cdf(k, mu_pos)
+    except (ValueError, FloatingPointError):
+        p_p = 0.0
+    try:
+        p_n = 1.0 - norm.cdf(thresh + 0.5, loc=mu, scale=max(sigma,0.1))
+    except (ValueError, FloatingPointError):
+        p_n = 0.0
+    return float(min(1.0, max(0.0, w_pois*p_p + (1-w_pois)*p_n)))
+
+
+def p_over_batch(mu, sigma, lines, w_pois=0.6, lookup=False):
+    # mu, sigma: array (n,) · lines: array (L,) -> (p_over, p_under) di forma (n, L)
+    # stessi valori di p_over_mix cella per cella (mu/sigma NaN -> p_over 0.0)
+    # lookup=True: Poisson dalla tabella (≈2× più veloce di pdtr); la Normale resta ndtr,
+    # che in forma vettoriale è già più veloce dell'interpolazione
+    mu = np.asarray(mu, dtype=float).reshape(-1, 1)
+    sigma = np.asarray(sigma, dtype=float).reshape(-1, 1)
+    lines = np.asarray(lines, dtype=float).reshape(1, -1)
+    k = np.floor(lines)
+    if lookup:
+        cdf_p = get_tables().pois_cdf(k, np.maximum(mu, 0.0))
+    else:
+        cdf_p = np.where(k < 0, 0.0, pdtr(np.maximum(k, 0.0), np.maximum(mu, 0.0)))
+    cdf_n = ndtr((lines + 0.5 - mu) / np.maximum(sigma, 0.1))
+    p = w_pois * (1.0 - cdf_p) + (1 - w_pois) * (1.0 - cdf_n)
+    p = np.where(np.isnan(p), 0.0, np.clip(p, 0.0, 1.0))
+    return p, 1.0 - p
+
+
+def lines_table(mu, sigma, lines, w_pois=0.6, lookup=False):
+    # righe {"line","p_over","p_under"} per una singola partita, come le tabelle della UI
+    lines = sorted(lines)
+    p, _ = p_over_batch([mu], [sigma], lines, w_pois, lookup)
+    return [{"line": L, "p_over": round(float(po), 3), "p_under": round(float(1 - po), 3)}
+            for L, po in zip(lines, p[0])]
+
+
+def _mix_cdf(n, mu, sigma, w_pois):
+    # P(under n + 0.5) con la convenzione di p_over_batch (Normale valutata a linea + 0.5)
+    cdf_p = np.where(n < 0, 0.0, pdtr(np.maximum(n, 0.0), np.maximum(mu, 0.0)))
+    cdf_n = ndtr((n + 1.0 - mu) / np.maximum(sigma, 0.1))
+    return w_pois * cdf_p + (1 - w_pois) * cdf_n
+
+
+MAX_BRACKET = 64   # raddoppi massimi degli estremi (oltre: quantile NaN)
+
+
+def _mix_quantile(mu, sigma, w_pois, q, strict=False):
+    # più piccolo intero n con G(n) >= q (strict: > q), vettoriale.
+    # Estremi dai quantili in forma chiusa delle componenti (Normale esatto, Poisson con
+    # Cornish-Fisher, mu < 0 come 0 come in p_over_mix); la mixture sta in mezzo. Gli estremi
+    # si allargano finché non racchiudono il quantile (al più MAX_BRACKET volte), poi
+    # bisezione intera: pochi passi di pdtr su tutte le partite.
+    z = ndtri(q)
+    mu_pos = np.maximum(mu, 0.0)
+    with np.errstate(invalid="ignore"):
+        n_pois = np.floor(mu_pos + np.sqrt(mu_pos) * z + (z * z - 1.0) / 6.0)
+        n_norm = np.ceil(mu - 1.0 + np.maximum(sigma, 0.1) * z)
+        lo = np.minimum(n_pois, n_norm) - 1.0
+        hi = np.maximum(n_pois, n_norm) + 1.0
+    lo = np.where(np.isfinite(lo), lo, -1.0)
+    hi = np.where(np.isfinite(hi), hi, lo + 1.0)
+    hit = (lambda g: g > q) if strict else (lambda g: g >= q)
+    step = 2.0
+    for _ in range(MAX_BRACKET):
+        low_bad = hit(_mix_cdf(lo, mu, sigma, w_pois)) & (lo > -1.0)
+        high_bad = ~hit(_mix_cdf(hi, mu, sigma, w_pois))
+        if not (low_bad.any() or high_bad.any()): break
+        lo = np.where(low_bad, np.maximum(lo - step, -1.0), lo)
+        hi = np.where(high_bad, hi + step, hi)
+        step *= 2
+    else:
+        # estremi che non racchiudono il quantile (es. mu/sigma non finiti): NaN, niente bisezione
+        miss = (hit(_mix_cdf(lo, mu, sigma, w_pois)) & (lo > -1.0)) | ~hit(_mix_cdf(hi, mu, sigma, w_pois))
+        lo = np.where(miss, np.nan, lo); hi = np.where(miss, np.nan, hi)
+    while True:
+        open_ = hi - lo > 1
+        if not open_.any(): break
+        mid = np.floor((lo + hi) / 2)
+        ok = hit(_mix_cdf(mid, mu, sigma, w_pois))
+        hi = np.where(open_ & ok, mid, hi)
+        lo = np.where(open_ & ~ok, mid, lo)
+    return hi
+
+
+def safe_lines(mu, sigma, conf=0.7, w_pois=0.6):
+    # linee "sicure" (getSafeLine di BetAnalyst, soglia 70%) per array di partite (n,):
+    # over = linea più alta con P(over) >= conf · under = linea più bassa con P(under) >= conf
+    # -> (over_line, p_over, under_line, p_under); NaN se la linea scende sotto 0.5 o mu/sigma NaN
+    mu = np.asarray(mu, dtype=float).ravel(); sigma = np.asarray(sigma, dtype=float).ravel()
+    bad = np.isnan(mu) | np.isnan(sigma)
+    m = np.where(bad, 0.0, mu); s = np.where(bad, 1.0, sigma)
+    n_over = _mix_quantile(m, s, w_pois, 1.0 - conf, strict=True) - 1.0   # max n con G(n) <= 1 - conf
+    n_under = _mix_quantile(m, s, w_pois, conf)
+    p_over = np.clip(1.0 - _mix_cdf(n_over, m, s, w_pois), 0.0, 1.0)
+    p_under = np.clip(_mix_cdf(n_under, m, s, w_pois), 0.0, 1.0)
+    over_line = n_over + 0.5; under_line = n_under + 0.5
+    drop_o = bad | (over_line < 0.5); drop_u = bad | (under_line < 0.5)
+    return (np.where(drop_o, np.nan, over_line), np.where(drop_o, np.nan, p_over),
+            np.where(drop_u, np.nan, under_line), np.where(drop_u, np.nan, p_under))
@@ -0,0 +1,75 @@
+# profiling.py — strumentazione per stadio (tempo, righe, memoria) e profilo cProfile
+# Ogni stadio registra wall time, righe elaborate e delta di memoria residente (RSS);
+# il risultato è un semplice elenco di dict, esportabile in JSON dalla sidebar.
+import cProfile
+import json
+import os
+import platform
+import pstats
+import time
+from contextlib import contextmanager
+
+try:
+    _PAGE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE = 4096
+
+
+def rss_bytes():
+    # memoria residente corrente; None se /proc non c'è (es. macOS/Windows)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StageTimer:
+    __slots__ = ("stages",)
+
+    def __init__(self, stages=()):
+        self.stages = list(stages)
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        # with timer.stage("build_histories") as s: ...; s["rows"] = n
+        rec = {"stage": name, "rows": rows}
+        m0 = rss_bytes(); t0 = time.perf_counter()
+        try:
+            yield rec
+        finally:
+            rec["wall_s"] = time.perf_counter() - t0
+            m1 = rss_bytes()
+            rec["mem_delta_mb"] = (m1 - m0) / 2**20 if m0 is not None and m1 is not None else None
+            rec["rss_mb"] = m1 / 2**20 if m1 is not None else None
+            self.stages.append(rec)
+
+    def extend(self, stages, prefix=""):
+        self.stages.extend(dict(s, stage=prefix + s["stage"]) for s in stages)
+
+    def total(self):
+        return sum(s["wall_s"] for s in self.stages)
+
+    def to_json(self, **meta):
+        meta.setdefault("timestamp", time.strftime("%Y-%m-%dT%H:%M:%S"))
+        meta.setdefault("python", platform.python_version())
+        return json.dumps({"meta": meta, "total_s": self.total(), "stages": self.stages}, indent=1, default=str)
+
+
+def start_profile():
+    prof = cProfile.Profile()
+    prof.enable()
+    return prof
+
+
+def hot_functions(prof, limit=25, sort="cumulative"):
+    # funzioni più costose del profilo: [{function, calls, tottime_s, cumtime_s}]
+    prof.disable()
+    stats = pstats.Stats(prof).stats
+    rows = []
+    for (fname, line, func), (cc, nc, tt, ct, _callers) in stats.items():
+        where = f"{os.path.basename(fname)}:{line}" if line else fname
+        rows.append({"function": f"{func} ({where})", "calls": nc, "tottime_s": tt, "cumtime_s": ct})
+    key = "cumtime_s" if sort == "cumulative" else "tottime_s"
+    rows.sort(key=lambda r: r[key], reverse=True)
+    return rows[:limit]
@@ -0,0 +1,204 @@
+# results.py — archivio su disco (SQLite) dei risultati di backtest, con ri-esecuzioni incrementali
+# Un run è identificato da sorgente dati + parametri (span, alpha, peso Poisson, linee, storia
+# minima, metriche) e ricorda la versione dei dati e, per metrica, quante partite ha valutato
+# con l'impronta di quel prefisso. Il walk-forward non guarda avanti: se le partite già valutate
+# sono ancora le stesse (righe accodate, es. una giornata nuova) le loro previsioni non cambiano
+# e si valutano solo le partite nuove. Stessa versione -> nessun calcolo.
+# Il walk-forward gira fuori dal lock: lock e transazione di scrittura solo per l'inserimento.
+# Per sorgente restano gli ultimi KEEP_RUNS run usati (i più vecchi si cancellano con i risultati).
+# La UI legge aggregati (istogramma di p per sweep e punteggi, riepilogo per linea) e pagine
+# (LIMIT/OFFSET sull'indice), senza caricare i risultati.
+import datetime
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from statapp.backtest import BACKTEST_COLUMNS, backtest_lines
+from statapp.calibrate import EPS
+from statapp.model import EstimateCache
+from statapp.snapshot import CACHE_DIR
+from statapp.sweep import CUTOFFS, DEFAULT_ODDS, HIST_COLUMNS, HIST_EPS, HIST_SCALE, evaluate_hist
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL, params TEXT NOT NULL,
+    version TEXT, state TEXT, updated TEXT,
+    UNIQUE (source, params)
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL, metric TEXT NOT NULL, row INTEGER NOT NULL, home TEXT, away TEXT,
+    mu REAL, sigma REAL, total REAL, line REAL, p_over REAL, outcome INTEGER
+);
+CREATE INDEX IF NOT EXISTS results_run ON results(run_id, metric, row, line);
+"""
+
+KEEP_RUNS = 8                       # run (insiemi di parametri) tenuti per sorgente
+HISTS = EstimateCache(maxsize=32)   # (versione, db, run, parametri, lato) -> istogramma di p
+_SIDES = {"over": ("p_over", "outcome"), "under": ("1.0 - p_over", "1 - outcome")}
+
+
+def source_key(path):
+    # uno o più workbook -> chiave stabile della sorgente
+    if isinstance(path, (list, tuple)):
+        return "|".join(os.path.abspath(p) for p in path)
+    return os.path.abspath(path)
+
+
+def prefix_hash(a, n):
+    return hashlib.blake2b(a["row_hash"][:n].tobytes(), digest_size=16).hexdigest()
+
+
+class ResultStore:
+    def __init__(self, path=None):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "backtest.sqlite")
+        self.path = path
+        self.con = sqlite3.connect(path, check_same_thread=False)
+        self.con.executescript(SCHEMA)
+        try:
+            self.con.execute("SELECT ln(1)")
+        except sqlite3.OperationalError:   # SQLite senza funzioni matematiche
+            self.con.create_function("ln", 1, math.log, deterministic=True)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.con.close()
+
+    def _q(self, sql, args=()):
+        with self._lock:
+            return self.con.execute(sql, args).fetchall()
+
+    def _df(self, sql, args=()):
+        with self._lock:
+            return pd.read_sql_query(sql, self.con, params=args)
+
+    # -- esecuzione -------------------------------------------------------
+    def run(self, source, version, arrays, lines, span=6, alpha=10.0, w_pois=0.6, min_history=1, metrics=None):
+        # -> (run_id, {"evaluated": righe nuove, "reused": righe già in archivio, "hit": stessa versione})
+        metrics = sorted(m for m in arrays if metrics is None or m in metrics)
+        params = json.dumps({"span": span, "alpha": float(alpha), "w_pois": float(w_pois),
+                             "lines": sorted(float(L) for L in lines), "min_history": int(min_history),
+                             "metrics": metrics}, sort_keys=True)
+        find = "SELECT run_id, version, state FROM runs WHERE source = ? AND params = ?"
+        while True:
+            now = datetime.datetime.now().isoformat(timespec="seconds")
+            with self._lock, self.con:
+                row = self.con.execute(find, (source, params)).fetchone()
+                if row is not None and row[1] == version:
+                    self.con.execute("UPDATE runs SET updated = ? WHERE run_id = ?", (now, row[0]))
+                    n = self.con.execute("SELECT COUNT(*) FROM results WHERE run_id = ?", (row[0],)).fetchone()[0]
+                    return row[0], {"evaluated": 0, "reused": n, "hit": True}
+            # walk-forward senza lock: le altre sessioni leggono e scrivono l'archivio nel frattempo
+            state = json.loads(row[2] or "{}") if row is not None else {}
+            start, new_state = {}, {}
+            for m in metrics:
+                a = arrays[m]; n = len(a["rows"]); old = state.get(m)
+                # prefisso invariato: si riparte da qui, altrimenti la metrica si ricalcola da capo
+                start[m] = old["n"] if old and old["n"] <= n and prefix_hash(a, old["n"]) == old["hash"] else 0
+                new_state[m] = {"n": n, "hash": prefix_hash(a, n)}
+            df = backtest_lines(arrays, lines, span, alpha, w_pois, min_history, metrics, start=start)
+            with self._lock, self.con:
+                if self.con.execute(find, (source, params)).fetchone() != row:
+                    continue   # run aggiornato da un'altra sessione nel frattempo: si riparte dal suo stato
+                if row is None:
+                    run_id = self.con.execute("INSERT INTO runs (source, params) VALUES (?, ?)",
+                                              (source, params)).lastrowid
+                else:
+                    run_id = row[0]
+                for m in metrics:
+                    if start[m] == 0:
+                        self.con.execute("DELETE FROM results WHERE run_id = ? AND metric = ?", (run_id, m))
+                self.con.executemany(
+                    "INSERT INTO results (run_id, metric, row, home, away, mu, sigma, total, line, p_over, outcome) "
+                    "VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                    ((run_id,) + tuple(r) for r in df[BACKTEST_COLUMNS].astype(object).itertuples(index=False)))
+                self.con.execute("UPDATE runs SET version = ?, state = ?, updated = ? WHERE run_id = ?",
+                                 (version, json.dumps(new_state), now, run_id))
+                self._evict(source)
+                n = self.con.execute("SELECT COUNT(*) FROM results WHERE run_id = ?", (run_id,)).fetchone()[0]
+            return run_id, {"evaluated": len(df), "reused": n - len(df), "hit": False}
+
+    def _evict(self, source):
+        # oltre KEEP_RUNS run per sorgente si cancellano i meno usati (con i loro risultati)
+        old = [r[0] for r in self.con.execute(
+            "SELECT run_id FROM runs WHERE source = ? ORDER BY updated DESC, run_id DESC LIMIT -1 OFFSET ?",
+            (source, KEEP_RUNS))]
+        for run_id in old:
+            self.con.execute("DELETE FROM results WHERE run_id = ?", (run_id,))
+            self.con.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    # -- lettura -----------------------------------------------------------
+    def version(self, run_id):
+        row = next(iter(self._q("SELECT version FROM runs WHERE run_id = ?", (run_id,))), None)
+        return row[0] if row else None
+
+    def runs(self):
+        return self._df("SELECT run_id, source, params, version, updated FROM runs ORDER BY updated DESC")
+
+    def count(self, run_id, metric=None):
+        w, args = (" AND metric = ?", [metric]) if metric else ("", [])
+        return self._q(f"SELECT COUNT(*) FROM results WHERE run_id = ?{w}", [run_id] + args)[0][0]
+
+    def page(self, run_id, offset=0, limit=100, metric=None):
+        # una pagina di risultati, in ordine metrica / partita / linea (via indice)
+        w, args = (" AND metric = ?", [metric]) if metric else ("", [])
+        return self._df(f"SELECT {', '.join(BACKTEST_COLUMNS)} FROM results WHERE run_id = ?{w} "
+                        f"ORDER BY metric, row, line LIMIT ? OFFSET ?", [run_id] + args + [int(limit), int(offset)])
+
+    def _histogram(self, run_id, side):
+        # istogramma di p del lato (over/under) -> righe HIST_COLUMNS
+        p, y = _SIDES[side]
+        return self._df(
+            f"SELECT CAST(p * ? + ? AS INTEGER) AS b, COUNT(*) AS n, SUM(y) AS hits, SUM(p) AS p_sum, "
+            f"SUM((p - y) * (p - y)) AS sq, SUM(-(y * ln(pc) + (1 - y) * ln(1 - pc))) AS ll "
+            f"FROM (SELECT {p} AS p, {y} AS y, MIN(MAX({p}, ?), ?) AS pc FROM results "
+            f"WHERE run_id = ? AND p_over IS NOT NULL AND outcome IS NOT NULL) GROUP BY b",
+            [HIST_SCALE, HIST_EPS, EPS, 1 - EPS, run_id])[HIST_COLUMNS]
+
+    def evaluation(self, run_id, side="over", odds=DEFAULT_ODDS, cutoffs=CUTOFFS):
+        # sweep.evaluate per il lato scommesso ("over", "under", "both") dagli istogrammi di p
+        row = next(iter(self._q("SELECT version, params FROM runs WHERE run_id = ?", (run_id,))), (None, None))
+        sides = ("over", "under") if side == "both" else (side,)
+        hist = pd.concat([HISTS.get((row[0], self.path, run_id, row[1], s),
+                                    lambda s=s: self._histogram(run_id, s)) for s in sides], ignore_index=True)
+        return evaluate_hist(hist, cutoffs, odds)
+
+    def summary(self, run_id, cutoff=0.5):
+        # backtest.line_summary calcolato nell'archivio (GROUP BY metrica × linea)
+        return self._df(
+            "SELECT metric, line, COUNT(*) AS n, AVG(outcome) AS over_rate, AVG(p_over) AS p_mean, "
+            "AVG((p_over - outcome) * (p_over - outcome)) AS brier, "
+            "AVG(CASE WHEN (p_over >= ?) = (outcome > 0) THEN 1.0 ELSE 0.0 END) AS accuracy "
+            "FROM results WHERE run_id = ? GROUP BY metric, line ORDER BY metric, line", [float(cutoff), run_id])
+
+    def safe_bets(self, run_id, conf=0.7):
+        # sweep.safe_line_bets nell'archivio: per partita la linea over più alta e la under più
+        # bassa alla probabilità minima (SQLite prende le altre colonne dalla riga del MAX/MIN)
+        return self._df(
+            "SELECT metric, row, 'over' AS side, MAX(line) AS line, p_over AS p, CAST(outcome AS REAL) AS won "
+            "FROM results WHERE run_id = ? AND p_over >= ? GROUP BY metric, row "
+            "UNION ALL "
+            "SELECT metric, row, 'under' AS side, MIN(line) AS line, 1.0 - p_over AS p, 1.0 - outcome AS won "
+            "FROM results WHERE run_id = ? AND 1.0 - p_over >= ? GROUP BY metric, row",
+            [run_id, float(conf), run_id, float(conf)])
+
+
+_RESULTS = None
+_LOCK = threading.Lock()
+
+
+def get_results():
+    # archivio condiviso dal processo (CACHE_DIR/backtest.sqlite)
+    global _RESULTS
+    if _RESULTS is None:
+        with _LOCK:
+            if _RESULTS is None:
+                _RESULTS = ResultStore()
+    return _RESULTS
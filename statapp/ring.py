@@ -0,0 +1,201 @@
+# ring.py — storie squadra compatte: ring buffer NumPy float64 con finestra massima per metrica
+# Ogni (squadra, metrica) è un RingBuffer. Con una finestra il buffer è "a specchio": ogni
+# valore è scritto in i e in i + cap, così gli ultimi `size` valori sono sempre contigui e
+# view() è una vista senza copia in ordine cronologico; i valori più vecchi escono dalla coda
+# e la memoria resta piatta aggiungendo stagioni. Senza finestra (None) non si ruota mai:
+# un array che cresce a potenze di 2 solo quando si accodano righe.
+# Di default ogni metrica tiene le ultime due stagioni (WINDOWS, 76 partite): media e
+# deviazione standard della previsione sono su quella finestra, non più su tutta la storia
+# (l'EWMA non cambia: con span <= 12 il peso oltre 76 partite è < 1e-5).
+# STATAPP_HISTORY_WINDOW=<n> cambia la finestra di tutte le metriche, =0/none la toglie.
+# TeamRecord (slot per metrica) e TeamHistories hanno l'interfaccia di team_stats
+# (team_stats[squadra][metrica] -> array in sola lettura), quindi stimatori, FeatureStore e
+# slate li usano senza conversioni.
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+from statapp.history import METRICS
+
+SEASON = 38                                           # giornate di un campionato a 20 squadre
+DEFAULT_WINDOWS = {"tiri": 2 * SEASON, "sot": 2 * SEASON, "falli": 2 * SEASON, "falli_liga": 2 * SEASON}
+
+
+def _env_windows():
+    # finestra massima (partite) per metrica; None = tutta la storia
+    v = os.environ.get("STATAPP_HISTORY_WINDOW", "").strip().lower()
+    if not v:
+        return dict(DEFAULT_WINDOWS)
+    w = None if v in ("0", "none") else int(v)
+    return {m: w for m in METRICS}
+
+
+WINDOWS = _env_windows()
+
+
+def _pow2(n):
+    return 1 << max(int(n) - 1, 0).bit_length()
+
+
+class RingBuffer:
+    __slots__ = ("buf", "start", "size", "window")
+
+    def __init__(self, values=(), window=None):
+        vals = np.asarray(values, dtype=np.float64).ravel()
+        if window is not None:
+            window = max(int(window), 1)
+            vals = vals[-window:]
+            self.buf = np.empty(2 * window)
+        else:
+            self.buf = np.empty(len(vals))   # all'ingest nessuno spazio in più
+        self.start = 0; self.size = 0; self.window = window
+        self.extend(vals)
+
+    @property
+    def capacity(self):
+        return len(self.buf) // 2 if self.window is not None else len(self.buf)
+
+    @property
+    def nbytes(self):
+        return self.buf.nbytes
+
+    def __len__(self):
+        return self.size
+
+    def view(self):
+        # ultimi `size` valori, in ordine, senza copia e in sola lettura
+        v = self.buf[self.start:self.start + self.size].view()
+        v.flags.writeable = False
+        return v
+
+    def extend(self, values):
+        vals = np.asarray(values, dtype=np.float64).ravel()
+        k = len(vals)
+        if k == 0: return
+        if self.window is None:
+            if self.size + k > len(self.buf):
+                buf = np.empty(_pow2(self.size + k)); buf[:self.size] = self.buf[:self.size]; self.buf = buf
+            self.buf[self.size:self.size + k] = vals
+            self.size += k
+            return
+        cap = self.window
+        if k >= cap:
+            self.buf[:cap] = vals[-cap:]; self.buf[cap:] = vals[-cap:]
+            self.start = 0; self.size = cap
+            return
+        idx = (self.start + self.size + np.arange(k)) % cap
+        self.buf[idx] = vals; self.buf[idx + cap] = vals
+        over = self.size + k - cap
+        if over > 0:
+            self.start = (self.start + over) % cap; self.size = cap
+        else:
+            self.size += k
+
+    def append(self, value):
+        self.extend([value])
+
+    def copy(self):
+        new = RingBuffer.__new__(RingBuffer)
+        new.buf = self.buf.copy(); new.start = self.start; new.size = self.size; new.window = self.window
+        return new
+
+
+class TeamRecord(Mapping):
+    # una squadra: uno slot per metrica nota (RingBuffer o None), dict per metriche extra
+    __slots__ = METRICS + ("extra",)
+
+    def __init__(self):
+        for m in METRICS:
+            setattr(self, m, None)
+        self.extra = None
+
+    def ring(self, key):
+        if key in METRICS:
+            return getattr(self, key)
+        return self.extra.get(key) if self.extra else None
+
+    def set_ring(self, key, ring):
+        if key in METRICS:
+            setattr(self, key, ring)
+        else:
+            if self.extra is None: self.extra = {}
+            self.extra[key] = ring
+
+    def copy(self):
+        new = TeamRecord()
+        for m in METRICS:
+            setattr(new, m, getattr(self, m))
+        new.extra = dict(self.extra) if self.extra else None
+        return new
+
+    def __getitem__(self, key):
+        r = self.ring(key)
+        if r is None:
+            raise KeyError(key)
+        return r.view()
+
+    def __iter__(self):
+        for m in METRICS:
+            if getattr(self, m) is not None:
+                yield m
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    @property
+    def nbytes(self):
+        return sum(self.ring(k).nbytes for k in self)
+
+
+class TeamHistories(Mapping):
+    # squadra -> TeamRecord; stessa forma di team_stats di build_histories
+    __slots__ = ("records", "windows")
+
+    def __init__(self, records=None, windows=None):
+        self.records = records if records is not None else {}
+        self.windows = dict(WINDOWS, **(windows or {}))
+
+    @classmethod
+    def from_stats(cls, team_stats, windows=None):
+        new = cls(windows=windows)
+        for team, metrics in team_stats.items():
+            rec = TeamRecord()
+            for key, vals in metrics.items():
+                rec.set_ring(key, RingBuffer(vals, new.windows.get(key)))
+            new.records[team] = rec
+        return new
+
+    @property
+    def bounded(self):
+        return any(w is not None for w in self.windows.values())
+
+    def appended(self, delta):
+        # nuova versione con i valori di delta accodati: le squadre toccate sono copiate
+        # (O(finestra)), le altre condivise; le viste del modello precedente restano valide
+        records = dict(self.records)
+        for team, metrics in delta.items():
+            old = records.get(team)
+            rec = old.copy() if old is not None else TeamRecord()
+            for key, vals in metrics.items():
+                r = rec.ring(key)
+                r = r.copy() if r is not None else RingBuffer(window=self.windows.get(key))
+                r.extend(vals)
+                rec.set_ring(key, r)
+            records[team] = rec
+        return TeamHistories(records, self.windows)
+
+    def __getitem__(self, team):
+        return self.records[team]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def nbytes(self):
+        return sum(rec.nbytes for rec in self.records.values())
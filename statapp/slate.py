@@ -0,0 +1,113 @@
+# slate.py — prezzatura di un'intera giornata: tutte le partite × metriche × linee in un passaggio
+# Le stime per squadra (memo in model.ESTIMATES) si calcolano una volta sola per (squadra, metrica),
+# poi tutte le celle passano da un'unica chiamata a p_over_batch.
+# safe_slate dà, per ogni partita × metrica, le linee over/under "sicure" (P >= soglia).
+import math
+
+import numpy as np
+import pandas as pd
+
+from statapp.history import METRICS
+from statapp.model import cached_team_estimate, referee_adjust
+from statapp.pricing import p_over_batch, safe_lines
+from statapp.distribution import p_over_exact, safe_lines_exact, scale_sides
+
+SLATE_COLUMNS = ["home", "away", "referee", "metric", "mu_home", "mu_away", "mu", "sigma",
+                 "line", "p_over", "p_under"]
+SAFE_COLUMNS = SLATE_COLUMNS[:8] + ["over_line", "p_over", "under_line", "p_under"]
+
+
+def all_fixtures(teams):
+    # matrice completa squadre × squadre (casa != ospite)
+    return [(h, a) for h in teams for a in teams if h != a]
+
+
+def parse_fixtures(text):
+    # una partita per riga: "Casa - Ospite", "Casa, Ospite" o "Casa; Ospite; Arbitro"
+    out = []
+    for raw in (text or "").splitlines():
+        line = raw.strip()
+        if not line: continue
+        for sep in (";", ",", " - ", "\t"):
+            if sep in line:
+                parts = [p.strip() for p in line.split(sep)]
+                break
+        else:
+            continue
+        if len(parts) >= 2 and parts[0] and parts[1]:
+            out.append((parts[0], parts[1], parts[2] if len(parts) > 2 and parts[2] else None))
+    return out
+
+
+def _normalize(fixtures):
+    if isinstance(fixtures, pd.DataFrame):
+        ref = fixtures["referee"] if "referee" in fixtures.columns else [None] * len(fixtures)
+        fixtures = zip(fixtures["home"], fixtures["away"], ref)
+    out = []
+    for f in fixtures:
+        home, away = str(f[0]).strip(), str(f[1]).strip()
+        ref = f[2] if len(f) > 2 and f[2] is not None and not pd.isna(f[2]) else None
+        out.append((home, away, ref))
+    return out
+
+
+def _count(team_stats, team, key):
+    # valori della squadra; Store.presence dà direttamente il conteggio (1 = ha dati)
+    v = team_stats.get(team, {}).get(key, ())
+    return v if isinstance(v, int) else len(v)
+
+
+def _slate_base(team_stats, fixtures, metrics, span, alpha, arbitri_stats, version, features):
+    # una riga per partita × metrica (stime memo per squadra) + parametri per lato
+    fixtures = _normalize(fixtures)
+    arbitri_stats = arbitri_stats or {}
+    rows = []   # (home, away, ref, metric, mu_h, mu_a, mu, sigma)
+    sides = []  # (mu_h, sigma_h, mu_a, sigma_a) dopo l'eventuale correzione arbitro
+    for key in metrics:
+        est = {}
+        for home, away, ref in fixtures:
+            if not _count(team_stats, home, key) and not _count(team_stats, away, key): continue
+            if home not in est: est[home] = cached_team_estimate(team_stats, home, key, span, alpha, version, features)
+            if away not in est: est[away] = cached_team_estimate(team_stats, away, key, span, alpha, version, features)
+            mu_h, sigma_h = est[home]; mu_a, sigma_a = est[away]
+            mu = mu_h + mu_a
+            if key == 'falli' and ref is not None and ref in arbitri_stats:
+                mu = referee_adjust(mu, arbitri_stats[ref])[0]
+            rows.append((home, away, ref, key, mu_h, mu_a, mu, math.sqrt(sigma_h**2 + sigma_a**2)))
+            sides.append(scale_sides(mu_h, sigma_h, mu_a, sigma_a, mu))
+    return pd.DataFrame(rows, columns=SLATE_COLUMNS[:8]), sides
+
+
+def price_slate(team_stats, fixtures, lines, metrics=METRICS, span=6, alpha=10.0, w_pois=0.6,
+                arbitri_stats=None, version=None, features=None, dist="mix", lookup=False):
+    # ritorna un DataFrame lungo: una riga per partita × metrica × linea
+    # dist="mix": mixture Poisson/Normale sul totale · "exact": convoluzione dei due lati (distribution.py)
+    # lookup=True: cdf della mixture dalle tabelle di cdftables
+    lines = sorted(lines)
+    base, sides = _slate_base(team_stats, fixtures, metrics, span, alpha, arbitri_stats, version, features)
+    if base.empty or not lines:
+        return pd.DataFrame(columns=SLATE_COLUMNS)
+    if dist == "exact":
+        p_over, p_under = p_over_exact(*np.asarray(sides).T, lines)
+    else:
+        p_over, p_under = p_over_batch(base["mu"].to_numpy(), base["sigma"].to_numpy(), lines, w_pois, lookup)
+    out = base.loc[base.index.repeat(len(lines))].reset_index(drop=True)
+    out["line"] = np.tile(np.asarray(lines, dtype=float), len(base))
+    out["p_over"] = p_over.ravel()
+    out["p_under"] = p_under.ravel()
+    return out
+
+
+def safe_slate(team_stats, fixtures, metrics=METRICS, conf=0.7, span=6, alpha=10.0, w_pois=0.6,
+               arbitri_stats=None, version=None, features=None, dist="mix"):
+    # una riga per partita × metrica con la linea over più alta e la under più bassa a P >= conf
+    base, sides = _slate_base(team_stats, fixtures, metrics, span, alpha, arbitri_stats, version, features)
+    if base.empty:
+        return pd.DataFrame(columns=SAFE_COLUMNS)
+    if dist == "exact":
+        res = safe_lines_exact(*np.asarray(sides).T, conf=conf)
+    else:
+        res = safe_lines(base["mu"].to_numpy(), base["sigma"].to_numpy(), conf, w_pois)
+    for col, v in zip(SAFE_COLUMNS[8:], res):
+        base[col] = v
+    return base
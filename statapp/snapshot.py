@@ -0,0 +1,229 @@
+# snapshot.py — cache su disco dei workbook già parsati
+# Ogni foglio viene salvato in formato Arrow IPC non compresso e riletto via memory-map.
+# La chiave è l'impronta del file (path, size, mtime, hash contenuto): l'XLSX viene
+# ri-parsato solo quando l'impronta cambia. Lo snapshot può essere parziale (solo i fogli
+# richiesti con names=...) e conserva anche le intestazioni dei fogli (load_headers).
+# A freddo i fogli letti passano per la stessa tabella Arrow che viene salvata, così lettura
+# da XLSX e da snapshot restituiscono gli stessi dtype (es. colonne con tipi misti -> testo).
+# A caldo non si parsa niente, ma non tutto è senza copia: con split_blocks le colonne
+# numeriche senza valori mancanti sono viste in sola lettura sul file mappato; testo e colonne
+# con mancanti vengono convertiti (una copia, con self_destruct che libera via via i buffer Arrow).
+# pyarrow è una dipendenza obbligatoria (requirements.txt).
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+
+CACHE_DIR = os.environ.get("STATAPP_CACHE_DIR", ".statapp_cache")
+SNAPSHOT_VERSION = 1
+
+
+def content_hash(path, chunk=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_fingerprint(path, known=None):
+    # se size e mtime coincidono con l'impronta nota si evita di rileggere il file
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    fp = {"path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if known and known.get("path") == path and known.get("size") == fp["size"] \
+            and known.get("mtime_ns") == fp["mtime_ns"] and known.get("hash"):
+        fp["hash"] = known["hash"]
+    else:
+        fp["hash"] = content_hash(path)
+    return fp
+
+
+def sources_fingerprint(paths, known=None):
+    # impronta di più file: una per file + hash combinato (cambia se cambia uno qualsiasi)
+    prev = {f["path"]: f for f in (known or {}).get("files", [])}
+    files = [file_fingerprint(p, prev.get(os.path.abspath(p))) for p in paths]
+    h = hashlib.blake2b(digest_size=16)
+    for f in files:
+        h.update(f"{f['path']}:{f['hash']}\n".encode("utf-8"))
+    return {"paths": [f["path"] for f in files], "files": files, "hash": h.hexdigest()}
+
+
+def _slot(path, cache_dir):
+    key = hashlib.blake2b(os.path.abspath(path).encode("utf-8"), digest_size=8).hexdigest()
+    return os.path.join(cache_dir, key)
+
+
+def _read_manifest(slot):
+    try:
+        with open(os.path.join(slot, "manifest.json"), encoding="utf-8") as f:
+            m = json.load(f)
+        return m if m.get("version") == SNAPSHOT_VERSION else None
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(slot, manifest):
+    fd, tmp = tempfile.mkstemp(dir=slot, prefix="manifest.", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(slot, "manifest.json"))
+
+
+def _to_table(df):
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        pass
+    # colonne object con tipi misti (es. intestazioni dentro i dati): testo, NaN preservati
+    for c in df.columns:
+        if df[c].dtype == object:
+            try:
+                pa.array(df[c], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                df[c] = df[c].map(lambda v: v if pd.isna(v) else str(v))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _arrow_frames(sheets):
+    # fogli appena letti -> (tabelle Arrow da salvare, DataFrame riletti da quelle tabelle):
+    # a freddo si restituiscono gli stessi dtype che lo snapshot darà a caldo
+    tables, frames = {}, {}
+    for name, df in sheets.items():
+        try:
+            tables[name] = _to_table(df)
+            frames[name] = tables[name].to_pandas(split_blocks=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            frames[name] = df  # non convertibile: resta com'è e non va in cache
+    return tables, frames
+
+
+def read_excel_sheets(path, names=None):
+    # names=None: tutti i fogli; altrimenti solo quelli indicati (un'unica apertura del workbook)
+    if names is None:
+        return pd.read_excel(path, sheet_name=None)
+    return pd.read_excel(path, sheet_name=list(names))
+
+
+def read_excel_headers(path):
+    # {nome_foglio: [intestazioni]} con pandas (nrows=0)
+    with pd.ExcelFile(path) as xl:
+        return {name: [str(c) for c in xl.parse(name, nrows=0).columns] for name in xl.sheet_names}
+
+
+def _write_snapshot(slot, fp, tables, manifest=None, complete=True, headers=None):
+    # manifest valido per la stessa impronta: i fogli nuovi vengono aggiunti a quelli già salvati
+    os.makedirs(slot, exist_ok=True)
+    base = manifest or {}
+    names = [list(e) for e in base.get("sheets", [])]
+    have = {name for name, _ in names}
+    for name, table in tables.items():
+        if name in have:
+            continue
+        fname = f"{fp['hash']}_{len(names)}.arrow"
+        tmp = os.path.join(slot, fname + ".tmp")
+        with pa.OSFile(tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, os.path.join(slot, fname))
+        names.append([name, fname])
+    manifest = dict(fp, version=SNAPSHOT_VERSION, sheets=names,
+                    complete=complete or base.get("complete", False),
+                    headers=headers if headers is not None else base.get("headers"))
+    _write_manifest(slot, manifest)
+    # rimuovi snapshot di versioni precedenti dello stesso file
+    keep = {fname for _, fname in names} | {"manifest.json"}
+    for fname in os.listdir(slot):
+        if fname not in keep and not fname.endswith(".tmp"):
+            try:
+                os.remove(os.path.join(slot, fname))
+            except OSError:
+                pass
+    return manifest
+
+
+def _read_snapshot(slot, entries):
+    sheets = {}
+    for name, fname in entries:
+        with pa.memory_map(os.path.join(slot, fname), "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        sheets[name] = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+    return sheets
+
+
+def _open(path, cache_dir):
+    # (slot, impronta, manifest valido per il contenuto attuale o None)
+    slot = _slot(path, cache_dir or CACHE_DIR)
+    manifest = _read_manifest(slot)
+    fp = file_fingerprint(path, manifest)
+    if not manifest or manifest.get("hash") != fp["hash"]:
+        return slot, fp, None
+    if manifest.get("mtime_ns") != fp["mtime_ns"] or manifest.get("size") != fp["size"]:
+        # stesso contenuto, file solo "toccato": aggiorna l'impronta
+        manifest = dict(manifest, **fp)
+        try:
+            _write_manifest(slot, manifest)
+        except OSError:
+            pass
+    return slot, fp, manifest
+
+
+def cached_manifest(path, cache_dir=None):
+    # manifest dello snapshot se valido per il contenuto attuale del file, altrimenti None
+    return _open(path, cache_dir)[2]
+
+
+def load_sheets(path, cache_dir=None, reader=None, names=None):
+    # reader(path[, names]) -> {nome_foglio: DataFrame}; di default pandas (tutti i fogli o solo names)
+    reader = reader or read_excel_sheets
+    if names is not None:
+        names = list(dict.fromkeys(names))
+    slot, fp, manifest = _open(path, cache_dir)
+    cached = dict(manifest["sheets"]) if manifest else {}
+    want_all = names is None
+    if want_all and manifest and manifest.get("complete", True):
+        names = list(cached)  # snapshot completo: tutti i fogli sono già salvati
+    sheets = {}
+    if names is not None and cached:
+        try:
+            sheets = _read_snapshot(slot, [(n, cached[n]) for n in names if n in cached])
+        except (OSError, pa.ArrowInvalid):
+            manifest, sheets = None, {}
+    if names is None:
+        fresh = reader(path)
+    else:
+        missing = [n for n in names if n not in sheets]
+        if not missing:
+            return {n: sheets[n] for n in names}
+        fresh = reader(path, missing)
+    tables, fresh = _arrow_frames(fresh)
+    sheets.update(fresh)
+    if names is not None:
+        sheets = {n: sheets[n] for n in names}
+    try:
+        _write_snapshot(slot, fp, tables, manifest, complete=want_all and len(tables) == len(fresh))
+    except (OSError, pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        pass  # cache best-effort: i dati letti restano validi
+    return sheets
+
+
+def load_headers(path, cache_dir=None, reader=None):
+    # {nome_foglio: [intestazioni]} salvate nel manifest: a caldo non si apre nemmeno l'XLSX
+    # reader(path) -> {nome_foglio: [intestazioni]}; di default pandas
+    reader = reader or read_excel_headers
+    slot, fp, manifest = _open(path, cache_dir)
+    if manifest and manifest.get("headers") is not None:
+        return {name: list(cols) for name, cols in manifest["headers"]}
+    headers = reader(path)
+    try:
+        _write_snapshot(slot, fp, {}, manifest, complete=False,
+                        headers=[[name, cols] for name, cols in headers.items()])
+    except OSError:
+        pass
+    return headers
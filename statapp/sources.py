@@ -0,0 +1,46 @@
+# sources.py — ricerca dei file Excel con i dati
+import os
+
+# Se preferisci un nome fisso, metti qui 'data_all.xlsx' o il nome che vuoi
+POSSIBLE_FILES = ["dati tiri e falli serie a e liga.xlsx", "data_all.xlsx", "mega_file.xlsx",
+                  "tiri_serie_a.xlsx","falli_serie_a.xlsx","falli_liga.xlsx"]
+# cerca file nell'area di lavoro /app o /workspace oppure /mnt/data
+SEARCH_PATHS = [".", "/workspace", "/app", "/mnt/data"]
+
+
+def find_excel(search_paths=None):
+    for p in search_paths or SEARCH_PATHS:
+        try:
+            for fname in os.listdir(p):
+                lower = fname.lower()
+                if lower.endswith(".xlsx") or lower.endswith(".xls"):
+                    # preferisci nomi in POSSIBLE_FILES
+                    if fname in POSSIBLE_FILES:
+                        return os.path.join(p, fname)
+            # se non trovi preferisci, prendi il primo excel trovato
+            for fname in os.listdir(p):
+                lower = fname.lower()
+                if lower.endswith(".xlsx") or lower.endswith(".xls"):
+                    return os.path.join(p, fname)
+        except Exception:
+            continue
+    return None
+
+
+def find_excels(search_paths=None):
+    # tutti i workbook noti (POSSIBLE_FILES) nelle cartelle di ricerca, da unire in un unico modello;
+    # se non ce n'è nessuno, il primo Excel trovato come find_excel
+    found = []
+    for p in search_paths or SEARCH_PATHS:
+        try:
+            names = set(os.listdir(p))
+        except Exception:
+            continue
+        for fname in POSSIBLE_FILES:
+            full = os.path.realpath(os.path.join(p, fname))
+            if fname in names and full not in found:
+                found.append(full)
+    if not found:
+        one = find_excel(search_paths)
+        return [one] if one else []
+    return found
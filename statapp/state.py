@@ -0,0 +1,82 @@
+# state.py — statistiche pre-match del walk-forward (EWMA + media/varianza per lato)
+# Le statistiche su tutta la storia arrivano in blocco da features.walk_forward_features
+# (somme prefisse per squadra, nessun loop per match). Lo stato incrementale per squadra è
+# "state" (features.walk_forward_state: n, media, std ed EWMA finali): extend_features
+# aggiorna le statistiche con le sole partite accodate, in O(1) per partita.
+import numpy as np
+import pandas as pd
+
+from statapp.features import SPANS, side_sequences, walk_forward_extend, walk_forward_features, walk_forward_state
+from statapp.history import numeric_col
+
+
+def _match_keys(s):
+    # come il loop originale: scarta solo i NaN, poi str().strip()
+    return s.astype(str).str.strip().where(s.notna()).to_numpy(dtype=object)
+
+
+def match_arrays(df, home_col, away_col, home_val_col, away_val_col):
+    # match-level -> codici squadra interi (-1 se mancante) + valori numerici
+    home = _match_keys(df[home_col]); away = _match_keys(df[away_col])
+    codes, names = pd.factorize(np.concatenate([home, away]), use_na_sentinel=True)
+    n = len(df)
+    return (codes[:n].astype(np.int64), codes[n:].astype(np.int64),
+            numeric_col(df[home_val_col]), numeric_col(df[away_val_col]), list(names))
+
+
+def backtest_features(df, home_col, away_col, home_val_col, away_val_col, spans=SPANS):
+    # statistiche pre-match per tutti gli span in un passaggio: si calcolano una volta
+    # per versione dei dati, poi soglia e span del backtest si scelgono senza ricalcolo
+    home_idx, away_idx, home_vals, away_vals, names = match_arrays(df, home_col, away_col, home_val_col, away_val_col)
+    ew, mn, sd, cnt = walk_forward_features(home_idx, away_idx, home_vals, away_vals, spans)
+    return {"spans": tuple(spans), "valid": (home_idx >= 0) & (away_idx >= 0),
+            "home_vals": home_vals, "away_vals": away_vals, "ew": ew, "mn": mn, "sd": sd, "cnt": cnt,
+            "names": names, "state": walk_forward_state(np.column_stack([home_idx, away_idx]),
+                                                        np.column_stack([home_vals, away_vals]), spans)}
+
+
+def extend_features(f, df, home_col, away_col, home_val_col, away_val_col):
+    # backtest_features dopo righe accodate (df = solo le righe nuove, None = foglio non toccato):
+    # walk-forward sulle righe nuove ripartendo dallo stato di ogni squadra
+    if df is None:
+        return f
+    lookup = {name: i for i, name in enumerate(f["names"])}
+    keys = np.concatenate([_match_keys(df[home_col]), _match_keys(df[away_col])])
+    codes = np.array([-1 if pd.isna(k) else lookup.setdefault(k, len(lookup)) for k in keys],
+                     dtype=np.int64).reshape(2, -1).T
+    vals = np.column_stack([numeric_col(df[home_val_col]), numeric_col(df[away_val_col])])
+    ew, mn, sd, cnt = walk_forward_extend(f["state"], codes, vals, f["spans"])
+    cat = lambda key, new: np.concatenate([f[key], new])
+    return {"spans": f["spans"], "valid": cat("valid", (codes >= 0).all(axis=1)),
+            "home_vals": cat("home_vals", vals[:, 0]), "away_vals": cat("away_vals", vals[:, 1]),
+            "ew": cat("ew", ew), "mn": cat("mn", mn), "sd": cat("sd", sd), "cnt": cat("cnt", cnt),
+            "names": list(lookup), "state": f["state"].updated(side_sequences(codes, vals))}
+
+
+def backtest_from_features(f, thr, span=6):
+    # Ritorna (mu, sigma, actual) per riga; NaN dove mancano le squadre.
+    ew = f["ew"][:, :, f["spans"].index(span)]; cnt = f["cnt"]
+    mu_side = np.where(cnt > 0, ew, 0.0)
+    sd_side = np.where(cnt > 1, f["sd"], mu_side * 0.25)
+    mu = mu_side.sum(axis=1)
+    sigma = np.maximum(0.8, np.sqrt((sd_side ** 2).sum(axis=1)))
+    actual = ((f["home_vals"] + f["away_vals"]) > thr).astype(float)
+    bad = ~f["valid"]
+    mu[bad] = np.nan; sigma[bad] = np.nan; actual[bad] = np.nan
+    return mu, sigma, actual
+
+
+def walk_forward_stats(home_idx, away_idx, home_vals, away_vals, span=6):
+    # statistiche pre-match per lato (colonna 0 casa, 1 ospite): ewma, media, std, n.
+    # home_idx/away_idx: codici interi squadra (-1 = riga da saltare).
+    ew, mn, sd, cnt = walk_forward_features(home_idx, away_idx, home_vals, away_vals, (span,))
+    return ew[:, :, 0], mn, sd, cnt
+
+
+def expect_from_stats(ew, mn, sd, cnt, alpha=10.0):
+    # stesse formule di model.compute_expect, vettoriali sulle statistiche pre-match
+    base = 0.7*ew + 0.3*mn
+    w = cnt / (cnt + alpha)
+    mu = np.where(cnt > 0, w*base + (1-w)*mn, mn)
+    sigma = np.maximum(0.6, np.where(cnt > 1, sd, np.maximum(0.6, mu*0.25)))
+    return mu.sum(axis=1), np.sqrt((sigma**2).sum(axis=1))
@@ -0,0 +1,264 @@
+# store.py — archivio SQLite locale delle storie match-level (multi-stagione, multi-lega)
+# Una riga per (squadra, metrica, partita) con lega, stagione e data; indici su
+# (league, season, team, date), (team, metric, seq) e arbitro. Il motore interroga solo
+# ciò che serve a una stima: media e varianza calcolate da SQLite e gli ultimi K valori
+# per l'EWMA (K tale che il peso dei valori più vecchi sia < tol), invece di caricare
+# in memoria tutta la storia.
+import json
+import math
+import sqlite3
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from statapp.features import ewma_paths
+from statapp.history import METRICS, find_col, history_parts, referee_part
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS obs (
+    seq INTEGER PRIMARY KEY,          -- ordine delle storie (come build_histories)
+    league TEXT, season TEXT, team TEXT NOT NULL, date TEXT,
+    metric TEXT NOT NULL, value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS obs_league_season_team_date ON obs(league, season, team, date);
+CREATE INDEX IF NOT EXISTS obs_team_metric ON obs(team, metric, seq);
+CREATE TABLE IF NOT EXISTS referee_obs (
+    seq INTEGER PRIMARY KEY,
+    league TEXT, season TEXT, referee TEXT NOT NULL, date TEXT, value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS referee_obs_referee ON referee_obs(referee, seq);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# lega di default per foglio, se il foglio non ha una colonna lega
+DEFAULT_LEAGUE = {"tiri": "serie_a", "falli_ita": "serie_a", "falli_liga": "liga"}
+LEAGUE_COLS = ["lega", "league", "campionato", "competition"]
+SEASON_COLS = ["stagione", "season"]
+DATE_COLS = ["data", "date", "giorno"]
+
+
+def ewma_window(span, tol=1e-12):
+    # valori necessari perché l'EWMA troncato differisca dal completo di < tol × ampiezza dei dati
+    a = 2.0 / (span + 1.0)
+    return int(math.ceil(math.log(tol) / math.log(1.0 - a))) + 1
+
+
+def _row_attr(df, candidates, rows, default=None, date=False):
+    col = find_col(df, candidates)
+    if col is None:
+        return np.full(len(rows), default, dtype=object)
+    s = df[col]
+    if date:
+        s = pd.to_datetime(s, errors="coerce").dt.strftime("%Y-%m-%d")
+    vals = s.astype(str).str.strip().where(s.notna()).to_numpy(dtype=object)
+    out = vals[rows]
+    if default is not None:
+        out = np.where(pd.isna(out), default, out)
+    return out
+
+
+def long_rows(frames, cols):
+    # frames {ruolo: DataFrame} -> (oss squadra, oss arbitro) in formato lungo, in ordine di storia
+    parts = []
+    f = frames
+    for role, metric, keys, vals, rows in history_parts(f.get("tiri"), f.get("falli_ita"), f.get("falli_liga"), cols):
+        df = f[role]
+        mask = pd.notna(keys)
+        rows = rows[mask]
+        parts.append(pd.DataFrame({
+            "league": _row_attr(df, LEAGUE_COLS, rows, DEFAULT_LEAGUE[role]),
+            "season": _row_attr(df, SEASON_COLS, rows), "team": keys[mask],
+            "date": _row_attr(df, DATE_COLS, rows, date=True), "metric": metric, "value": vals[mask]}))
+    obs = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(
+        columns=["league", "season", "team", "date", "metric", "value"])
+    refs = pd.DataFrame(columns=["league", "season", "referee", "date", "value"])
+    ref = referee_part(f.get("falli_ita"), cols)
+    if ref is not None:
+        names, vals = ref
+        mask = pd.notna(names); rows = np.flatnonzero(mask); df = f["falli_ita"]
+        refs = pd.DataFrame({"league": _row_attr(df, LEAGUE_COLS, rows, DEFAULT_LEAGUE["falli_ita"]),
+                             "season": _row_attr(df, SEASON_COLS, rows), "referee": names[mask],
+                             "date": _row_attr(df, DATE_COLS, rows, date=True), "value": vals[mask]})
+    return obs, refs
+
+
+def _where(**filters):
+    # filtri opzionali -> (clausola SQL, parametri); liste = IN (...)
+    sql, args = [], []
+    for col, v in filters.items():
+        if v is None: continue
+        if isinstance(v, (list, tuple)):
+            sql.append(f"{col} IN ({','.join('?' * len(v))})"); args.extend(v)
+        else:
+            sql.append(f"{col} = ?"); args.append(v)
+    return (" AND " + " AND ".join(sql)) if sql else "", args
+
+
+class Store:
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self.con = sqlite3.connect(path, check_same_thread=False)
+        self.con.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.con.close()
+
+    def _q(self, sql, args=()):
+        # letture serializzate: la connessione è condivisa fra i thread delle sessioni
+        with self._lock:
+            return self.con.execute(sql, args).fetchall()
+
+    def _df(self, sql, args=()):
+        with self._lock:
+            return pd.read_sql_query(sql, self.con, params=args)
+
+    # -- scrittura --------------------------------------------------------
+    def import_frames(self, frames, cols, version=None, replace=True):
+        obs, refs = long_rows(frames, cols)
+        with self._lock, self.con:
+            if replace:
+                self.con.execute("DELETE FROM obs"); self.con.execute("DELETE FROM referee_obs")
+            self._insert(obs, refs)
+            self._set_meta(cols=json.dumps(cols), version=version or self._next_version())
+        return len(obs)
+
+    def import_model(self, data):
+        return self.import_frames(data.frames, data.cols, version=data.version)
+
+    def append(self, role, rows):
+        # righe nuove di un foglio (stesse colonne), in coda alle storie esistenti
+        cols = self.meta("cols")
+        if cols is None:
+            raise ValueError("Archivio vuoto: importa prima un workbook.")
+        obs, refs = long_rows({role: rows}, json.loads(cols))
+        with self._lock, self.con:
+            self._insert(obs, refs)
+            self._set_meta(version=self._next_version())
+        return len(obs)
+
+    def _insert(self, obs, refs):
+        self.con.executemany("INSERT INTO obs (league, season, team, date, metric, value) VALUES (?,?,?,?,?,?)",
+                             obs[["league", "season", "team", "date", "metric", "value"]].itertuples(index=False))
+        self.con.executemany("INSERT INTO referee_obs (league, season, referee, date, value) VALUES (?,?,?,?,?)",
+                             refs[["league", "season", "referee", "date", "value"]].itertuples(index=False))
+
+    def _set_meta(self, **kv):
+        self.con.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", kv.items())
+
+    def _next_version(self):
+        # nuova versione a ogni scrittura (chiave delle cache per versione dei dati)
+        return f"sqlite:{uuid.uuid4().hex}"
+
+    # -- lettura -----------------------------------------------------------
+    def meta(self, key):
+        row = next(iter(self._q("SELECT value FROM meta WHERE key = ?", (key,))), None)
+        return row[0] if row else None
+
+    @property
+    def version(self):
+        return self.meta("version")
+
+    def leagues(self):
+        return [r[0] for r in self._q("SELECT DISTINCT league FROM obs ORDER BY league")]
+
+    def seasons(self, league=None):
+        w, args = _where(league=league)
+        return [r[0] for r in self._q(
+            f"SELECT DISTINCT season FROM obs WHERE season IS NOT NULL{w} ORDER BY season", args)]
+
+    def teams(self, league=None, season=None):
+        w, args = _where(league=league, season=season)
+        return [r[0] for r in self._q(f"SELECT DISTINCT team FROM obs WHERE 1{w} ORDER BY team", args)]
+
+    def referees(self, league=None):
+        w, args = _where(league=league)
+        return [r[0] for r in self._q(f"SELECT DISTINCT referee FROM referee_obs WHERE 1{w} ORDER BY referee", args)]
+
+    def team_values(self, team, metric, last=None, league=None, season=None):
+        # valori in ordine cronologico; last=K -> solo gli ultimi K (via indice team, metric, seq)
+        w, args = _where(league=league, season=season)
+        sql = f"SELECT value FROM obs WHERE team = ? AND metric = ?{w} ORDER BY seq DESC"
+        if last is not None:
+            sql += f" LIMIT {int(last)}"
+        vals = np.array([r[0] for r in self._q(sql, [team, metric] + args)], dtype=float)
+        return vals[::-1].copy()
+
+    def team_summary(self, team, metric, league=None, season=None):
+        # (n, media, std di popolazione) calcolati da SQLite, senza trasferire la storia
+        w, args = _where(league=league, season=season)
+        base = f"FROM obs WHERE team = ? AND metric = ?{w}"
+        n, m = self._q(f"SELECT COUNT(*), AVG(value) {base}", [team, metric] + args)[0]
+        if not n:
+            return 0, 0.0, 0.0
+        var = self._q(f"SELECT AVG((value - ?) * (value - ?)) {base}", [m, m, team, metric] + args)[0][0]
+        return n, float(m), math.sqrt(max(var or 0.0, 0.0))
+
+    def team_estimate(self, team, key, span=6, alpha=10.0, league=None, season=None, tol=1e-12):
+        # stesse formule di FeatureStore.team_estimate / model.team_estimate
+        n, mu_overall, sd = self.team_summary(team, key, league, season)
+        if n == 0:
+            return 0.0, 0.6
+        recent = self.team_values(team, key, last=ewma_window(span, tol), league=league, season=season)
+        mu_recent = float(ewma_paths(recent[None, :], (span,))[0, 0, -1])
+        w = n/(n+alpha)
+        mu = w*(0.7*mu_recent + 0.3*mu_overall) + (1-w)*mu_overall
+        sigma = max(0.6, sd if n>1 else max(0.6, mu*0.25))
+        return mu, sigma
+
+    def presence(self, teams, metrics=METRICS, league=None, season=None):
+        # {squadra: {metrica: 1}} per le coppie con almeno un valore: EXISTS sull'indice
+        # (team, metric, seq), senza leggere le storie (basta a _slate_base con una StoreView)
+        w, args = _where(league=league, season=season)
+        sql = f"SELECT EXISTS (SELECT 1 FROM obs WHERE team = ? AND metric = ?{w})"
+        out = {}
+        with self._lock:
+            for team in teams:
+                for metric in metrics:
+                    if self.con.execute(sql, [team, metric] + args).fetchone()[0]:
+                        out.setdefault(team, {})[metric] = 1
+        return out
+
+    def histories(self, teams=None, metrics=None, league=None, season=None, last=None, referees=None):
+        # (team_stats, arbitri_stats) come build_histories, limitati a squadre/metriche/arbitri;
+        # last=K -> solo gli ultimi K valori per (squadra, metrica), scelti in SQL
+        if teams is not None and not teams:
+            return {}, self.referee_stats(referees, league, season)
+        w, args = _where(team=list(teams) if teams is not None else None,
+                         metric=list(metrics) if metrics is not None else None, league=league, season=season)
+        if last is None:
+            sql = f"SELECT team, metric, value FROM obs WHERE 1{w} ORDER BY seq"
+        else:
+            sql = (f"SELECT team, metric, value FROM (SELECT team, metric, value, seq, ROW_NUMBER() OVER "
+                   f"(PARTITION BY team, metric ORDER BY seq DESC) AS rn FROM obs WHERE 1{w}) "
+                   f"WHERE rn <= ? ORDER BY seq")
+            args = args + [int(last)]
+        df = self._df(sql, args)
+        team_stats = {}
+        for (team, metric), g in df.groupby(["team", "metric"], sort=False):
+            team_stats.setdefault(team, {})[metric] = g["value"].to_numpy(dtype=float)
+        return team_stats, self.referee_stats(referees, league, season)
+
+    def referee_stats(self, referees=None, league=None, season=None):
+        # arbitro -> valori in ordine; referees limita la lettura agli arbitri richiesti
+        if referees is not None and not referees:
+            return {}
+        w, args = _where(referee=list(referees) if referees is not None else None, league=league, season=season)
+        refs = self._df(f"SELECT referee, value FROM referee_obs WHERE 1{w} ORDER BY seq", args)
+        return {name: g["value"].to_numpy(dtype=float) for name, g in refs.groupby("referee", sort=False)}
+
+    def view(self, league=None, season=None):
+        return StoreView(self, league, season)
+
+
+class StoreView:
+    # adattatore con l'interfaccia di FeatureStore (team_estimate) per compute_expect / price_slate
+    __slots__ = ("store", "league", "season")
+
+    def __init__(self, store, league=None, season=None):
+        self.store = store; self.league = league; self.season = season
+
+    def team_estimate(self, team, key, span=6, alpha=10.0):
+        return self.store.team_estimate(team, key, span, alpha, self.league, self.season)
@@ -0,0 +1,143 @@
+# sweep.py — metriche del backtest per tutti i cutoff in un passaggio
+# Le previsioni (p) e gli esiti (y) vengono ordinati una volta per p decrescente; con le
+# somme cumulative di esiti e vincite, volume / colpi / accuracy / ROC / ROI di ogni cutoff
+# sono una searchsorted. Scegliere il cutoff nella UI è una lettura di riga, non un nuovo
+# backtest. In più: Brier, log-loss, AUC e bin di affidabilità (calibrazione).
+# evaluate_hist fa lo stesso da un istogramma di p a celle di 1/HIST_SCALE (somme per cella):
+# l'archivio dei risultati lo costruisce con una GROUP BY, senza leggere le righe.
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+
+from statapp.calibrate import EPS
+
+CUTOFFS = np.array([round(c, 2) for c in np.arange(0.50, 0.951, 0.01)])
+DEFAULT_ODDS = 1.90   # quota decimale di riferimento (stake fisso 1) se il file non ha quote
+SWEEP_COLUMNS = ["cutoff", "volume", "hits", "hit_rate", "accuracy", "tpr", "fpr", "profit", "roi"]
+HIST_SCALE = 100_000                # celle dell'istogramma di p (cutoff multipli di 1e-5 esatti)
+HIST_EPS = 1e-9                     # cella = floor(p * scale + eps): p == cutoff sta nella cella del cutoff
+HIST_COLUMNS = ["b", "n", "hits", "p_sum", "sq", "ll"]
+
+
+def _clean(p, y, odds=None):
+    p = np.asarray(p, dtype=float).ravel(); y = np.asarray(y, dtype=float).ravel()
+    ok = ~(np.isnan(p) | np.isnan(y))
+    o = None if odds is None else np.broadcast_to(np.asarray(odds, dtype=float), p.shape)[ok]
+    return p[ok], y[ok], o
+
+
+def sweep(p, y, cutoffs=CUTOFFS, odds=DEFAULT_ODDS):
+    # segnale = p >= cutoff; stake 1 per segnale, vincita odds se y = 1
+    p, y, odds = _clean(p, y, odds)
+    cutoffs = np.asarray(cutoffs, dtype=float)
+    n = len(p)
+    if n == 0:
+        return pd.DataFrame(columns=SWEEP_COLUMNS)
+    order = np.argsort(-p, kind="stable")
+    neg_p = -p[order]; ys = y[order]
+    hits = np.concatenate([[0.0], np.cumsum(ys)])
+    pay = np.concatenate([[0.0], np.cumsum(ys * odds[order])])
+    vol = np.searchsorted(neg_p, -cutoffs, side="right")   # quante p >= cutoff
+    pos = hits[-1]; neg = n - pos
+    tp = hits[vol]; fp = vol - tp
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame({
+            "cutoff": cutoffs, "volume": vol, "hits": tp.astype(np.int64),
+            "hit_rate": np.where(vol > 0, tp / vol, np.nan),
+            "accuracy": (tp + (neg - fp)) / n,
+            "tpr": tp / pos if pos else np.nan, "fpr": fp / neg if neg else np.nan,
+            "profit": pay[vol] - vol, "roi": np.where(vol > 0, (pay[vol] - vol) / vol, np.nan)})
+
+
+def roc_auc(p, y):
+    # AUC come statistica di Mann-Whitney (ranghi medi per i pari merito)
+    p, y, _ = _clean(p, y)
+    pos = y.sum(); neg = len(y) - pos
+    if pos == 0 or neg == 0: return float("nan")
+    r = rankdata(p)
+    return float((r[y > 0.5].sum() - pos * (pos + 1) / 2) / (pos * neg))
+
+
+def reliability(p, y, bins=10):
+    # per bin di probabilità: p media prevista, frequenza osservata, conteggio
+    p, y, _ = _clean(p, y)
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    # bin floor(p * bins) come evaluate_hist (linspace dà 0.6000000000000001: p = 0.6 resta nel bin 0.6)
+    idx = np.clip(np.floor(p * bins + HIST_EPS), 0, bins - 1).astype(np.int64)
+    n = np.bincount(idx, minlength=bins)
+    with np.errstate(invalid="ignore"):
+        return pd.DataFrame({"bin_lo": edges[:-1], "bin_hi": edges[1:], "n": n,
+                             "p_mean": np.bincount(idx, weights=p, minlength=bins) / n,
+                             "freq": np.bincount(idx, weights=y, minlength=bins) / n})
+
+
+def scores(p, y):
+    p, y, _ = _clean(p, y)
+    if len(p) == 0:
+        return {"n": 0, "base_rate": float("nan"), "brier": float("nan"), "log_loss": float("nan"), "auc": float("nan")}
+    pc = np.clip(p, EPS, 1 - EPS)
+    return {"n": int(len(p)), "base_rate": float(y.mean()), "brier": float(((p - y) ** 2).mean()),
+            "log_loss": float(-(y * np.log(pc) + (1 - y) * np.log(1 - pc)).mean()), "auc": roc_auc(p, y)}
+
+
+def safe_line_bets(df, conf=0.7):
+    # regola "linea sicura": per partita, la linea over più alta con p >= conf e la under più
+    # bassa con 1 - p >= conf -> DataFrame (metric, row, side, line, p, won)
+    if df.empty:
+        return pd.DataFrame(columns=["metric", "row", "side", "line", "p", "won"])
+    keys = ["metric", "row"]
+    over = df[df["p_over"] >= conf].sort_values("line").groupby(keys, sort=False).tail(1)
+    under = df[1.0 - df["p_over"] >= conf].sort_values("line").groupby(keys, sort=False).head(1)
+    return pd.concat([
+        pd.DataFrame({"metric": over["metric"], "row": over["row"], "side": "over", "line": over["line"],
+                      "p": over["p_over"], "won": over["outcome"].astype(float)}),
+        pd.DataFrame({"metric": under["metric"], "row": under["row"], "side": "under", "line": under["line"],
+                      "p": 1.0 - under["p_over"], "won": 1.0 - under["outcome"]})], ignore_index=True)
+
+
+def evaluate(p, y, cutoffs=CUTOFFS, odds=DEFAULT_ODDS, bins=10):
+    # tutto in una volta: punteggi globali, tabella per cutoff, affidabilità
+    return {"scores": scores(p, y), "sweep": sweep(p, y, cutoffs, odds), "reliability": reliability(p, y, bins)}
+
+
+def histogram(p, y, scale=HIST_SCALE):
+    # per cella floor(p * scale + HIST_EPS): conteggio, esiti, somma di p, errore quadratico e
+    # log-loss. Senza eps 0.58 * 1e5 = 57999.99... finirebbe nella cella sotto il cutoff 0.58
+    p, y, _ = _clean(p, y)
+    pc = np.clip(p, EPS, 1 - EPS)
+    d = pd.DataFrame({"b": np.floor(p * scale + HIST_EPS).astype(np.int64), "n": 1, "hits": y, "p_sum": p,
+                      "sq": (p - y) ** 2, "ll": -(y * np.log(pc) + (1 - y) * np.log(1 - pc))})
+    return d.groupby("b", as_index=False).sum()[HIST_COLUMNS]
+
+
+def evaluate_hist(h, cutoffs=CUTOFFS, odds=DEFAULT_ODDS, bins=10, scale=HIST_SCALE):
+    # come evaluate (quota unica) da un istogramma di p; l'AUC tratta come pari merito le p
+    # della stessa cella
+    h = h.groupby("b").sum().sort_index()
+    b = h.index.to_numpy(dtype=np.int64); n = h["n"].to_numpy(dtype=float); y = h["hits"].to_numpy(dtype=float)
+    N = n.sum(); pos = y.sum(); neg = N - pos
+    if N == 0:
+        return {"scores": scores([], []), "sweep": pd.DataFrame(columns=SWEEP_COLUMNS),
+                "reliability": reliability([], [], bins)}
+    cneg = np.cumsum(n - y) - (n - y)            # negativi nelle celle sotto
+    auc = float((y * (cneg + 0.5 * (n - y))).sum() / (pos * neg)) if pos and neg else float("nan")
+    sc = {"n": int(N), "base_rate": float(pos / N), "brier": float(h["sq"].sum() / N),
+          "log_loss": float(h["ll"].sum() / N), "auc": auc}
+    cutoffs = np.asarray(cutoffs, dtype=float)
+    at = np.searchsorted(b, np.round(cutoffs * scale).astype(np.int64), side="left")
+    cn = np.concatenate([[0.0], np.cumsum(n)]); cy = np.concatenate([[0.0], np.cumsum(y)])
+    vol = N - cn[at]; tp = pos - cy[at]; fp = vol - tp; pay = tp * odds
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sw = pd.DataFrame({
+            "cutoff": cutoffs, "volume": vol.astype(np.int64), "hits": tp.astype(np.int64),
+            "hit_rate": np.where(vol > 0, tp / vol, np.nan),
+            "accuracy": (tp + (neg - fp)) / N,
+            "tpr": tp / pos if pos else np.nan, "fpr": fp / neg if neg else np.nan,
+            "profit": pay - vol, "roi": np.where(vol > 0, (pay - vol) / vol, np.nan)})
+        idx = np.minimum(b * bins // scale, bins - 1)
+        edges = np.linspace(0.0, 1.0, bins + 1)
+        rn = np.bincount(idx, weights=n, minlength=bins)
+        rel = pd.DataFrame({"bin_lo": edges[:-1], "bin_hi": edges[1:], "n": rn.astype(np.int64),
+                            "p_mean": np.bincount(idx, weights=h["p_sum"].to_numpy(), minlength=bins) / rn,
+                            "freq": np.bincount(idx, weights=y, minlength=bins) / rn})
+    return {"scores": sc, "sweep": sw, "reliability": rel}
@@ -0,0 +1,195 @@
+# workbook.py — caricamento pigro e selettivo dei fogli
+# Prima si leggono solo nomi fogli e riga di intestazione (openpyxl read_only, streaming);
+# tiri / falli serie a / falli liga vengono scelti da quelle e solo loro vengono parsati.
+# Gli altri fogli restano disponibili su richiesta (book[nome]).
+# MultiWorkbook unisce più file (es. tiri_serie_a / falli_serie_a / falli_liga): i fogli
+# prendono il nome "file/foglio" e i file non ancora in cache vengono letti in parallelo.
+import multiprocessing
+import os
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from statapp.snapshot import load_sheets, load_headers, cached_manifest
+
+
+def _header(row):
+    # come pandas: celle vuote -> "Unnamed: i", colonne vuote in coda scartate
+    cells = list(row)
+    while cells and (cells[-1] is None or str(cells[-1]).strip() == ""):
+        cells.pop()
+    return [f"Unnamed: {i}" if c is None or str(c).strip() == "" else str(c) for i, c in enumerate(cells)]
+
+
+def read_headers(path):
+    # {nome_foglio: [intestazioni]} senza leggere i dati (prima riga non vuota di ogni foglio)
+    if not str(path).lower().endswith((".xlsx", ".xlsm")):
+        with pd.ExcelFile(path) as xl:
+            return {name: [str(c) for c in xl.parse(name, nrows=0).columns] for name in xl.sheet_names}
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        headers = {}
+        for ws in wb.worksheets:
+            headers[ws.title] = []
+            for row in ws.iter_rows(values_only=True):
+                if any(c is not None and str(c).strip() != "" for c in row):
+                    headers[ws.title] = _header(row)
+                    break
+        return headers
+    finally:
+        wb.close()
+
+
+class LazyWorkbook(Mapping):
+    # mapping nome_foglio -> DataFrame che parsa un foglio solo al primo accesso
+    def __init__(self, path, cache_dir=None, headers=None):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.headers = headers if headers is not None else load_headers(path, cache_dir, reader=read_headers)
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def stubs(self):
+        # DataFrame vuoti con le sole intestazioni, per sheet_by_keyword e fallback
+        return {name: pd.DataFrame(columns=cols) for name, cols in self.headers.items()}
+
+    def load(self, names):
+        # parsa in un solo passaggio i fogli richiesti non ancora caricati
+        with self._lock:
+            missing = [n for n in dict.fromkeys(names) if n not in self._frames]
+            if missing:
+                self._frames.update(load_sheets(self.path, self.cache_dir, names=missing))
+            return {n: self._frames[n] for n in names}
+
+    def add(self, frames):
+        with self._lock:
+            for n, df in frames.items():
+                self._frames.setdefault(n, df)
+
+    @property
+    def loaded(self):
+        return tuple(self._frames)
+
+    def __getitem__(self, name):
+        if name not in self.headers:
+            raise KeyError(name)
+        if name not in self._frames:
+            self.load([name])
+        return self._frames[name]
+
+    def __iter__(self):
+        return iter(self.headers)
+
+    def __len__(self):
+        return len(self.headers)
+
+
+def _headers_job(path, cache_dir):
+    return load_headers(path, cache_dir, reader=read_headers)
+
+
+def _sheets_job(path, cache_dir, names):
+    return load_sheets(path, cache_dir, names=names)
+
+
+def _mp_context(preload=(__name__,)):
+    # niente fork: si parte da thread Streamlit / dal thread di reload e il fork di un processo
+    # multi-thread può bloccarsi su lock ereditati. forkserver parte da un processo pulito che
+    # ha già importato i moduli `preload` (qui pandas, openpyxl, pyarrow); spawn dove non c'è.
+    # Usato anche dal pool di calibrate
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload(list(preload))
+    return ctx
+
+
+def _run(jobs, n_jobs=None):
+    # jobs: [(fn, args)]; i job a freddo (parse XLSX, CPU-bound) vanno su processi separati
+    workers = min(len(jobs), n_jobs or os.cpu_count() or 1)
+    if workers <= 1:
+        return [fn(*args) for fn, args in jobs]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context()) as ex:
+        futures = [ex.submit(fn, *args) for fn, args in jobs]
+        return [f.result() for f in futures]
+
+
+def _source_names(paths):
+    # "stem" del file, reso unico se lo stesso nome compare in più cartelle
+    out, seen = [], {}
+    for p in paths:
+        stem = os.path.splitext(os.path.basename(p))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        out.append(stem if seen[stem] == 1 else f"{stem}_{seen[stem]}")
+    return out
+
+
+class MultiWorkbook(Mapping):
+    # più workbook visti come un unico mapping "file/foglio" -> DataFrame (pigro)
+    SEP = "/"
+
+    def __init__(self, paths, cache_dir=None, n_jobs=None):
+        self.paths = list(paths)
+        self.cache_dir = cache_dir
+        self.n_jobs = n_jobs
+        # intestazioni: dalla cache se valide, altrimenti lette in parallelo
+        manifests = [cached_manifest(p, cache_dir) for p in self.paths]
+        cold = [i for i, m in enumerate(manifests) if not m or m.get("headers") is None]
+        read = dict(zip(cold, _run([(_headers_job, (self.paths[i], cache_dir)) for i in cold], n_jobs)))
+        self.books = []
+        for i, p in enumerate(self.paths):
+            headers = read.get(i)
+            if headers is None:
+                headers = {name: list(cols) for name, cols in manifests[i]["headers"]}
+            self.books.append(LazyWorkbook(p, cache_dir, headers))
+        self._index = {}
+        for src, book in zip(_source_names(self.paths), self.books):
+            for name in book.headers:
+                self._index[f"{src}{self.SEP}{name}"] = (book, name)
+        self.headers = {key: book.headers[name] for key, (book, name) in self._index.items()}
+
+    def stubs(self):
+        return {key: pd.DataFrame(columns=cols) for key, cols in self.headers.items()}
+
+    def load(self, keys):
+        # raggruppa per file; i file con fogli non in cache vengono parsati in parallelo
+        wanted = {}
+        for key in dict.fromkeys(keys):
+            book, name = self._index[key]
+            wanted.setdefault(id(book), (book, []))[1].append(name)
+        cold = []
+        for book, names in wanted.values():
+            m = cached_manifest(book.path, self.cache_dir)
+            have = {n for n, _ in m["sheets"]} if m else set()
+            todo = [n for n in names if n not in book.loaded and n not in have]
+            if todo:
+                cold.append((book, todo))
+        results = _run([(_sheets_job, (book.path, self.cache_dir, todo)) for book, todo in cold], self.n_jobs)
+        for (book, _), frames in zip(cold, results):
+            book.add(frames)
+        return {key: self[key] for key in keys}
+
+    @property
+    def loaded(self):
+        return tuple(key for key, (book, name) in self._index.items() if name in book.loaded)
+
+    def __getitem__(self, key):
+        book, name = self._index[key]
+        return book[name]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+def open_sources(paths, cache_dir=None, n_jobs=None):
+    # un file -> LazyWorkbook (nomi fogli originali); più file -> MultiWorkbook
+    if isinstance(paths, (str, os.PathLike)):
+        return LazyWorkbook(paths, cache_dir)
+    paths = list(paths)
+    return LazyWorkbook(paths[0], cache_dir) if len(paths) == 1 else MultiWorkbook(paths, cache_dir, n_jobs)
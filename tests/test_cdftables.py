@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from scipy.special import ndtr, pdtr
+
+from statapp.cdftables import K_MAX, MU_MAX, Z_MAX, get_tables
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_max_error_within_bounds(seed):
+    err = get_tables().max_error(n=50_000, seed=seed)
+    assert err["norm"] <= err["norm_bound"]
+    assert err["poisson"] <= err["poisson_bound"]
+
+
+def test_out_of_table_is_exact():
+    T = get_tables()
+    z = np.array([-Z_MAX - 1, -Z_MAX, Z_MAX, Z_MAX + 1, np.nan])
+    assert np.allclose(T.norm_cdf(z), ndtr(z), atol=1e-15, equal_nan=True)
+    k = np.array([-1, 0, 3, K_MAX + 5, 70]); mu = np.array([2.0, MU_MAX + 3, 90.0, 10.0, 70.0])
+    assert np.array_equal(T.pois_cdf(k, mu), np.where(k < 0, 0.0, pdtr(np.maximum(k, 0), mu)))
+
+
+def test_scalar_matches_vector():
+    T = get_tables()
+    rng = np.random.default_rng(3)
+    for z in rng.uniform(-Z_MAX - 1, Z_MAX + 1, 200):
+        assert T.norm_cdf1(z) == pytest.approx(float(T.norm_cdf(z)), abs=1e-15)
+    for k, mu in zip(rng.integers(-1, K_MAX + 3, 200), rng.uniform(0, MU_MAX + 5, 200)):
+        assert T.pois_cdf1(int(k), mu) == pytest.approx(float(T.pois_cdf(k, mu)), abs=1e-15)
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from benchmarks.synth import generate
+from statapp.backtest import backtest_arrays, extend_arrays
+from statapp.datamodel import DataModel
+from statapp.features import walk_forward_extend, walk_forward_sides, walk_forward_state
+from statapp.state import backtest_features, extend_features
+
+SHEETS = {"tiri": "tiri", "falli_ita": "falli_serie_a", "falli_liga": "falli_liga"}
+
+
+def _random_sides(k, n=300, teams=9, seed=0):
+    rng = np.random.default_rng(seed)
+    codes = rng.integers(0, teams, (n, k))
+    codes[rng.random((n, k)) < 0.03] = -1      # squadre mancanti
+    if k == 2:
+        codes[5] = [4, 4]                         # stessa squadra sui due lati
+    return codes, rng.poisson(12.0, (n, k)).astype(float)
+
+
+def _assert_close(got, ref):
+    ew, mn, sd, cnt = got
+    ew_r, mn_r, sd_r, cnt_r = ref
+    np.testing.assert_array_equal(cnt, cnt_r)
+    np.testing.assert_allclose(ew, ew_r, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(mn, mn_r, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(sd, sd_r, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("k", [1, 2])
+@pytest.mark.parametrize("cut", [0, 1, 57, 299])
+def test_walk_forward_extend_matches_full(k, cut):
+    codes, vals = _random_sides(k, seed=k)
+    full = walk_forward_sides(codes, vals)
+    # walk-forward del solo blocco accodato dallo stato del prefisso
+    state = walk_forward_state(codes[:cut], vals[:cut])
+    got = walk_forward_extend(state, codes[cut:], vals[cut:])
+    _assert_close(got, tuple(a[cut:] for a in full))
+
+
+def _model(sheets, cut=None, role=None):
+    sel = {}
+    for r, name in SHEETS.items():
+        df = sheets[name]
+        if cut is not None and name == SHEETS[role]:
+            df = df.iloc[:cut].reset_index(drop=True)
+        sel[r] = (name, df)
+    return DataModel("synth.xlsx", {"hash": "synth"}, sel)
+
+
+@pytest.mark.parametrize("role", ["tiri", "falli_ita"])
+def test_with_rows_extends_derived(role):
+    sheets = generate(teams=8, seasons=1, leagues=2, seed=4)
+    df = sheets[SHEETS[role]]
+    cut = len(df) - 30
+    m = _model(sheets, cut, role)
+    cols = m.cols
+    args = (cols["tiri_home"], cols["tiri_away"], cols["tiri_home_sh"], cols["tiri_away_sh"])
+    m.derived("arrays", lambda: backtest_arrays(m.frames, cols),
+              extend=lambda a, rows, off: extend_arrays(a, rows, cols, off))
+    m.derived("features", lambda: backtest_features(m.frames["tiri"], *args),
+              extend=lambda f, rows, off: extend_features(f, rows.get("tiri"), *args))
+    # due giornate accodate, poi confronto con la ricostruzione completa
+    m2 = m.with_rows(role, df.iloc[cut:cut + 12]).with_rows(role, df.iloc[cut + 12:])
+    assert m2.frames.length(role) == len(df)
+
+    got = m2._derived["arrays"]; ref = backtest_arrays(m2.frames, cols)
+    assert list(got) == list(ref)
+    for metric in ref:
+        for key in ("rows", "codes", "totals", "valid", "row_hash"):
+            np.testing.assert_array_equal(got[metric][key], ref[metric][key], err_msg=f"{metric}.{key}")
+        assert list(got[metric]["names"]) == list(ref[metric]["names"])
+        _assert_close(tuple(got[metric][k] for k in ("ew", "mn", "sd", "cnt")),
+                      tuple(ref[metric][k] for k in ("ew", "mn", "sd", "cnt")))
+
+    got = m2._derived["features"]; ref = backtest_features(m2.frames["tiri"], *args)
+    for key in ("valid", "home_vals", "away_vals"):
+        np.testing.assert_array_equal(got[key], ref[key])
+    _assert_close(tuple(got[k] for k in ("ew", "mn", "sd", "cnt")), tuple(ref[k] for k in ("ew", "mn", "sd", "cnt")))
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synth import generate
+from statapp.history import build_histories, resolve_columns, safe_float
+
+
+def _baseline(df_tiri, df_falli_ita, df_falli_liga):
+    # il loop iterrows originale di app.py, usato come riferimento
+    c = resolve_columns(df_tiri, df_falli_ita, df_falli_liga)
+    team_stats, arbitri_stats = {}, {}
+
+    def add(team, key, val):
+        if team is None or pd.isna(team): return
+        t = str(team).strip()
+        if t == "": return
+        team_stats.setdefault(t, {}).setdefault(key, []).append(safe_float(val))
+
+    if df_tiri is not None:
+        if c["tiri_team"] and c["tiri_team"] in df_tiri.columns and c["tiri_tot"] and c["tiri_tot"] in df_tiri.columns:
+            for _, r in df_tiri.iterrows():
+                team = r.get(c["tiri_team"])
+                if pd.isna(team): continue
+                add(team, "tiri", r.get(c["tiri_tot"]))
+                if c["tiri_sot"] and c["tiri_sot"] in df_tiri.columns:
+                    add(team, "sot", r.get(c["tiri_sot"]))
+        else:
+            for _, r in df_tiri.iterrows():
+                home = r.get(c["tiri_home"]) if c["tiri_home"] in df_tiri.columns else None
+                away = r.get(c["tiri_away"]) if c["tiri_away"] in df_tiri.columns else None
+                home_sh = None; away_sh = None
+                for col in df_tiri.columns:
+                    cl = col.lower()
+                    if "home" in cl and ("shot" in cl or "tiri" in cl): home_sh = r.get(col)
+                    if "away" in cl and ("shot" in cl or "tiri" in cl): away_sh = r.get(col)
+                if home and not pd.isna(home): add(home, "tiri", home_sh)
+                if away and not pd.isna(away): add(away, "tiri", away_sh)
+    if df_falli_ita is not None:
+        for _, r in df_falli_ita.iterrows():
+            team = r.get(c["falli_ita_team"]) if c["falli_ita_team"] in df_falli_ita.columns else None
+            if team is not None and not pd.isna(team) and c["falli_ita_falli"] in df_falli_ita.columns:
+                add(team, "falli", r.get(c["falli_ita_falli"]))
+            if c["falli_ita_arb"] and c["falli_ita_arb"] in df_falli_ita.columns:
+                arb = r.get(c["falli_ita_arb"])
+                if pd.notna(arb):
+                    if c["falli_ita_arb_mean"] and c["falli_ita_arb_mean"] in df_falli_ita.columns:
+                        val = safe_float(r.get(c["falli_ita_arb_mean"]))
+                    elif c["falli_ita_falli"] and c["falli_ita_falli"] in df_falli_ita.columns:
+                        val = safe_float(r.get(c["falli_ita_falli"]))
+                    else:
+                        val = 0.0
+                    arbitri_stats.setdefault(str(arb).strip(), []).append(val)
+    if df_falli_liga is not None:
+        for _, r in df_falli_liga.iterrows():
+            team = r.get(c["falli_liga_team"]) if c["falli_liga_team"] and c["falli_liga_team"] in df_falli_liga.columns else None
+            if team is not None and not pd.isna(team) and c["falli_liga_falli"] in df_falli_liga.columns:
+                add(team, "falli_liga", r.get(c["falli_liga_falli"]))
+    return team_stats, arbitri_stats
+
+
+def _assert_same(got, ref):
+    team_got, arb_got = got; team_ref, arb_ref = ref
+    assert list(team_got) == list(team_ref)
+    for team, stats in team_ref.items():
+        assert list(team_got[team]) == list(stats), team
+        for key, vals in stats.items():
+            np.testing.assert_array_equal(team_got[team][key], np.array(vals, dtype=float))
+    assert list(arb_got) == list(arb_ref)
+    for name, vals in arb_ref.items():
+        np.testing.assert_array_equal(arb_got[name], np.array(vals, dtype=float))
+
+
+def _dirty(df, team_col, val_col):
+    # squadre NaN/vuote/con spazi, valori testuali con la virgola, non numerici e mancanti
+    df = df.copy()
+    df[team_col] = df[team_col].astype(object); df[val_col] = df[val_col].astype(object)
+    df.loc[1, team_col] = np.nan; df.loc[2, team_col] = "  "; df.loc[3, team_col] = f" {df.loc[3, team_col]} "
+    df.loc[4, val_col] = "3,5"; df.loc[5, val_col] = "n/d"; df.loc[6, val_col] = None; df.loc[7, val_col] = " 12 "
+    return df
+
+
+@pytest.mark.parametrize("kind", ["match", "aggregated"])
+def test_build_histories_matches_baseline(kind):
+    sheets = generate(teams=6, seasons=1, leagues=2, seed=5, kind=kind)
+    tiri, ita, liga = sheets["tiri"], sheets["falli_serie_a"], sheets["falli_liga"]
+    _assert_same(build_histories(tiri, ita, liga), _baseline(tiri, ita, liga))
+
+
+@pytest.mark.parametrize("kind", ["match", "aggregated"])
+def test_build_histories_dirty_values(kind):
+    sheets = generate(teams=6, seasons=1, leagues=2, seed=9, kind=kind)
+    tiri = sheets["tiri"]
+    tiri = _dirty(tiri, "Home", "Home Shots") if kind == "match" else _dirty(tiri, "Squadra", "Tiri totali")
+    ita = _dirty(sheets["falli_serie_a"], "Squadra", "Falli")
+    ita["Arbitro"] = ita["Arbitro"].astype(object)
+    ita.loc[8, "Arbitro"] = np.nan; ita.loc[9, "Arbitro"] = f"  {ita.loc[9, 'Arbitro']}"
+    liga = _dirty(sheets["falli_liga"], "Squadra", "Falli")
+    _assert_same(build_histories(tiri, ita, liga), _baseline(tiri, ita, liga))
+
+
+def test_build_histories_referee_mean_and_missing_sheets():
+    ita = generate(teams=4, seasons=1, leagues=1, seed=2)["falli_serie_a"]
+    ita["Media_Arbitro"] = np.linspace(18.0, 26.0, len(ita))
+    _assert_same(build_histories(None, ita, None), _baseline(None, ita, None))
+    # senza colonna falli: squadre senza storia, arbitri a 0
+    no_falli = ita.drop(columns=["Falli", "Media_Arbitro"])
+    _assert_same(build_histories(None, no_falli, None), _baseline(None, no_falli, None))
+    _assert_same(build_histories(None, None, None), ({}, {}))
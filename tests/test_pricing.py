@@ -0,0 +1,71 @@
+import threading
+
+import numpy as np
+import pytest
+
+from statapp.cdftables import NORM_BOUND
+from statapp.pricing import p_over_batch, p_over_mix, safe_lines
+
+
+def _brute_safe_lines(mu, sigma, conf, w_pois, top=200):
+    # scansione di tutte le mezze linee da -0.5: over = più alta con P(over) >= conf,
+    # under = più bassa con P(under) >= conf; NaN sotto 0.5 come safe_lines
+    lines = np.arange(-1, top) + 0.5
+    po, pu = p_over_batch(mu, sigma, lines, w_pois)
+    out = []
+    for i in range(len(mu)):
+        ok_o = np.flatnonzero(po[i] >= conf); ok_u = np.flatnonzero(pu[i] >= conf)
+        o = lines[ok_o[-1]] if len(ok_o) else np.nan
+        u = lines[ok_u[0]] if len(ok_u) else np.nan
+        out.append((o if o >= 0.5 else np.nan, u if u >= 0.5 else np.nan))
+    return np.array(out)
+
+
+def _call(fn, timeout=30):
+    # un bracketing che non termina fa fallire il test invece di bloccare la suite
+    res = {}
+    t = threading.Thread(target=lambda: res.setdefault("v", fn()), daemon=True)
+    t.start(); t.join(timeout)
+    assert "v" in res, "safe_lines non termina"
+    return res["v"]
+
+
+@pytest.mark.parametrize("w_pois", [0.0, 0.6, 1.0])
+def test_safe_lines_negative_mu_terminates(w_pois):
+    over, _, under, _ = _call(lambda: safe_lines([-1.0, 0.0, -0.3], [0.6, 0.6, 2.0], 0.55, w_pois))
+    ref = _brute_safe_lines(np.array([-1.0, 0.0, -0.3]), np.array([0.6, 0.6, 2.0]), 0.55, w_pois)
+    np.testing.assert_array_equal(over, ref[:, 0])
+    np.testing.assert_array_equal(under, ref[:, 1])
+
+
+@pytest.mark.parametrize("conf,w_pois", [(0.55, 0.6), (0.7, 0.0), (0.7, 1.0), (0.9, 0.3)])
+def test_safe_lines_matches_brute_force(conf, w_pois):
+    rng = np.random.default_rng(7)
+    mu = np.concatenate([rng.uniform(-2, 80, 400), [0.0, -2.0, 0.25]])
+    sigma = np.concatenate([rng.uniform(0.05, 8, 400), [0.6, 1.0, 0.1]])
+    over, p_over, under, p_under = _call(lambda: safe_lines(mu, sigma, conf, w_pois))
+    ref = _brute_safe_lines(mu, sigma, conf, w_pois)
+    np.testing.assert_array_equal(over, ref[:, 0])
+    np.testing.assert_array_equal(under, ref[:, 1])
+    assert (p_over[~np.isnan(over)] >= conf - 1e-12).all()
+    assert (p_under[~np.isnan(under)] >= conf - 1e-12).all()
+
+
+def test_safe_lines_nan_inputs():
+    over, p_over, under, p_under = _call(lambda: safe_lines([np.nan, 5.0, np.inf], [1.0, np.nan, 1.0]))
+    assert np.isnan(over).all() and np.isnan(under).all()
+
+
+@pytest.mark.parametrize("lookup", [False, True])
+@pytest.mark.parametrize("w_pois", [0.0, 0.6, 1.0])
+def test_p_over_batch_matches_mix(lookup, w_pois):
+    rng = np.random.default_rng(11)
+    mu = np.concatenate([rng.uniform(0, 70, 60), [-1.5, 0.0, 0.01]])
+    sigma = np.concatenate([rng.uniform(0.0, 9, 60), [0.5, 0.0, 3.0]])
+    lines = np.array([-0.5, 0.5, 1.5, 4.5, 10.5, 23.5, 55.5, 170.5])
+    po, pu = p_over_batch(mu, sigma, lines, w_pois, lookup)
+    ref = np.array([[p_over_mix(m, s, L, w_pois, lookup) for L in lines] for m, s in zip(mu, sigma)])
+    # con lookup la Normale scalare è tabulata e quella vettoriale è ndtr: differenza entro NORM_BOUND
+    tol = NORM_BOUND + 1e-12 if lookup else 1e-12
+    np.testing.assert_allclose(po, ref, rtol=0, atol=tol)
+    np.testing.assert_allclose(pu, 1.0 - ref, rtol=0, atol=tol)
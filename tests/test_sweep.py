@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from statapp.sweep import CUTOFFS, evaluate, evaluate_hist, histogram, sweep
+
+
+def _sample(seed=3, n=20_000):
+    rng = np.random.default_rng(seed)
+    p = rng.random(n)
+    # probabilità esattamente sui cutoff (0.58, 0.29, ...) e agli estremi
+    p[: 4 * len(CUTOFFS)] = np.tile(CUTOFFS, 4)
+    p[-10:] = [0.0, 1.0, 0.29, 0.58, 0.57, 0.1, 0.5, 0.95, 0.9, 0.7]
+    y = (rng.random(n) < p).astype(float)
+    p[100::97] = np.nan
+    return p, y
+
+
+@pytest.mark.parametrize("odds", [1.9, 2.5])
+def test_evaluate_hist_matches_sweep(odds):
+    p, y = _sample()
+    ref = sweep(p, y, odds=odds)
+    got = evaluate_hist(histogram(p, y), odds=odds)["sweep"]
+    np.testing.assert_array_equal(got["volume"], ref["volume"])
+    np.testing.assert_array_equal(got["hits"], ref["hits"])
+    for col in ("hit_rate", "accuracy", "tpr", "fpr", "profit", "roi"):
+        np.testing.assert_allclose(got[col], ref[col], rtol=1e-9, atol=1e-9)
+
+
+def test_evaluate_hist_matches_evaluate():
+    p, y = _sample(5)
+    ref = evaluate(p, y)
+    got = evaluate_hist(histogram(p, y))
+    for k in ("n", "base_rate", "brier", "log_loss"):
+        assert got["scores"][k] == pytest.approx(ref["scores"][k], rel=1e-9)
+    # AUC: pari merito solo dentro la stessa cella di 1e-5
+    assert got["scores"]["auc"] == pytest.approx(ref["scores"]["auc"], abs=1e-4)
+    np.testing.assert_allclose(got["reliability"].to_numpy(float), ref["reliability"].to_numpy(float),
+                               rtol=1e-9, equal_nan=True)
+
+
+def test_cutoff_cell():
+    # p uguale al cutoff è un segnale (p >= cutoff), anche dove p * scale < intero
+    p = np.array([0.58, 0.29, 0.5799999])
+    y = np.ones(3)
+    sw = evaluate_hist(histogram(p, y), cutoffs=[0.29, 0.58])["sweep"]
+    assert list(sw["volume"]) == [3, 1]
+
+
+def test_evaluate_hist_empty():
+    res = evaluate_hist(histogram([np.nan], [1.0]))
+    assert res["scores"]["n"] == 0 and res["sweep"].empty